@@ -113,7 +113,8 @@ def main(inventory_key):
     conn = create_conn()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM PATCH_MAP")
+        # Ordered, as an incremental patch map update appends the homes it rebuilt
+        cursor.execute("SELECT * FROM PATCH_MAP ORDER BY SERVERNAME, ORACLE_HOME")
         rows = cursor.fetchall()
 
         previous_server = None
@@ -127,7 +128,7 @@ def main(inventory_key):
                 if server_data:
                     write_yaml(server_data, inventory_key_directory, previous_server)
 
-                cursor.execute("SELECT DISTINCT ORAINV FROM TAB_CREATEINVENTORY WHERE DBI_HOST = ? and INVENTORYKEY = ?", (row[0], inventory_key))
+                cursor.execute("SELECT DISTINCT ORAINV FROM VIEW_CREATEINVENTORY WHERE DBI_HOST = ? and INVENTORYKEY = ?", (row[0], inventory_key))
                 ora_inv_rows = cursor.fetchall()
                 ora_inv = ora_inv_rows[0][0] if ora_inv_rows else None
 
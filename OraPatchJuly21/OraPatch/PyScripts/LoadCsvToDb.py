@@ -5,6 +5,7 @@ import re
 import sys
 import yaml
 import datetime
+import reference_schema
 
 
 def get_yaml_location():
@@ -60,7 +61,8 @@ def sanitize_identifier(identifier):
 def create_table_from_csv(csv_file, db_file):
     """
     Reads a CSV file and creates a corresponding SQLite database table.
-    If the table already exists, it's dropped and a new one is created.
+    If the table already exists, it's dropped and a new one is created, in the same transaction
+    as the load, so a failed load leaves the previous table and its keyed forms untouched.
     """
 
     # Check that the input file is a CSV file
@@ -79,37 +81,50 @@ def create_table_from_csv(csv_file, db_file):
     # Sanitize column names
     headers = [sanitize_identifier(header) for header in headers]
 
-    # Create SQLite connection and cursor
-    conn = sqlite3.connect(db_file)
+    # Autocommit mode with an explicit transaction: the old table stays in place until the new
+    # load, and for a reference table its keyed forms, have all succeeded
+    conn = sqlite3.connect(db_file, isolation_level=None)
     cursor = conn.cursor()
+    is_reference = table_name in reference_schema.REFERENCE_TABLES
 
-    # Drop the table if it already exists
-    drop_table_query = f'DROP TABLE IF EXISTS "{table_name}"'
-    cursor.execute(drop_table_query)
-    conn.commit()
-
-    # Create table
-    columns = ', '.join([f'"{header}" TEXT' for header in headers])
-    create_table_query = f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns})'
-    cursor.execute(create_table_query)
-    conn.commit()
-
-    # Insert data into table
-    with open(csv_file, 'r') as file:
-        csv_reader = csv.reader(file)
-        # Skip headers
-        next(csv_reader)
-
-        insert_query = f'INSERT INTO "{table_name}" VALUES ({",".join(["?"] * len(headers))})'
-        cursor.executemany(insert_query, csv_reader)
-        conn.commit()
-
-    # Get the count of rows loaded
-    cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
-    rows_loaded = cursor.fetchone()[0]
-
-    # Close connection
-    conn.close()
+    try:
+        cursor.execute('BEGIN')
+        try:
+            # Drop the table if it already exists
+            drop_table_query = f'DROP TABLE IF EXISTS "{table_name}"'
+            cursor.execute(drop_table_query)
+
+            # Create table
+            columns = ', '.join([f'"{header}" TEXT' for header in headers])
+            create_table_query = f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns})'
+            cursor.execute(create_table_query)
+
+            # Insert data into table
+            with open(csv_file, 'r') as file:
+                csv_reader = csv.reader(file)
+                # Skip headers
+                next(csv_reader)
+
+                insert_query = f'INSERT INTO "{table_name}" VALUES ({",".join(["?"] * len(headers))})'
+                cursor.executemany(insert_query, csv_reader)
+
+            # Get the count of rows loaded
+            cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
+            rows_loaded = cursor.fetchone()[0]
+
+            # Patch reference tables also get their keyed form and a covering index, for PatchMap.py's joins;
+            # duplicate keys roll the whole load back, so REF_* and PATCH_RESOLUTION never go stale
+            if is_reference:
+                reference_schema.build_reference_tables(cursor, [table_name])
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        if is_reference:
+            cursor.execute('ANALYZE')
+    finally:
+        # Close connection
+        conn.close()
 
     # Print the table name, column names, and the number of rows loaded
     print(f"Table '{table_name}' created with columns {headers}.")
@@ -2,6 +2,7 @@ import argparse
 import concurrent.futures
 import csv
 import datetime
+import hashlib
 import html
 import os
 import smtplib
@@ -9,15 +10,16 @@ import socket
 import sqlite3
 import subprocess
 import sys
+import time
 from collections import OrderedDict
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import pandas as pd
 import paramiko
 import yaml
 from jinja2 import Environment, FileSystemLoader
+import reference_schema
 COMMASPACE = ', '
 
 start_time = datetime.datetime.now()
@@ -45,10 +47,17 @@ LOCKFILE = os.path.join(config["LOCK_DIR"], f"{PROGRAM_NAME}.lck")
 SERVER_LIST = os.path.join(config["SERVERLIST_DIR"], "database_server_list.lst")
 DB_INVENTORY = os.path.join(config["CSV_DIR"], f"db_inventory{timestamp_tag}.csv")
 DB_PATCH_MAP_INVENTORY = os.path.join(config["CSV_DIR"], f"db_patch_map_inventory{timestamp_tag}.csv")
+DB_PATCH_MAP_WHAT_IF = os.path.join(config["CSV_DIR"], f"db_patch_map_what_if{timestamp_tag}.csv")
+DB_PATCH_MAP_WHAT_IF_SUMMARY = os.path.join(config["CSV_DIR"], f"db_patch_map_what_if_summary{timestamp_tag}.csv")
 EXECUTION_SUMMARY = os.path.join(config["CSV_DIR"], f"db_inventory_execution_summary{timestamp_tag}.csv")
 PATCH_CYCLE = config["CURRENT_PATCH_CYCLE"]
 TO_RECIPIENT = config["TO_RECIPIENT_EMAIL"]
 CC_RECIPIENT = config["CC_RECIPIENT_EMAIL"]
+CHANGED_HOMES = 'CHANGED_HOMES'  # Temp table of the (DBI_HOST, ORA_HOME) an incremental update rebuilds.
+# Inventory columns the patch map reads; a home whose rows differ only elsewhere keeps its patch map rows
+PATCH_MAP_INPUT_COLUMNS = ['DBI_HOST', 'DBI_KEY', 'ORA_SID', 'ORA_HOME', 'AUTO_START', 'HOME_EXIST', 'HOME_ACTIVE',
+                           'HOME_TYPE', 'SID_STATUS', 'DB_STATUS', 'SQLPLUS_VERSION', 'OPATCH_VERSION', 'OS_NAME',
+                           'VERSION', 'DB_RELEASE']
 
 """
 QUERY
@@ -93,23 +102,283 @@ def send_email(to, subject, html_content, files=[], cc=None):
         smtp.close()
 
 def execute_sql_query(query, table_name, db=SQLITE_DB):
+    """
+    Materialises query into table_name without the rows leaving SQLite: the query runs once, as
+    INSERT ... SELECT into a table of TEXT columns named after its result columns, and the drop,
+    create and insert are one transaction, so readers see either the old table or the new one.
+    Returns True once the table is committed.
+    """
+    select = query.strip().rstrip(';')
+    conn = None
     try:
-        with sqlite3.connect(db) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            df = pd.read_sql_query(query, conn)
+        # Autocommit mode with an explicit transaction, so the DDL is part of it too
+        conn = sqlite3.connect(db, isolation_level=None)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            # LIMIT 0 only prepares the query, to learn its column names
+            cursor.execute(f'SELECT * FROM ({select}) LIMIT 0')
+            columns = [description[0] for description in cursor.description]
             cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
+            column_defs = ', '.join(f'"{column}" TEXT' for column in columns)
+            cursor.execute(f'CREATE TABLE {table_name} ({column_defs})')
+            cursor.execute(f'INSERT INTO {table_name} {select}')
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            cursor.execute('ROLLBACK')
+            raise
+        return True
     except sqlite3.Error as error:
         print("An error occurred:", error.args[0])
+        return False
     finally:
         if conn:
             conn.close()  # Ensure the connection is closed even if an error occurred
 
-def load_data_into_tables(inventory_key):
-    # Load data into tables
-    execute_sql_query(query_1, 'PATCH_MAP_STAGE')
-    execute_sql_query(query_2, 'PATCH_MAP')
+def resolution_digest(cursor):
+    # Changes whenever the reference data behind this cycle's patch paths does
+    cursor.execute(f"SELECT * FROM {reference_schema.RESOLUTION_TABLE} WHERE PATCH_CYCLE = ? "
+                   f"ORDER BY OS_RELEASE, DB_RELEASE", (PATCH_CYCLE,))
+    return hashlib.sha256(repr(cursor.fetchall()).encode()).hexdigest()
+
+def save_patch_map_state(cursor, inventory_key):
+    # PATCH_MAP_STATE records what the patch map tables were built from, for the next incremental update
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PATCH_MAP_STATE(
+        INVENTORYKEY TEXT,
+        PATCH_CYCLE TEXT,
+        RESOLUTION_DIGEST TEXT,
+        BUILT_AT TEXT
+        )
+    ''')
+    cursor.execute('DELETE FROM PATCH_MAP_STATE')
+    cursor.execute('INSERT INTO PATCH_MAP_STATE VALUES (?, ?, ?, ?)',
+                   (inventory_key, PATCH_CYCLE, resolution_digest(cursor), datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def finish_full_build(inventory_key, db=SQLITE_DB):
+    # The incremental update deletes by host and home, and the readers walk the map in that order
+    conn = sqlite3.connect(db)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('CREATE INDEX IF NOT EXISTS IDX_PATCH_MAP_STAGE_HOST_HOME ON PATCH_MAP_STAGE(SERVERNAME, ORACLE_HOME)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS IDX_PATCH_MAP_HOST_HOME ON PATCH_MAP(SERVERNAME, ORACLE_HOME)')
+            save_patch_map_state(cursor, inventory_key)
+    finally:
+        conn.close()
+
+def incremental_base(db=SQLITE_DB):
+    """
+    Returns (previous_key, None) when the patch map tables were built from previous_key for this
+    PATCH_CYCLE and reference data and can be updated incrementally, else (None, reason).
+    """
+    conn = sqlite3.connect(db)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing = {row[0] for row in cursor.fetchall()}
+        if not {'PATCH_MAP_STATE', 'PATCH_MAP_STAGE', 'PATCH_MAP'} <= existing:
+            return None, "no previous build recorded"
+        cursor.execute('SELECT INVENTORYKEY, PATCH_CYCLE, RESOLUTION_DIGEST FROM PATCH_MAP_STATE')
+        row = cursor.fetchone()
+        if row is None:
+            return None, "no previous build recorded"
+        previous_key, patch_cycle, digest = row
+        if patch_cycle != PATCH_CYCLE:
+            return None, f"previous build was for patch cycle {patch_cycle}"
+        if digest != resolution_digest(cursor):
+            return None, "patch reference data changed since the previous build"
+        cursor.execute('SELECT 1 FROM TAB_INVENTORY_HOSTS WHERE INVENTORYKEY = ? LIMIT 1', (previous_key,))
+        if cursor.fetchone() is None:
+            return None, f"previous inventory key {previous_key} no longer exists"
+        return previous_key, None
+    finally:
+        conn.close()
+
+def changed_homes_query():
+    """
+    Selects the (DBI_HOST, ORA_HOME) whose patch map inputs differ between :previous_key and
+    :inventory_key, including homes that appeared or went away. Only hosts whose rows are not
+    shared between the two keys are compared; DeltaInventory points unchanged hosts at their
+    previous rows, so after a delta run the work follows the number of changed hosts.
+    """
+    columns = ', '.join(PATCH_MAP_INPUT_COLUMNS)
+    return f"""
+    WITH Changed_Hosts AS (
+        SELECT n.DBI_HOST
+        FROM TAB_INVENTORY_HOSTS n
+        LEFT JOIN TAB_INVENTORY_HOSTS o ON o.INVENTORYKEY = :previous_key AND o.DBI_HOST = n.DBI_HOST
+        WHERE n.INVENTORYKEY = :inventory_key AND (o.ROWS_KEY IS NULL OR o.ROWS_KEY <> n.ROWS_KEY)
+        UNION
+        SELECT o.DBI_HOST
+        FROM TAB_INVENTORY_HOSTS o
+        WHERE o.INVENTORYKEY = :previous_key
+        AND NOT EXISTS (SELECT 1 FROM TAB_INVENTORY_HOSTS n WHERE n.INVENTORYKEY = :inventory_key AND n.DBI_HOST = o.DBI_HOST)
+    ),
+    New_Rows AS (
+        SELECT {columns} FROM VIEW_CREATEINVENTORY
+        WHERE INVENTORYKEY = :inventory_key AND DBI_HOST IN (SELECT DBI_HOST FROM Changed_Hosts)
+    ),
+    Old_Rows AS (
+        SELECT {columns} FROM VIEW_CREATEINVENTORY
+        WHERE INVENTORYKEY = :previous_key AND DBI_HOST IN (SELECT DBI_HOST FROM Changed_Hosts)
+    )
+    SELECT DISTINCT DBI_HOST, ORA_HOME FROM (
+        SELECT * FROM (SELECT * FROM New_Rows EXCEPT SELECT * FROM Old_Rows)
+        UNION ALL
+        SELECT * FROM (SELECT * FROM Old_Rows EXCEPT SELECT * FROM New_Rows)
+    )
+    """
+
+def update_patch_map(inventory_key, previous_key, db=SQLITE_DB):
+    """
+    Brings PATCH_MAP_STAGE and PATCH_MAP, built from previous_key, up to inventory_key: the rows of
+    every changed home are deleted and rebuilt, in one transaction. Returns the number of homes rebuilt.
+    """
+    query_1, query_2 = patch_map_queries(inventory_key, changed_only=True)
+    conn = sqlite3.connect(db, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute(f'DROP TABLE IF EXISTS temp.{CHANGED_HOMES}')
+            cursor.execute(f'CREATE TEMP TABLE {CHANGED_HOMES} AS {changed_homes_query()}',
+                           {'inventory_key': inventory_key, 'previous_key': previous_key})
+            cursor.execute(f'SELECT COUNT(*) FROM {CHANGED_HOMES}')
+            changed = cursor.fetchone()[0]
+            # PATCH_MAP is rebuilt from the updated PATCH_MAP_STAGE
+            for query, table_name in ((query_1, 'PATCH_MAP_STAGE'), (query_2, 'PATCH_MAP')):
+                cursor.execute(f'DELETE FROM {table_name} WHERE (SERVERNAME, ORACLE_HOME) IN '
+                               f'(SELECT DBI_HOST, ORA_HOME FROM {CHANGED_HOMES})')
+                cursor.execute(f'INSERT INTO {table_name} {query.strip().rstrip(";")}')
+            save_patch_map_state(cursor, inventory_key)
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            cursor.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    return changed
+
+def load_data_into_tables(inventory_key, full=False):
+    # Load data into tables; the joins read the keyed reference tables (reference_schema.py)
+    reference_schema.ensure_reference_tables(SQLITE_DB)
+    if not full:
+        previous_key, reason = incremental_base()
+        if previous_key is not None:
+            start = time.perf_counter()
+            changed = update_patch_map(inventory_key, previous_key)
+            print(f"INFO :: Patch map updated from {previous_key} to {inventory_key}: "
+                  f"{changed} homes rebuilt in {time.perf_counter() - start:.1f}s")
+            return
+        print(f"INFO :: Full patch map rebuild: {reason}")
+    query_1, query_2 = patch_map_queries(inventory_key)
+    if execute_sql_query(query_1, 'PATCH_MAP_STAGE') and execute_sql_query(query_2, 'PATCH_MAP'):
+        finish_full_build(inventory_key)
+
+def zip_size(path, sizes):
+    # Stats each zip once on this host, where the patch zips are staged; None when it is missing
+    if path not in sizes:
+        sizes[path] = os.path.getsize(path) if os.path.isfile(path) else None
+    return sizes[path]
+
+def what_if_summary(cycles, db=SQLITE_DB):
+    """
+    Summarises PATCH_MAP_WHAT_IF per cycle: the homes and servers the cycle would patch and the
+    bytes of patch zips it would copy, counted per home the way patch_scp.py sizes a transfer
+    (every zip of a patch the home applies, plus its OPatch zip). Zips missing on this host are
+    counted apart rather than sized.
+    """
+    summary = {cycle: {'PATCH_CYCLE': cycle, 'HOMES': 0, 'HOMES_TO_PATCH': 0, 'SERVERS_TO_PATCH': set(),
+                       'ZIP_COPIES': 0, 'ZIP_BYTES': 0, 'MISSING_ZIPS': set()} for cycle in cycles}
+    sizes = {}
+    conn = sqlite3.connect(db)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT PATCH_CYCLE, SERVERNAME, NEED_TO_PATCH, PSU, PSU_ZIP_PATH, JDK, JDK_ZIP_PATH,
+                   OJVM, OJVM_ZIP_PATH, PERL, PERL_ZIP_PATH, OPATCH_ZIP_PATH
+            FROM PATCH_MAP_WHAT_IF
+        ''')
+        for cycle, server, need_to_patch, *patches, opatch_zip in cursor.fetchall():
+            totals = summary[cycle]
+            totals['HOMES'] += 1
+            if need_to_patch != 'Y':
+                continue
+            totals['HOMES_TO_PATCH'] += 1
+            totals['SERVERS_TO_PATCH'].add(server)
+            zips = [path for flag, path in zip(patches[::2], patches[1::2]) if flag == 'Y' and path]
+            for path in zips + ([opatch_zip] if opatch_zip else []):
+                size = zip_size(path, sizes)
+                totals['ZIP_COPIES'] += 1
+                if size is None:
+                    totals['MISSING_ZIPS'].add(path)
+                else:
+                    totals['ZIP_BYTES'] += size
+    finally:
+        conn.close()
+    for totals in summary.values():
+        totals['SERVERS_TO_PATCH'] = len(totals['SERVERS_TO_PATCH'])
+        totals['MISSING_ZIPS'] = len(totals['MISSING_ZIPS'])
+    return list(summary.values())
+
+def build_what_if(inventory_key, cycles, db=SQLITE_DB):
+    """
+    Builds PATCH_MAP_WHAT_IF, the patch map of inventory_key under every cycle in cycles with
+    PATCH_CYCLE as a key column, and PATCH_MAP_WHAT_IF_SUMMARY. The patch map tables and their
+    incremental state are left alone. Returns the summary rows.
+    """
+    reference_schema.ensure_reference_tables(db)
+    conn = sqlite3.connect(db)
+    try:
+        known = {row[0] for row in conn.execute(f"SELECT DISTINCT PATCH_CYCLE FROM {reference_schema.RESOLUTION_TABLE}")}
+    finally:
+        conn.close()
+    for cycle in cycles:
+        if cycle not in known:
+            print(f"WARNING :: Patch cycle {cycle} is not in the patch reference data; it will patch nothing")
+
+    query_1, query_2 = patch_map_queries(inventory_key, cycles=cycles, stage_table='PATCH_MAP_WHAT_IF_STAGE')
+    if not (execute_sql_query(query_1, 'PATCH_MAP_WHAT_IF_STAGE', db) and execute_sql_query(query_2, 'PATCH_MAP_WHAT_IF', db)):
+        return []
+    summary = what_if_summary(cycles, db)
+    columns = list(summary[0])
+    conn = sqlite3.connect(db)
+    try:
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS PATCH_MAP_WHAT_IF_SUMMARY')
+            conn.execute('CREATE TABLE PATCH_MAP_WHAT_IF_SUMMARY(PATCH_CYCLE TEXT, HOMES INTEGER, HOMES_TO_PATCH INTEGER, '
+                         'SERVERS_TO_PATCH INTEGER, ZIP_COPIES INTEGER, ZIP_BYTES INTEGER, MISSING_ZIPS INTEGER)')
+            conn.executemany(f"INSERT INTO PATCH_MAP_WHAT_IF_SUMMARY ({', '.join(columns)}) "
+                             f"VALUES ({', '.join('?' * len(columns))})",
+                             [[totals[column] for column in columns] for totals in summary])
+    finally:
+        conn.close()
+    return summary
+
+def what_if_to_csv(db=SQLITE_DB):
+    conn = sqlite3.connect(db)
+    try:
+        cursor = conn.cursor()
+        for query, csv_path in (("SELECT * FROM PATCH_MAP_WHAT_IF ORDER BY PATCH_CYCLE, SERVERNAME, ORACLE_HOME", DB_PATCH_MAP_WHAT_IF),
+                                ("SELECT * FROM PATCH_MAP_WHAT_IF_SUMMARY", DB_PATCH_MAP_WHAT_IF_SUMMARY)):
+            cursor.execute(query)
+            with open(csv_path, 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow([description[0] for description in cursor.description])
+                writer.writerows(cursor.fetchall())
+            print(f"INFO :: Wrote {csv_path}")
+    finally:
+        conn.close()
+
+def create_what_if(inventory_key, cycles):
+    summary = build_what_if(inventory_key, cycles)
+    for totals in summary:
+        print(f"INFO :: What-if {totals['PATCH_CYCLE']}: {totals['HOMES_TO_PATCH']} of {totals['HOMES']} homes on "
+              f"{totals['SERVERS_TO_PATCH']} servers, {totals['ZIP_COPIES']} zip copies, "
+              f"{totals['ZIP_BYTES'] / 1024 ** 3:.2f} GB, {totals['MISSING_ZIPS']} zips missing on this host")
+    if summary:
+        what_if_to_csv()
 
 def load_data_to_csv_and_send_email():
     try:
@@ -117,7 +386,7 @@ def load_data_to_csv_and_send_email():
             writer = csv.writer(csv_file)
             conn = sqlite3.connect(SQLITE_DB)
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM PATCH_MAP")
+            cursor.execute("SELECT * FROM PATCH_MAP ORDER BY SERVERNAME, ORACLE_HOME")
             rows = cursor.fetchall()
 
             # Write headers
@@ -156,18 +425,37 @@ def load_data_to_csv_and_send_email():
         )
 
 
-def create_patch_map(inventory_key):
-    load_data_into_tables(inventory_key)
+def create_patch_map(inventory_key, full=False):
+    load_data_into_tables(inventory_key, full)
     load_data_to_csv_and_send_email()
 
 
-if __name__ == "__main__":
-    # use argparse to handle command line arguments
-    parser = argparse.ArgumentParser(description='Create patch map.')
-    parser.add_argument('inventory_key', type=str, help='Inventory Key')
-    args = parser.parse_args()
+def patch_map_queries(inventory_key, changed_only=False, cycles=None, stage_table='PATCH_MAP_STAGE'):
+    """
+    Returns (query_1, query_2): the PATCH_MAP_STAGE and PATCH_MAP selects for inventory_key and
+    PATCH_CYCLE. The patch flags and paths come resolved per release from PATCH_RESOLUTION
+    (reference_schema.py), so each inventory row, one per database (DBI_KEY is SID@host), is a
+    single keyed lookup and PATCH_MAP_STAGE needs no grouping. PATCH_MAP lists each home's SIDs
+    in SID order. changed_only restricts both to the homes in the CHANGED_HOMES temp table, for
+    update_patch_map.
 
-    inventory_key = args.inventory_key
+    cycles, for the what-if mode, replaces PATCH_CYCLE with a list of cycles: each inventory row
+    is still read once and looked up once per cycle, both selects lead with PATCH_CYCLE, and
+    query_2 reads stage_table.
+    """
+    if changed_only:
+        stage_filter = f"AND (DBI_HOST, ORA_HOME) IN (SELECT DBI_HOST, ORA_HOME FROM {CHANGED_HOMES})"
+        map_filter = f"WHERE (SERVERNAME, ORACLE_HOME) IN (SELECT DBI_HOST, ORA_HOME FROM {CHANGED_HOMES})"
+    else:
+        stage_filter = map_filter = ''
+    if cycles is None:
+        cycle_filter = f"pr.PATCH_CYCLE = '{PATCH_CYCLE}'"
+        stage_cycle = map_cycle = ''
+    else:
+        cycle_list = ', '.join(f"'{cycle}'" for cycle in cycles)
+        cycle_filter = f"pr.PATCH_CYCLE IN ({cycle_list})"
+        stage_cycle = 'pr.PATCH_CYCLE,\n        '
+        map_cycle = 'PATCH_CYCLE, '
 
     query_1 = f"""
     WITH DB_Data_With_Release AS (
@@ -192,10 +480,11 @@ if __name__ == "__main__":
             VERSION,
             DB_RELEASE
         FROM
-            TAB_CREATEINVENTORY WHERE INVENTORYKEY = '{inventory_key}'
+            VIEW_CREATEINVENTORY WHERE INVENTORYKEY = '{inventory_key}'
+            {stage_filter}
     )
     SELECT
-        ddr.SERVERNAME,
+        {stage_cycle}ddr.SERVERNAME,
         ddr.DBI_KEY,
         ddr.SID,
         ddr.ORACLE_HOME,
@@ -211,94 +500,33 @@ if __name__ == "__main__":
         ddr.OS_RELEASE,
         ddr.VERSION,
         ddr.DB_RELEASE,
-        CASE
-            WHEN pcm.PSU = 'Y' OR pcm.JDK = 'Y' OR pcm.OJVM = 'Y' OR pcm.PERL = 'Y' THEN 'Y'
-            ELSE 'N'
-        END AS NEED_TO_PATCH,
-        GROUP_CONCAT(pcm.PSU) AS PSU,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.PSU = 'Y' AND PZ.PRODUCT='RDBMS'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_FILE
-                ELSE NULL
-            END
-        ) AS PSU_ZIP_PATH,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.PSU = 'Y' AND PZ.PRODUCT='RDBMS'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_NUMBER
-                ELSE NULL
-            END
-        ) AS PSU_UNZIP_PATH,
-        GROUP_CONCAT(pcm.JDK) AS JDK,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.JDK = 'Y' AND PZ.PRODUCT='JDK'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_FILE
-                ELSE NULL
-            END
-        ) AS JDK_ZIP_PATH,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.JDK = 'Y' AND PZ.PRODUCT='JDK'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_NUMBER
-                ELSE NULL
-            END
-        ) AS JDK_UNZIP_PATH,
-        GROUP_CONCAT(pcm.OJVM) AS OJVM,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.OJVM = 'Y' AND PZ.PRODUCT='OJVM'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_FILE
-                ELSE NULL
-            END
-        ) AS OJVM_ZIP_PATH,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.OJVM = 'Y' AND PZ.PRODUCT='OJVM'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_NUMBER
-                ELSE NULL
-            END
-        ) AS OJVM_UNZIP_PATH,
-        GROUP_CONCAT(pcm.PERL) AS PERL,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.PERL = 'Y' AND PZ.PRODUCT='PERL'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_FILE
-                ELSE NULL
-            END
-        ) AS PERL_ZIP_PATH,
-        GROUP_CONCAT(
-            CASE
-                WHEN pcm.PERL = 'Y' AND PZ.PRODUCT='PERL'
-                THEN pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/' || '/' || pz.PATCH_HOME_DIR || '/' || pz.PATCH_NUMBER
-                ELSE NULL
-            END
-        ) AS PERL_UNZIP_PATH
+        pr.NEED_TO_PATCH,
+        pr.PSU,
+        pr.PSU_ZIP_PATH,
+        pr.PSU_UNZIP_PATH,
+        pr.JDK,
+        pr.JDK_ZIP_PATH,
+        pr.JDK_UNZIP_PATH,
+        pr.OJVM,
+        pr.OJVM_ZIP_PATH,
+        pr.OJVM_UNZIP_PATH,
+        pr.PERL,
+        pr.PERL_ZIP_PATH,
+        pr.PERL_UNZIP_PATH,
+        pr.OPATCH_ZIP_PATH
     FROM
         DB_Data_With_Release ddr
     JOIN
-        PATCH_ZIP pz
+        {reference_schema.RESOLUTION_TABLE} pr
     ON
-        ddr.DB_RELEASE = pz.DB_RELEASE
-    AND
-        ddr.OS_RELEASE = pz.OS_NAME
-    JOIN
-        PATCH_COMPATABILITY_MATRIX pcm
-    ON
-        ddr.DB_RELEASE = pcm.VERSION
-    AND pz.PATCH_CYCLE='{PATCH_CYCLE}'
-    AND pcm.PATCH_CYCLE='{PATCH_CYCLE}'
-    AND pz.OS_NAME = pcm.PLATFORM
-    GROUP BY
-        ddr.SERVERNAME,
-        ddr.DBI_KEY,
-        ddr.SID
+        {cycle_filter}
+    AND pr.OS_RELEASE = ddr.OS_RELEASE
+    AND pr.DB_RELEASE = ddr.DB_RELEASE
     """
 
     query_2 = f"""
     SELECT
-        SERVERNAME,
+        {map_cycle}SERVERNAME,
         ORACLE_HOME,
         GROUP_CONCAT(SID) as SID,
         DB_RELEASE,
@@ -322,15 +550,33 @@ if __name__ == "__main__":
         SUBSTRING(PERL, 1, 1) AS PERL,
         PERL_UNZIP_PATH,
         PERL_ZIP_PATH,
-    substr(PSU_ZIP_PATH, 1, instr(PSU_ZIP_PATH, 'patching/') + 8) || OS_RELEASE || '/' || DB_RELEASE || '/{PATCH_CYCLE}/opatch/opatch.zip' AS OPATCH_ZIP_PATH
+        OPATCH_ZIP_PATH
     FROM
-        PATCH_MAP_STAGE
+        (SELECT * FROM {stage_table} {map_filter} ORDER BY {map_cycle}SERVERNAME, ORACLE_HOME, SID)
     GROUP BY
-        SERVERNAME, ORACLE_HOME;
+        {map_cycle}SERVERNAME, ORACLE_HOME;
     """
 
+    return query_1, query_2
+
+
+if __name__ == "__main__":
+    # use argparse to handle command line arguments
+    parser = argparse.ArgumentParser(description='Create patch map.')
+    parser.add_argument('inventory_key', type=str, help='Inventory Key')
+    parser.add_argument('--full', action='store_true',
+                        help='rebuild the whole patch map instead of only the homes changed since the previous build')
+    parser.add_argument('--what-if', nargs='+', metavar='PATCH_CYCLE',
+                        help='plan these patch cycles side by side in PATCH_MAP_WHAT_IF instead of building the patch map')
+    args = parser.parse_args()
+
+    inventory_key = args.inventory_key
+
     try:
-        create_patch_map(inventory_key)
+        if args.what_if:
+            create_what_if(inventory_key, args.what_if)
+        else:
+            create_patch_map(inventory_key, args.full)
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         sys.exit(1)
@@ -0,0 +1,183 @@
+import math
+import socket
+import asyncio
+import threading
+import collections
+import contextlib
+import paramiko
+
+try:
+    import asyncssh
+except ImportError:  # Only the async inventory engine uses asyncssh
+    asyncssh = None
+
+# AIMD (additive increase, multiplicative decrease) limit on how many servers are worked at once.
+#
+# Every connect and exec reports its latency. While the median of recent samples stays within
+# LATENCY_TOLERANCE times the best median seen so far for its kind, the limit grows: by one per
+# success until the first back-off (slow start, so a large fleet ramps up in a few rounds), then
+# by about one per limit's worth of successes. A slow median, an SSH timeout or an authentication
+# failure (sshd's MaxStartups throttling shows up as both) cuts the limit by DECREASE_FACTOR, at
+# most once per limit's worth of outcomes, so one overloaded moment only backs off once.
+
+INITIAL_LIMIT = 4  # Servers in flight when a run starts.
+MIN_LIMIT = 1
+MAX_LIMIT = 64  # Also the size of the thread pool the limit runs on.
+DECREASE_FACTOR = 0.5  # Share of the limit kept after a back-off.
+LATENCY_TOLERANCE = 3.0  # A recent median this many times the baseline counts as congestion.
+LATENCY_WINDOW = 200  # Recent samples kept per kind for the baseline and the logged percentiles.
+BASELINE_SAMPLES = 5  # Samples of a kind needed before its latency can trigger a back-off.
+REPORT_PERCENTILES = (50, 90, 99)
+
+BACKOFF_ERRORS = (TimeoutError, socket.timeout, asyncio.TimeoutError, paramiko.AuthenticationException)
+if asyncssh is not None:
+    BACKOFF_ERRORS += (asyncssh.PermissionDenied,)
+
+
+def is_backoff_error(error):
+    """Timeouts and auth failures mean the network or the targets are overloaded; other errors are per host."""
+    if isinstance(error, BACKOFF_ERRORS):
+        return True
+    # An sshd over MaxStartups drops new connections before the banner
+    return isinstance(error, paramiko.SSHException) and 'banner' in str(error).lower()
+
+
+def percentile(sorted_samples, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class AdaptiveConcurrency:
+    """
+    A thread-safe AIMD concurrency limit shared by the workers of one run.
+
+    Workers either hold a slot() around each server, or a scheduler polls limit and keeps that
+    many servers in flight. Outcomes are reported with record(kind, seconds) and failure(kind, error);
+    kind is 'connect' or 'exec'. log, when given, receives one line each time the limit moves.
+    """
+
+    def __init__(self, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT,
+                 decrease_factor=DECREASE_FACTOR, tolerance=LATENCY_TOLERANCE, log=None):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.decrease_factor = decrease_factor
+        self.tolerance = tolerance
+        self.log = log
+        self._limit = float(min(max(initial, min_limit), self.max_limit))
+        self._in_flight = 0
+        self._since_decrease = 0
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self._baseline = {}
+        self._failures = collections.Counter()
+        self._increases = 0
+        self._decreases = 0
+        self._slow_start = True
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        with self._cond:
+            return int(self._limit)
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return self._in_flight
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record(self, kind, seconds):
+        """Reports one successful connect or exec and how long it took."""
+        with self._cond:
+            samples = self._samples[kind]
+            samples.append(seconds)
+            if len(samples) < BASELINE_SAMPLES:
+                self._increase()
+                return
+            # Judge the median of the last limit's worth of samples, so one big host is not congestion
+            recent = sorted(list(samples)[-max(BASELINE_SAMPLES, int(self._limit)):])
+            recent_median = percentile(recent, 50)
+            baseline = self._baseline.get(kind)
+            self._baseline[kind] = min(baseline, recent_median) if baseline is not None else recent_median
+            if baseline is not None and recent_median > baseline * self.tolerance:
+                if self._decrease(f"{kind} median {recent_median:.2f}s against a {baseline:.2f}s baseline"):
+                    # Judge the backed-off limit against today's latency; if it was only a slower
+                    # phase of the run rather than congestion, the limit climbs again from here
+                    self._baseline[kind] = recent_median
+            else:
+                self._increase()
+
+    def failure(self, kind, error):
+        """Reports a failed connect or exec; only timeouts and auth failures back off."""
+        with self._cond:
+            self._failures[kind] += 1
+            if is_backoff_error(error):
+                self._decrease(f"{kind} failed: {type(error).__name__}: {error}")
+            else:
+                self._since_decrease += 1
+
+    def percentiles(self, kind):
+        with self._cond:
+            samples = sorted(self._samples[kind])
+        return {pct: percentile(samples, pct) for pct in REPORT_PERCENTILES}
+
+    def report(self):
+        """One line for the run log: the current limit and the latency percentiles of every kind."""
+        with self._cond:
+            parts = [f"limit {int(self._limit)} (in flight {self._in_flight}, "
+                     f"+{self._increases}/-{self._decreases} adjustments)"]
+            for kind in sorted(set(self._samples) | set(self._failures)):
+                stats = [f"p{pct} {value:.2f}s" for pct, value in self.percentiles(kind).items() if value is not None]
+                stats += [f"n={len(self._samples[kind])}", f"failed={self._failures[kind]}"]
+                parts.append(f"{kind} {' '.join(stats)}")
+        return ' | '.join(parts)
+
+    def _increase(self):
+        # Called with the lock held: +1 per healthy outcome in slow start, about +1 per limit's worth after
+        self._since_decrease += 1
+        if self._limit >= self.max_limit:
+            return
+        before = int(self._limit)
+        self._limit = min(self.max_limit, self._limit + (1 if self._slow_start else 1 / self._limit))
+        if int(self._limit) != before:
+            self._increases += 1
+            self._cond.notify_all()
+            self._log(f"concurrency raised to {int(self._limit)}")
+
+    def _decrease(self, reason):
+        # Called with the lock held; workers already past acquire() finish, new ones wait
+        if self._since_decrease < int(self._limit) and self._decreases:
+            self._since_decrease += 1
+            return False
+        self._since_decrease = 0
+        self._slow_start = False
+        before = int(self._limit)
+        self._limit = max(float(self.min_limit), math.floor(self._limit * self.decrease_factor))
+        if int(self._limit) != before:
+            self._decreases += 1
+            self._log(f"concurrency lowered to {int(self._limit)} after {reason}")
+        return True
+
+    def _log(self, message):
+        if self.log is not None:
+            self.log(message)
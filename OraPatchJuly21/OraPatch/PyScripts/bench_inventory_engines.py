@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import asyncssh
+
+import orapatch_metadata_manager as manager
+import orapatch_async_inventory
+import adaptive_concurrency
+from inventory_schema import INVENTORY_COLUMNS
+
+# python bench_inventory_engines.py --hosts 500 --latency 0.05,0.5 [--capacity 16]
+# A local fake SSH server stands in for the fleet: every "host" is the same port, and each
+# bash -s run sleeps for a random latency and prints --rows db_inventory.sh shaped rows.
+# --capacity makes the fleet slow down under load, to watch the adaptive limit back off.
+
+
+def fake_inventory_server(host_key_path, rows, latency, seed, port_queue, capacity=0):
+    """
+    Runs in its own process so the fake fleet does not compete with the engine under test for the GIL.
+    With a capacity, runs beyond that many at once slow every run down in proportion, like a saturated link.
+    """
+    rng = random.Random(seed)
+    running = [0]
+    width = len(INVENTORY_COLUMNS) - 1
+    row = '|'.join(['ROWST'] + [f"COL{i}" for i in range(width - 2)] + ['ROWED'])
+
+    class NoAuthServer(asyncssh.SSHServer):
+        def begin_auth(self, username):
+            return False
+
+    async def handle(process):
+        await process.stdin.read()  # the script body, sent by the engine before EOF
+        running[0] += 1
+        await asyncio.sleep(rng.uniform(*latency) * max(1.0, running[0] / capacity if capacity else 1.0))
+        running[0] -= 1
+        for _ in range(rows):
+            process.stdout.write(row + '\n')
+        process.exit(0)
+
+    async def serve():
+        server = await asyncssh.create_server(NoAuthServer, '127.0.0.1', 0, server_host_keys=[host_key_path],
+                                              process_factory=handle, encoding='utf-8')
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def run_engine(engine, servers, script_path, args, client_key_path):
+    rows = [0]
+    lock = threading.Lock()
+
+    def count_row(server, row):
+        with lock:
+            rows[0] += 1
+
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def watch_threads():
+        while not done.wait(0.05):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    watcher = threading.Thread(target=watch_threads, daemon=True)
+    watcher.start()
+    concurrency = args.threads if engine == 'thread' else args.connections
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if engine == 'thread':
+            results = list(manager.inventory_pipeline(servers, script_path, max_workers=args.threads, on_row=count_row))
+        elif engine == 'adaptive':
+            limiter = adaptive_concurrency.AdaptiveConcurrency(initial=args.threads, max_limit=args.connections)
+            results = list(manager.inventory_pipeline(servers, script_path, on_row=count_row, limiter=limiter))
+            concurrency = f"{args.threads}->{limiter.limit}"
+        else:
+            results = orapatch_async_inventory.run_inventory(servers, script_path, on_row=count_row,
+                                                             max_connections=args.connections,
+                                                             client_keys=[client_key_path])
+    elapsed = time.perf_counter() - start
+    done.set()
+    watcher.join()
+    failed = sum(1 for result in results if not result[1])
+    # The watcher itself is not part of the engine; adaptive reports its starting and final limit
+    return concurrency, elapsed, rows[0], failed, peak_threads[0] - 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the thread and asyncio inventory engines against a fake SSH fleet.')
+    parser.add_argument('--hosts', type=int, default=500, help='simulated servers')
+    parser.add_argument('--rows', type=int, default=20, help='inventory rows printed per server')
+    parser.add_argument('--latency', default='0.05,0.5', help='min,max seconds a simulated db_inventory.sh run takes')
+    parser.add_argument('--capacity', type=int, default=0,
+                        help='concurrent runs the fake fleet handles before slowing down (0: unlimited)')
+    parser.add_argument('--threads', type=int, default=manager.MAX_WORKERS, help='thread engine workers')
+    parser.add_argument('--connections', type=int, default=orapatch_async_inventory.ASYNC_MAX_CONNECTIONS,
+                        help='async engine concurrent connections')
+    parser.add_argument('--engines', default='thread,adaptive,async',
+                        help='comma-separated engines to run: thread (fixed --threads), adaptive (AIMD from --threads '
+                             'up to --connections) or async')
+    args = parser.parse_args()
+    latency = tuple(float(value) for value in args.latency.split(','))
+
+    with tempfile.TemporaryDirectory() as directory:
+        # paramiko and asyncssh both look for client keys under ~/.ssh, so point HOME at a scratch one
+        os.makedirs(os.path.join(directory, '.ssh'))
+        os.environ['HOME'] = directory
+        host_key_path = os.path.join(directory, 'ssh_host_key')
+        client_key_path = os.path.join(directory, '.ssh', 'id_ed25519')
+        asyncssh.generate_private_key('ssh-ed25519').write_private_key(host_key_path)
+        asyncssh.generate_private_key('ssh-ed25519').write_private_key(client_key_path)
+        script_path = os.path.join(directory, 'db_inventory.sh')
+        with open(script_path, 'w') as f:
+            f.write('# stand-in for db_inventory.sh\n')
+
+        port_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=fake_inventory_server,
+                                         args=(host_key_path, args.rows, latency, 0, port_queue, args.capacity),
+                                         daemon=True)
+        server.start()
+        port = port_queue.get(timeout=30)
+        servers = [f"127.0.0.1:{port}"] * args.hosts
+        # Both engines refuse unknown host keys, so trust the fake fleet's key the way ssh would record it
+        with open(os.path.join(directory, '.ssh', 'known_hosts'), 'w') as f:
+            f.write(f"[127.0.0.1]:{port} {asyncssh.read_private_key(host_key_path).export_public_key().decode()}")
+
+        print(f"{args.hosts} hosts, {args.rows} rows each, latency {latency[0]}-{latency[1]}s, "
+              f"capacity {args.capacity or 'unlimited'}")
+        print(f"{'engine':<8} {'concurrency':>11} {'seconds':>8} {'hosts/sec':>10} {'rows':>8} {'failed':>7} {'threads':>8}")
+        for engine in args.engines.split(','):
+            concurrency, elapsed, rows, failed, threads = run_engine(engine, servers, script_path, args, client_key_path)
+            print(f"{engine:<8} {concurrency:>11} {elapsed:>8.2f} {args.hosts / elapsed:>10.1f} "
+                  f"{rows:>8} {failed:>7} {threads:>8}")
+        server.terminate()
@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import inventory_schema
+from inventory_schema import INVENTORY_COLUMNS, INVENTORY_SCHEMA
+
+# python bench_inventory_schema.py --keys 100 --hosts 1000 --homes 10
+# Builds a 1M-row TAB_CREATEINVENTORY in the old all-TEXT, unindexed layout, times the queries
+# PatchMap.py and GenMapYaml.py run, migrates it with inventory_schema.migrate() and times them again.
+# Row counts can differ on numeric filters: on TEXT columns FREE_PCT < 10 compares as strings.
+
+PER_HOST_SAMPLE = 50  # GenMapYaml runs its query once per host; a full scan each time makes 1000 hosts take minutes
+
+QUERIES = [
+    ("PatchMap: one key",
+     "SELECT DBI_HOST, DBI_KEY, ORA_SID, ORA_HOME, DB_RELEASE, OPATCH_VERSION FROM TAB_CREATEINVENTORY "
+     "WHERE INVENTORYKEY = ?", 'key'),
+    (f"GenMapYaml: {PER_HOST_SAMPLE} hosts",
+     "SELECT DISTINCT ORAINV FROM TAB_CREATEINVENTORY WHERE DBI_HOST = ? AND INVENTORYKEY = ?", 'per_host'),
+    ("One home of one host",
+     "SELECT * FROM TAB_CREATEINVENTORY WHERE INVENTORYKEY = ? AND DBI_HOST = ? AND ORA_HOME = ?", 'home'),
+    ("Homes under 10% free",
+     "SELECT DBI_HOST, ORA_HOME, FREE_PCT FROM TAB_CREATEINVENTORY WHERE INVENTORYKEY = ? AND FREE_PCT < 10", 'key'),
+    ("Fleet SGA total",
+     "SELECT SUM(SGA_TARGET), MAX(CPUCOUNT) FROM TAB_CREATEINVENTORY WHERE INVENTORYKEY = ?", 'key'),
+]
+
+
+def synthetic_rows(keys, hosts, homes, seed=0):
+    """Yield rows shaped like db_inventory.sh output, with numbers as the text the script prints."""
+    rng = random.Random(seed)
+    types = dict(INVENTORY_SCHEMA)
+    for k in range(keys):
+        inventory_key = f"INVKEY2023{k // 30 + 1:02d}{k % 30 + 1:02d}010000"
+        for h in range(hosts):
+            host = f"dbhost{h:04d}"
+            for o in range(homes):
+                row = [inventory_key]
+                for name in INVENTORY_COLUMNS:
+                    if name == 'DBI_HOST':
+                        row.append(host)
+                    elif name == 'ORA_HOME':
+                        row.append(f"/u01/app/oracle/product/19.0.0/dbhome_{o}")
+                    elif name == 'ORAINV':
+                        row.append("/u01/app/oraInventory")
+                    elif types[name] == 'NUMERIC':
+                        row.append(f"{rng.uniform(0, 100):.1f}")
+                    elif types[name] == 'INTEGER':
+                        row.append(str(rng.randint(1, 64)) if rng.random() > 0.05 else 'unknown')
+                    else:
+                        row.append(f"{name.lower()}_{o}")
+                yield row
+
+
+def build_legacy(db, rows):
+    conn = sqlite3.connect(db)
+    columns = ['INVENTORYKEY'] + INVENTORY_COLUMNS
+    conn.execute(f"CREATE TABLE TAB_CREATEINVENTORY({', '.join(f'{c} TEXT' for c in columns)})")
+    with conn:
+        conn.executemany(f"INSERT INTO TAB_CREATEINVENTORY VALUES ({', '.join('?' * len(columns))})", rows)
+    conn.close()
+
+
+def time_queries(db, keys, hosts, repeat):
+    conn = sqlite3.connect(db)
+    key = f"INVKEY2023{(keys - 1) // 30 + 1:02d}{(keys - 1) % 30 + 1:02d}010000"
+    home = "/u01/app/oracle/product/19.0.0/dbhome_0"
+    timings = []
+    for label, sql, shape in QUERIES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if shape == 'per_host':
+                found = sum(len(conn.execute(sql, (f"dbhost{h:04d}", key)).fetchall())
+                            for h in range(min(hosts, PER_HOST_SAMPLE)))
+            elif shape == 'home':
+                found = len(conn.execute(sql, (key, "dbhost0000", home)).fetchall())
+            else:
+                found = len(conn.execute(sql, (key,)).fetchall())
+        timings.append((label, (time.perf_counter() - start) / repeat * 1000, found))
+    conn.close()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time inventory queries before and after the typed, indexed schema.')
+    parser.add_argument('--keys', type=int, default=100, help='inventory runs (INVENTORYKEY values)')
+    parser.add_argument('--hosts', type=int, default=1000, help='hosts per run')
+    parser.add_argument('--homes', type=int, default=10, help='rows (homes) per host')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per query, averaged')
+    parser.add_argument('--dir', default=None, help='directory for the scratch database (default: system temp)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        db = os.path.join(directory, 'inventory.db')
+        start = time.perf_counter()
+        build_legacy(db, synthetic_rows(args.keys, args.hosts, args.homes))
+        print(f"Built {args.keys * args.hosts * args.homes} rows in {time.perf_counter() - start:.1f}s")
+
+        before = time_queries(db, args.keys, args.hosts, args.repeat)
+        start = time.perf_counter()
+        inventory_schema.migrate(db)
+        print(f"Migration (copy into typed table, index, analyze) took {time.perf_counter() - start:.1f}s")
+        after = time_queries(db, args.keys, args.hosts, args.repeat)
+
+    print(f"{'query':<28} {'before ms':>10} {'rows':>6} {'after ms':>10} {'rows':>6} {'speedup':>8}")
+    for (label, before_ms, before_rows), (_, after_ms, after_rows) in zip(before, after):
+        print(f"{label:<28} {before_ms:>10.1f} {before_rows:>6} {after_ms:>10.1f} {after_rows:>6} "
+              f"{before_ms / after_ms:>7.0f}x")
@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import orapatch_metadata_manager as manager
+from inventory_schema import INVENTORY_COLUMNS
+
+# python bench_inventory_writes.py --rows 50000 --servers 500
+# Point --dir at the filesystem that holds SQLITEDB_DIR: the gain comes from fewer fsyncs,
+# so a tmpfs or write-back cached disk will understate it.
+
+
+def synthetic_rows(rows, servers, seed=0):
+    """Yield (server, data_rows) batches shaped like db_inventory.sh output for TAB_CREATEINVENTORY."""
+    rng = random.Random(seed)
+    width = len(INVENTORY_COLUMNS) - 1  # DBI_HOST is added per server
+    per_server = max(1, rows // servers)
+    for i in range(servers):
+        server = f"dbhost{i:04d}"
+        data_rows = []
+        for j in range(per_server):
+            row = [f"{server}_{j}_{k}_{rng.randint(0, 10 ** 6)}" for k in range(width)]
+            data_rows.append([server] + row)
+        yield server, data_rows
+
+
+def create_table(db):
+    conn = sqlite3.connect(db)
+    columns = ['INVENTORYKEY'] + INVENTORY_COLUMNS
+    conn.execute(f"CREATE TABLE TAB_CREATEINVENTORY({', '.join(f'{c} TEXT' for c in columns)})")
+    conn.commit()
+    conn.close()
+
+
+def legacy_save(conn, cursor, data_rows, inventory_key):
+    # The previous save_to_sqlite: one INSERT string and execute per row, one commit per server
+    for row in data_rows:
+        row = [inventory_key] + row
+        query = "INSERT INTO TAB_CREATEINVENTORY VALUES (? " + ", ?" * (len(row) - 1) + ")"
+        cursor.execute(query, row)
+    conn.commit()
+
+
+def bench_before(db, batches, inventory_key):
+    # Returns (total seconds, seconds the inventory loop was blocked on writes)
+    conn = sqlite3.connect(db)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    for server, data_rows in batches:
+        legacy_save(conn, cursor, data_rows, inventory_key)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, elapsed
+
+
+def bench_after(db, batches, inventory_key):
+    manager.inventory_key = inventory_key
+    start = time.perf_counter()
+    writer = manager.InventoryWriter(db)
+    blocked = 0.0
+    for server, data_rows in batches:
+        call_start = time.perf_counter()
+        manager.save_to_sqlite(writer, server, data_rows, 'CreateInventory')
+        writer.end_server(server, True)
+        blocked += time.perf_counter() - call_start
+    writer.close()
+    return time.perf_counter() - start, blocked
+
+
+def count_rows(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT COUNT(*) FROM TAB_CREATEINVENTORY").fetchone()[0]
+    conn.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark TAB_CREATEINVENTORY inserts before and after the batched writer.')
+    parser.add_argument('--rows', type=int, default=50000, help='total synthetic rows')
+    parser.add_argument('--servers', type=int, default=500, help='servers the rows are spread over')
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases (default: system temp)')
+    args = parser.parse_args()
+
+    batches = list(synthetic_rows(args.rows, args.servers))
+    inventory_key = 'INVKEY' + time.strftime('%Y%m%d%H%M%S')
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        results = []
+        for label, bench in (("before (per-row execute, commit per server)", bench_before),
+                             ("after (writer thread, executemany, WAL)", bench_after)):
+            db = os.path.join(directory, f"{bench.__name__}.db")
+            create_table(db)
+            elapsed, blocked = bench(db, batches, inventory_key)
+            rows = count_rows(db)
+            results.append(rows / elapsed)
+            print(f"{label:<46}: {rows} rows in {elapsed:6.2f}s = {rows / elapsed:10.0f} rows/sec, "
+                  f"inventory loop blocked {blocked:6.2f}s")
+
+    print(f"Speedup: {results[1] / results[0]:.1f}x")
+    sys.exit(0)
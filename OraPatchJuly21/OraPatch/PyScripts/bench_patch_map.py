@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import inventory_schema
+import PatchMap
+import reference_schema
+from inventory_schema import INVENTORY_COLUMNS
+
+try:
+    import pandas as pd
+except ImportError:  # Only the previous implementation, timed for comparison, needs pandas
+    pd = None
+
+# python bench_patch_map.py --hosts 5000 --homes 4 --sids 3
+# Builds a synthetic fleet on the typed inventory schema with PATCH_ZIP and PATCH_COMPATABILITY_MATRIX
+# (and their keyed forms) copied from the shipped SQLiteDB, then builds PATCH_MAP_STAGE and PATCH_MAP the
+# previous way (query run twice, rows round-tripped through a DataFrame) and with
+# PatchMap.execute_sql_query, and compares.
+
+REFERENCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SQLiteDB",
+                            "orapatch_metadata_sqlite_db.db")
+INVENTORY_KEY = 'INVKEY20230601010000'
+RELEASES = ['11g', '12cR1', '12cR2', '18c', '19c']
+
+
+def legacy_execute_sql_query(query, table_name, db):
+    # The implementation execute_sql_query replaced
+    with sqlite3.connect(db) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        df = pd.read_sql_query(query, conn)
+        cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
+        df.to_sql(table_name, conn, if_exists='replace', index=False)
+    conn.close()
+
+
+def build_fleet(db, hosts, homes, sids, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db)
+    cursor = conn.cursor()
+    inventory_schema.create_inventory_table(cursor, 'TAB_CREATEINVENTORY')
+    cursor.execute('''
+        CREATE TABLE TAB_INVENTORY_HOSTS(
+        INVENTORYKEY TEXT, DBI_HOST TEXT, ROWS_KEY TEXT, FINGERPRINT TEXT,
+        PRIMARY KEY (INVENTORYKEY, DBI_HOST))
+    ''')
+    inventory_schema.create_inventory_view(cursor)
+    cursor.execute(f"ATTACH DATABASE '{REFERENCE_DB}' AS ref")
+    for table in ('PATCH_ZIP', 'PATCH_COMPATABILITY_MATRIX'):
+        cursor.execute(f"CREATE TABLE {table} AS SELECT * FROM ref.{table}")
+    conn.commit()
+    cursor.execute("DETACH DATABASE ref")
+    reference_schema.rebuild_reference_tables(db, list(reference_schema.REFERENCE_TABLES))
+
+    rows = []
+    for h in range(hosts):
+        host = f"dbhost{h:05d}"
+        for o in range(homes):
+            release = rng.choice(RELEASES)
+            for s in range(sids):
+                values = {'DBI_HOST': host, 'DBI_KEY': f"{host}_{o}_{s}", 'ORA_SID': f"SID{o}{s}",
+                          'ORA_HOME': f"/u01/app/oracle/product/{release}/dbhome_{o}", 'OS_NAME': 'Linux',
+                          'DB_RELEASE': release, 'VERSION': release, 'OPATCH_VERSION': '12.2.0.1.36'}
+                rows.append([INVENTORY_KEY] + [values.get(column, 'Y') for column in INVENTORY_COLUMNS])
+    cursor.executemany(f"INSERT INTO TAB_CREATEINVENTORY VALUES ({', '.join('?' * (len(INVENTORY_COLUMNS) + 1))})", rows)
+    cursor.executemany("INSERT INTO TAB_INVENTORY_HOSTS VALUES (?, ?, ?, NULL)",
+                       [(INVENTORY_KEY, f"dbhost{h:05d}", INVENTORY_KEY) for h in range(hosts)])
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def build_patch_map(execute, db):
+    query_1, query_2 = PatchMap.patch_map_queries(INVENTORY_KEY)
+    timings = []
+    for query, table_name in ((query_1, 'PATCH_MAP_STAGE'), (query_2, 'PATCH_MAP')):
+        start = time.perf_counter()
+        execute(query, table_name, db)
+        timings.append(time.perf_counter() - start)
+    conn = sqlite3.connect(db)
+    tables = {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+              for table in ('PATCH_MAP_STAGE', 'PATCH_MAP')}
+    conn.close()
+    return timings, tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time PATCH_MAP materialisation: pandas round-trip vs in-database.')
+    parser.add_argument('--hosts', type=int, default=5000, help='servers in the synthetic fleet')
+    parser.add_argument('--homes', type=int, default=4, help='Oracle homes per server')
+    parser.add_argument('--sids', type=int, default=3, help='databases per home')
+    parser.add_argument('--dir', default=None, help='directory for the scratch database (default: system temp)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        db = os.path.join(directory, 'patch_map.db')
+        rows = build_fleet(db, args.hosts, args.homes, args.sids)
+        print(f"{rows} inventory rows, {args.hosts} hosts")
+
+        methods = [("in-database", PatchMap.execute_sql_query)]
+        if pd is not None:
+            methods.insert(0, ("pandas round-trip", legacy_execute_sql_query))
+        else:
+            print("pandas not installed: timing the in-database build only")
+
+        results = []
+        for label, execute in methods:
+            (stage_seconds, map_seconds), tables = build_patch_map(execute, db)
+            results.append(tables)
+            print(f"{label:<18}: PATCH_MAP_STAGE {stage_seconds * 1000:8.1f} ms ({len(tables['PATCH_MAP_STAGE'])} rows), "
+                  f"PATCH_MAP {map_seconds * 1000:8.1f} ms ({len(tables['PATCH_MAP'])} rows), "
+                  f"total {(stage_seconds + map_seconds) * 1000:8.1f} ms")
+        if len(results) == 2:
+            print(f"Identical tables: {results[0] == results[1]}")
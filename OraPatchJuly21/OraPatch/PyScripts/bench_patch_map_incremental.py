@@ -0,0 +1,95 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import PatchMap
+from bench_patch_map import INVENTORY_KEY, RELEASES, build_fleet
+from inventory_schema import INVENTORY_COLUMNS
+
+# python bench_patch_map_incremental.py --hosts 8000 --changed 0 10 100 1000
+# Builds a synthetic fleet (see bench_patch_map.py) and its patch map, then for each --changed count
+# adds a second inventory key the way DeltaInventory does: that many hosts get new rows (an OPatch
+# upgrade on one home, a release change on another; one host is also retired and one added), the
+# rest point at their previous rows. Times PatchMap.update_patch_map against a full rebuild of the
+# same key and checks that both leave identical PATCH_MAP_STAGE and PATCH_MAP tables.
+
+NEXT_KEY = 'INVKEY20230701010000'
+
+
+def add_next_key(db, hosts, changed):
+    conn = sqlite3.connect(db)
+    cursor = conn.cursor()
+    columns = ', '.join(INVENTORY_COLUMNS)
+    changed_hosts = [f"dbhost{h:05d}" for h in range(changed)]
+    for host in changed_hosts:
+        cursor.execute(f"INSERT INTO TAB_CREATEINVENTORY SELECT ?, {columns} FROM TAB_CREATEINVENTORY "
+                       f"WHERE INVENTORYKEY = ? AND DBI_HOST = ?", (NEXT_KEY, INVENTORY_KEY, host))
+        cursor.execute("UPDATE TAB_CREATEINVENTORY SET OPATCH_VERSION = '12.2.0.1.37' "
+                       "WHERE INVENTORYKEY = ? AND DBI_HOST = ? AND ORA_HOME LIKE '%dbhome_0'", (NEXT_KEY, host))
+        cursor.execute("UPDATE TAB_CREATEINVENTORY SET DB_RELEASE = ?, VERSION = ? "
+                       "WHERE INVENTORYKEY = ? AND DBI_HOST = ? AND ORA_HOME LIKE '%dbhome_1'",
+                       (RELEASES[-1], RELEASES[-1], NEXT_KEY, host))
+    host_rows = [(NEXT_KEY, f"dbhost{h:05d}", NEXT_KEY if h < changed else INVENTORY_KEY) for h in range(hosts)]
+    if changed:
+        # A retired host and a new one, built from the first host's rows
+        host_rows.pop()
+        new_host = f"dbhost{hosts:05d}"
+        cursor.execute(f"INSERT INTO TAB_CREATEINVENTORY SELECT ?, ?, {columns.replace('DBI_HOST, ', '', 1)} "
+                       f"FROM TAB_CREATEINVENTORY WHERE INVENTORYKEY = ? AND DBI_HOST = ?",
+                       (NEXT_KEY, new_host, INVENTORY_KEY, changed_hosts[0]))
+        host_rows.append((NEXT_KEY, new_host, NEXT_KEY))
+    cursor.executemany("INSERT INTO TAB_INVENTORY_HOSTS VALUES (?, ?, ?, NULL)", host_rows)
+    conn.commit()
+    conn.close()
+
+
+def patch_map_tables(db):
+    conn = sqlite3.connect(db)
+    tables = {table: conn.execute(f"SELECT * FROM {table} ORDER BY SERVERNAME, ORACLE_HOME, "
+                                  f"{'DBI_KEY' if table == 'PATCH_MAP_STAGE' else 'SID'}").fetchall()
+              for table in ('PATCH_MAP_STAGE', 'PATCH_MAP')}
+    conn.close()
+    return tables
+
+
+def full_build(inventory_key, db):
+    for query, table_name in zip(PatchMap.patch_map_queries(inventory_key), ('PATCH_MAP_STAGE', 'PATCH_MAP')):
+        PatchMap.execute_sql_query(query, table_name, db)
+    PatchMap.finish_full_build(inventory_key, db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the incremental patch map update against a full rebuild.')
+    parser.add_argument('--hosts', type=int, default=8000, help='servers in the synthetic fleet')
+    parser.add_argument('--homes', type=int, default=4, help='Oracle homes per server')
+    parser.add_argument('--sids', type=int, default=3, help='databases per home')
+    parser.add_argument('--changed', type=int, nargs='+', default=[0, 10, 100, 1000], help='hosts changed in the next key')
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases (default: system temp)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        base = os.path.join(directory, 'base.db')
+        rows = build_fleet(base, args.hosts, args.homes, args.sids)
+        full_build(INVENTORY_KEY, base)
+        print(f"{rows} inventory rows, {args.hosts} hosts")
+
+        for changed in args.changed:
+            db = os.path.join(directory, f'changed_{changed}.db')
+            shutil.copy(base, db)
+            add_next_key(db, args.hosts, changed)
+
+            start = time.perf_counter()
+            homes = PatchMap.update_patch_map(NEXT_KEY, INVENTORY_KEY, db)
+            incremental_seconds = time.perf_counter() - start
+            incremental = patch_map_tables(db)
+
+            start = time.perf_counter()
+            full_build(NEXT_KEY, db)
+            full_seconds = time.perf_counter() - start
+
+            print(f"{changed:6d} hosts changed: {homes:6d} homes rebuilt in {incremental_seconds * 1000:8.1f} ms, "
+                  f"full rebuild {full_seconds * 1000:8.1f} ms, identical: {incremental == patch_map_tables(db)}")
+            os.remove(db)
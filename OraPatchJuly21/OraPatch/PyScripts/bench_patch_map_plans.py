@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import PatchMap
+from bench_patch_map import INVENTORY_KEY, build_fleet
+
+# python bench_patch_map_plans.py --rows 1000 10000 100000 --out plans.json [--baseline plans_before.json]
+# Builds a synthetic fleet of each size (see bench_patch_map.py), records SQLite's EXPLAIN QUERY PLAN
+# for both patch map queries and times PatchMap.execute_sql_query on them. With --baseline, a plan
+# that changed or a build more than --slowdown times slower than the recorded one is reported as a
+# regression and the exit status is 1, so a change to the queries, the keyed reference tables or
+# their indexes can be checked before it ships.
+
+TABLES = ('PATCH_MAP_STAGE', 'PATCH_MAP')
+SLOWDOWN = 1.5  # Slower than the baseline by this factor counts as a regression.
+
+
+def query_plan(db, query):
+    # The detail column only; the ids differ between SQLite versions without the plan changing
+    conn = sqlite3.connect(db)
+    try:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+    finally:
+        conn.close()
+
+
+def measure(rows, homes, sids, repeat, directory):
+    hosts = max(1, rows // (homes * sids))
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        db = os.path.join(scratch, 'patch_map.db')
+        inventory_rows = build_fleet(db, hosts, homes, sids)
+        record = {'rows': rows, 'inventory_rows': inventory_rows, 'hosts': hosts, 'plans': {}, 'seconds': {}}
+        for query, table_name in zip(PatchMap.patch_map_queries(INVENTORY_KEY), TABLES):
+            record['plans'][table_name] = query_plan(db, query)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                PatchMap.execute_sql_query(query, table_name, db)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            record['seconds'][table_name] = best
+        return record
+
+
+def regressions(records, baseline, slowdown):
+    previous = {record['rows']: record for record in baseline}
+    found = []
+    for record in records:
+        before = previous.get(record['rows'])
+        if before is None:
+            continue
+        for table_name in TABLES:
+            if record['plans'][table_name] != before['plans'].get(table_name):
+                found.append(f"{record['rows']} rows, {table_name}: plan changed\n"
+                             f"    was: {before['plans'].get(table_name)}\n"
+                             f"    now: {record['plans'][table_name]}")
+            seconds, was = record['seconds'][table_name], before['seconds'].get(table_name)
+            if was and seconds > was * slowdown:
+                found.append(f"{record['rows']} rows, {table_name}: {seconds * 1000:.1f} ms against {was * 1000:.1f} ms")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Record query plans and build times of the patch map at several fleet sizes.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='inventory rows per fleet')
+    parser.add_argument('--homes', type=int, default=4, help='Oracle homes per server')
+    parser.add_argument('--sids', type=int, default=3, help='databases per home')
+    parser.add_argument('--repeat', type=int, default=3, help='builds per size; the fastest is recorded')
+    parser.add_argument('--out', default=None, help='write the plans and timings to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON file from an earlier --out to compare against')
+    parser.add_argument('--slowdown', type=float, default=SLOWDOWN, help='slowdown factor reported as a regression')
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases (default: system temp)')
+    args = parser.parse_args()
+
+    records = []
+    for rows in args.rows:
+        record = measure(rows, args.homes, args.sids, args.repeat, args.dir)
+        records.append(record)
+        print(f"{record['inventory_rows']} inventory rows, {record['hosts']} hosts: "
+              + ', '.join(f"{table_name} {record['seconds'][table_name] * 1000:.1f} ms" for table_name in TABLES))
+        for table_name in TABLES:
+            for line in record['plans'][table_name]:
+                print(f"    {table_name}: {line}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'sqlite_version': sqlite3.sqlite_version, 'records': records}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(records, json.load(f)['records'], args.slowdown)
+        for line in found:
+            print(f"REGRESSION :: {line}")
+        if found:
+            sys.exit(1)
+        print("No plan changes or slowdowns against the baseline")
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+
+import asyncssh
+import paramiko
+
+import script_bundle
+
+# python bench_script_bundle.py --tasks 50 --script db_fingerprint.sh
+# Runs one ShellScripts script --tasks times on a local SSH server that really executes the
+# commands (in a scratch home directory), first piped through `bash -s` as before, then from the
+# cached bundle. Reports bytes uploaded and latency per task.
+
+SHELL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ShellScripts")
+
+
+def exec_server(home, host_key_path, port_queue):
+    """A local sshd stand-in: every command runs under bash in home with the session's stdin and stdout."""
+    class NoAuthServer(asyncssh.SSHServer):
+        def begin_auth(self, username):
+            return False
+
+    async def handle(process):
+        local = await asyncio.create_subprocess_shell(process.command, cwd=home, stdin=asyncio.subprocess.PIPE,
+                                                      stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        await process.redirect(stdin=local.stdin, stdout=local.stdout, stderr=local.stderr)
+        process.exit(await local.wait())
+
+    async def serve():
+        server = await asyncssh.create_server(NoAuthServer, '127.0.0.1', 0, server_host_keys=[host_key_path],
+                                              process_factory=handle, encoding=None)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    warnings.simplefilter("ignore", RuntimeWarning)  # asyncssh redirect teardown noise in the fake server
+    asyncio.run(serve())
+
+
+def run_piped(ssh, script_path):
+    # The previous run_local_script/run_script_over_ssh path
+    with open(script_path, 'rb') as script_file:
+        script_data = script_file.read()
+    stdin, stdout, stderr = ssh.exec_command('bash -s')
+    stdin.write(script_data)
+    stdin.flush()
+    stdin.channel.shutdown_write()
+    output = stdout.read()
+    stdout.channel.recv_exit_status()
+    return len(script_data), output
+
+
+def run_bundled(ssh, server, script_path):
+    bundle = script_bundle.bundle_for(script_path)
+    pushed = not bundle.is_verified(server)
+    stdin, stdout, stderr = script_bundle.exec_bundled(ssh, server, script_path)
+    output = stdout.read()
+    stdout.channel.recv_exit_status()
+    # The push happens at most once per host and bundle version; a verified host uploads nothing
+    return (len(bundle.data) if pushed else 0), output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare piping scripts through bash -s with the cached script bundle.')
+    parser.add_argument('--tasks', type=int, default=50, help='script runs per method')
+    parser.add_argument('--script', default='db_fingerprint.sh', help='script in ShellScripts/ to run (must be safe to run locally)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        home = os.path.join(directory, 'home')
+        os.makedirs(os.path.join(home, '.ssh'))
+        os.environ['HOME'] = home
+        host_key_path = os.path.join(directory, 'ssh_host_key')
+        asyncssh.generate_private_key('ssh-ed25519').write_private_key(host_key_path)
+        asyncssh.generate_private_key('ssh-ed25519').write_private_key(os.path.join(home, '.ssh', 'id_ed25519'))
+
+        port_queue = multiprocessing.Queue()
+        server_process = multiprocessing.Process(target=exec_server, args=(home, host_key_path, port_queue), daemon=True)
+        server_process.start()
+        port = port_queue.get(timeout=30)
+
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect('127.0.0.1', port=port, timeout=30)
+        # Both methods on equal terms: otherwise either can stall ~40ms a task on Nagle/delayed ACK
+        script_bundle.set_nodelay(ssh.get_transport().sock)
+        script_path = os.path.join(SHELL_DIR, args.script)
+        server = f"127.0.0.1:{port}"
+
+        results = []
+        for label, run in (("bash -s (upload every task)", lambda: run_piped(ssh, script_path)),
+                           ("bundle (push once, run cached)", lambda: run_bundled(ssh, server, script_path))):
+            uploaded, outputs = 0, set()
+            latencies = []
+            for _ in range(args.tasks):
+                start = time.perf_counter()
+                sent, output = run()
+                latencies.append(time.perf_counter() - start)
+                uploaded += sent
+                outputs.add(output)
+            results.append(outputs)
+            first, median = latencies[0], sorted(latencies)[len(latencies) // 2]
+            print(f"{label:<32}: {uploaded:>9} bytes uploaded, {uploaded / args.tasks:>8.0f} bytes/task, "
+                  f"first task {first * 1000:6.1f} ms, median {median * 1000:6.1f} ms")
+        ssh.close()
+        server_process.terminate()
+
+        bundles = os.listdir(os.path.join(home, script_bundle.REMOTE_BUNDLE_ROOT))
+        print(f"Same output from both methods: {results[0] == results[1]}; bundles cached on host: {bundles}")
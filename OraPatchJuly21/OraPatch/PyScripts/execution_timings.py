@@ -0,0 +1,84 @@
+import threading
+import collections
+import contextlib
+import time
+
+from adaptive_concurrency import percentile
+
+# Per-phase timings of the remote runs, so a slow host can be told apart as slow to connect, to
+# authenticate, to receive the script bundle, to run the script, or to have its output parsed and
+# stored. Kept in memory during the run, persisted into execution_phase_timings next to
+# execution_results, and summarised for the mail report.
+
+PHASES = ('connect', 'auth', 'upload', 'execute', 'parse', 'insert')
+SUMMARY_PERCENTILES = (50, 95)
+SLOWEST_HOSTS = 10  # Hosts listed in the report's slowest-hosts table.
+
+
+def create_phase_table(cursor):
+    # Like execution_results, it describes the latest run only
+    cursor.execute('DROP TABLE IF EXISTS execution_phase_timings')
+    cursor.execute('''
+        CREATE TABLE execution_phase_timings(
+        server TEXT,
+        script TEXT,
+        phase TEXT,
+        seconds REAL
+        )
+    ''')
+
+
+class PhaseTimings:
+    """
+    Thread-safe accumulator of seconds per (server, script, phase). Adding to the same phase twice
+    sums, so per-row phases like parse and insert can be added as they happen.
+    """
+
+    def __init__(self):
+        self._seconds = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, server, script, phase, seconds):
+        with self._lock:
+            self._seconds[(server, script, phase)] += seconds
+
+    @contextlib.contextmanager
+    def measure(self, server, script, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(server, script, phase, time.perf_counter() - start)
+
+    def rows(self):
+        with self._lock:
+            return [(server, script, phase, seconds) for (server, script, phase), seconds in self._seconds.items()]
+
+    def save(self, cursor):
+        create_phase_table(cursor)
+        cursor.executemany('INSERT INTO execution_phase_timings VALUES (?, ?, ?, ?)', self.rows())
+
+    def summary(self):
+        """
+        Returns (phases, slowest_hosts) for the mail template: p50/p95/max per script and phase,
+        and the SLOWEST_HOSTS hosts by total time with the phase that cost them the most.
+        """
+        by_phase = collections.defaultdict(list)
+        by_host = collections.defaultdict(lambda: collections.defaultdict(float))
+        for server, script, phase, seconds in self.rows():
+            by_phase[(script, phase)].append(seconds)
+            by_host[server][f"{script} {phase}"] += seconds
+
+        order = {phase: index for index, phase in enumerate(PHASES)}
+        phases = []
+        for (script, phase), samples in sorted(by_phase.items(), key=lambda item: (item[0][0], order.get(item[0][1], len(order)))):
+            samples.sort()
+            stats = {f"p{pct}": percentile(samples, pct) for pct in SUMMARY_PERCENTILES}
+            phases.append({'script': script, 'phase': phase, 'hosts': len(samples), **stats, 'max': samples[-1]})
+
+        slowest_hosts = []
+        for server, spent in sorted(by_host.items(), key=lambda item: sum(item[1].values()), reverse=True)[:SLOWEST_HOSTS]:
+            worst_phase, worst_seconds = max(spent.items(), key=lambda item: item[1])
+            slowest_hosts.append({'server': server, 'total': sum(spent.values()),
+                                  'worst_phase': worst_phase, 'worst_seconds': worst_seconds})
+        return phases, slowest_hosts
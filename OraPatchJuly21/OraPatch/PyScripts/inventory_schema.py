@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import yaml
+import sqlite3
+
+# Schema of the inventory tables written by orapatch_metadata_manager.py.
+#
+# Numeric columns are declared INTEGER or NUMERIC so SQLite stores them as numbers and compares
+# them numerically; values db_inventory.sh reports as 'unknown' keep their text under those
+# affinities, so nothing is lost. NUMERIC keeps whole numbers as integers, so the CSV exports
+# print '1234' and '53' as the script reported them rather than '1234.0'. Migrate an existing database once with:
+#
+#     python inventory_schema.py [path/to/orapatch_metadata_sqlite_db.db]
+
+# Columns of one db_inventory.sh output row, prefixed with DBI_HOST (TAB_PREPATCH/TAB_POSTPATCH layout)
+INVENTORY_SCHEMA = [
+    ('DBI_HOST', 'TEXT'), ('DBI_KEY', 'TEXT'), ('ORA_SID', 'TEXT'), ('ORA_HOME', 'TEXT'),
+    ('AUTO_START', 'TEXT'), ('HOME_EXIST', 'TEXT'), ('HOME_ACTIVE', 'TEXT'), ('HOME_TYPE', 'TEXT'),
+    ('SID_STATUS', 'TEXT'), ('DB_STATUS', 'TEXT'), ('SQLPLUS_VERSION', 'TEXT'), ('DB_RELEASE', 'TEXT'),
+    ('OPATCH_VERSION', 'TEXT'), ('PATCH_HISTORY', 'TEXT'), ('PATCH_DATE', 'TEXT'), ('LISTENER_DATA', 'TEXT'),
+    ('OS_USER', 'TEXT'), ('PRIMARY_GROUP', 'TEXT'),
+    # The df -h sizes carry their unit, e.g. '148G' or '512M'
+    ('TOTAL_GB', 'TEXT'), ('USED_GB', 'TEXT'), ('FREE_GB', 'TEXT'), ('USED_PCT', 'INTEGER'), ('FREE_PCT', 'INTEGER'),
+    ('OS_NAME', 'TEXT'), ('OS_KERNEL', 'TEXT'), ('OS_SHELL', 'TEXT'),
+    ('SERVER_CPU', 'INTEGER'), ('SERVER_RAM', 'TEXT'),  # SERVER_RAM carries its unit, e.g. '15876.3 MB'
+    ('JCHEM_STATUS', 'TEXT'), ('ORAINV', 'TEXT'), ('ROWSTART', 'TEXT'), ('INSTANCE_NAME', 'TEXT'),
+    ('HOST_NAME', 'TEXT'), ('VERSION', 'TEXT'), ('STARTUP_TIME', 'TEXT'), ('STATUS', 'TEXT'), ('LOGINS', 'TEXT'),
+    ('DATABASE_STATUS', 'TEXT'), ('INSTANCE_ROLE', 'TEXT'), ('DBID', 'INTEGER'), ('NAME', 'TEXT'),
+    ('CREATED', 'TEXT'), ('RESETLOGS_TIME', 'TEXT'), ('LOG_MODE', 'TEXT'), ('OPEN_MODE', 'TEXT'),
+    ('PROTECTION_MODE', 'TEXT'), ('PROTECTION_LEVEL', 'TEXT'), ('DATABASE_ROLE', 'TEXT'),
+    ('FORCE_LOGGING', 'TEXT'), ('PLATFORM_ID', 'INTEGER'), ('PLATFORM_NAME', 'TEXT'), ('FLASHBACK_ON', 'TEXT'),
+    ('DB_UNIQUE_NAME', 'TEXT'), ('IS_DG', 'TEXT'), ('DG_TNS', 'TEXT'), ('IS_RAC', 'TEXT'), ('RAC_NODE', 'TEXT'),
+    ('WALLET_LOCATION', 'TEXT'), ('WALLET_STATUS', 'TEXT'), ('WALLET_TYPE', 'TEXT'),
+    ('TDE_TBSCOUNT', 'INTEGER'), ('OFFLINE_DATAFILE', 'TEXT'), ('OFFLINE_TEMPFILE', 'TEXT'),
+    ('NEED_RECOVERY', 'TEXT'), ('IS_PDB', 'TEXT'), ('PDB_LIST', 'TEXT'),
+    ('PGA_LIMIT', 'INTEGER'), ('PGA_TARGET', 'INTEGER'), ('SGA_TARGET', 'INTEGER'), ('SGA_MAX', 'INTEGER'),
+    ('MEMORY_MAX', 'INTEGER'), ('MEMORY_TARGET', 'INTEGER'), ('CPUCOUNT', 'INTEGER'),
+    ('ALLOC_PGA_MB', 'NUMERIC'), ('TOTAL_SGA_MB', 'NUMERIC'), ('TOTALSIZE', 'NUMERIC'), ('DATAFILESIZE', 'NUMERIC'),
+    ('TEMPFILESIZE', 'NUMERIC'), ('SEGMENTSIZE', 'NUMERIC'), ('ROWEND', 'TEXT'),
+]
+INVENTORY_COLUMNS = [name for name, _ in INVENTORY_SCHEMA]
+
+# TAB_CREATEINVENTORY keeps every run under an INVENTORYKEY; the patch tables hold one run only
+INVENTORY_TABLES = {
+    'TAB_CREATEINVENTORY': [('INVENTORYKEY', 'TEXT')] + INVENTORY_SCHEMA,
+    'TAB_PREPATCH': INVENTORY_SCHEMA,
+    'TAB_POSTPATCH': INVENTORY_SCHEMA,
+}
+
+# PatchMap.py and GenMapYaml.py filter by key and host, then walk the homes of each host
+INVENTORY_INDEXES = {
+    'TAB_CREATEINVENTORY': [('IDX_CREATEINVENTORY_KEY_HOST_HOME', ('INVENTORYKEY', 'DBI_HOST', 'ORA_HOME'))],
+    'TAB_PREPATCH': [('IDX_PREPATCH_HOST_HOME', ('DBI_HOST', 'ORA_HOME'))],
+    'TAB_POSTPATCH': [('IDX_POSTPATCH_HOST_HOME', ('DBI_HOST', 'ORA_HOME'))],
+}
+
+
+def create_table_sql(table_name, create_as=None):
+    # create_as builds the table's schema under another name, as the migration does
+    columns = ', '.join(f'{name} {column_type}' for name, column_type in INVENTORY_TABLES[table_name])
+    if create_as:
+        return f"CREATE TABLE {create_as}({columns})"
+    return f"CREATE TABLE IF NOT EXISTS {table_name}({columns})"
+
+
+def create_inventory_table(cursor, table_name):
+    """Creates an inventory table with its declared types and indexes, if it does not exist yet."""
+    cursor.execute(create_table_sql(table_name))
+    create_indexes(cursor, table_name)
+
+
+def create_indexes(cursor, table_name):
+    for index_name, columns in INVENTORY_INDEXES[table_name]:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({', '.join(columns)})")
+
+
+def create_inventory_view(cursor):
+    # VIEW_CREATEINVENTORY resolves an INVENTORYKEY to its full snapshot through TAB_INVENTORY_HOSTS
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS VIEW_CREATEINVENTORY AS
+        SELECT h.INVENTORYKEY, {', '.join(f'i.{c}' for c in INVENTORY_COLUMNS)}
+        FROM TAB_INVENTORY_HOSTS h
+        JOIN TAB_CREATEINVENTORY i ON i.INVENTORYKEY = h.ROWS_KEY AND i.DBI_HOST = h.DBI_HOST
+    ''')
+
+
+def create_inventory_hosts(cursor):
+    """
+    TAB_INVENTORY_HOSTS maps every (INVENTORYKEY, DBI_HOST) to ROWS_KEY, the key its rows are
+    stored under, and keeps the host's fingerprint. A full run points hosts at their own key;
+    DeltaInventory points unchanged hosts at their previous rows instead of copying them.
+    VIEW_CREATEINVENTORY resolves any key to its full snapshot through this mapping.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'TAB_INVENTORY_HOSTS'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TAB_INVENTORY_HOSTS(
+        INVENTORYKEY TEXT,
+        DBI_HOST TEXT,
+        ROWS_KEY TEXT,
+        FINGERPRINT TEXT,
+        PRIMARY KEY (INVENTORYKEY, DBI_HOST)
+        )
+    ''')
+    if not exists:
+        # Keys written before the mapping existed hold their own rows
+        cursor.execute('''
+            INSERT INTO TAB_INVENTORY_HOSTS (INVENTORYKEY, DBI_HOST, ROWS_KEY)
+            SELECT DISTINCT INVENTORYKEY, DBI_HOST, INVENTORYKEY FROM TAB_CREATEINVENTORY
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS IDX_INVENTORY_HOSTS_HOST ON TAB_INVENTORY_HOSTS(DBI_HOST, INVENTORYKEY)')
+    create_inventory_view(cursor)
+
+
+def needs_migration(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    declared = [(row[1], row[2].upper()) for row in cursor.fetchall()]
+    return bool(declared) and declared != INVENTORY_TABLES[table_name]
+
+
+def migrate(db):
+    """
+    One-shot migration of an existing database to the typed, indexed schema. Each table whose
+    declared columns differ is rebuilt in one transaction: the rows are copied into a typed table,
+    which converts numeric text on insert, and the indexes are created on the result.
+    Tables already on the schema are only given any missing index. TAB_INVENTORY_HOSTS is created
+    and backfilled from the stored keys if missing, and VIEW_CREATEINVENTORY is always recreated.
+    Safe to run more than once.
+    """
+    # Autocommit mode with an explicit transaction, so the DDL is rolled back with the copy on failure
+    conn = sqlite3.connect(db, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.execute('BEGIN')
+        try:
+            # The view points at TAB_CREATEINVENTORY, so it is recreated around the rebuild
+            cursor.execute('DROP VIEW IF EXISTS VIEW_CREATEINVENTORY')
+            # Made redundant by the composite index
+            cursor.execute('DROP INDEX IF EXISTS IDX_CREATEINVENTORY_KEY_HOST')
+            for table_name in INVENTORY_TABLES:
+                if table_name not in existing:
+                    continue
+                if needs_migration(cursor, table_name):
+                    start = time.perf_counter()
+                    cursor.execute(f"PRAGMA table_info({table_name})")
+                    old_columns = {row[1] for row in cursor.fetchall()}
+                    columns = [name for name, _ in INVENTORY_TABLES[table_name] if name in old_columns]
+                    cursor.execute(create_table_sql(table_name, create_as=f"{table_name}_TYPED"))
+                    cursor.execute(f"INSERT INTO {table_name}_TYPED ({', '.join(columns)}) "
+                                   f"SELECT {', '.join(columns)} FROM {table_name}")
+                    cursor.execute(f"DROP TABLE {table_name}")
+                    cursor.execute(f"ALTER TABLE {table_name}_TYPED RENAME TO {table_name}")
+                    print(f"INFO :: Migrated {table_name} in {time.perf_counter() - start:.1f}s")
+                create_indexes(cursor, table_name)
+            # PatchMap.py and GenMapYaml.py read the view, so a database from before the mapping gets both
+            if 'TAB_CREATEINVENTORY' in existing:
+                create_inventory_hosts(cursor)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('ANALYZE')
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        db = sys.argv[1]
+    else:
+        # Default to the master database from global_config.yaml
+        global_config = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Config", "global_config.yaml")
+        with open(global_config, "r") as f:
+            config = yaml.safe_load(f)
+        db = os.path.join(config["SQLITEDB_DIR"], config["MASTER_DB"])
+
+    migrate(db)
@@ -2,6 +2,7 @@ import yaml
 import sys
 import threading
 import paramiko
+import script_bundle
 import os
 import sqlite3
 from datetime import datetime
@@ -162,13 +163,8 @@ def run_script(script_task, script_fqfn, src_type="local"):
         print(f"Invalid script type: {script_args}")
 
 def run_local_script(script_task, script_path, script_args):
-    with open(script_path, 'rb') as script_file:
-        script_data = script_file.read()
-
-    stdin, stdout, stderr = ssh.exec_command(f'bash -s - {script_args}')
-    stdin.write(script_data)
-    stdin.flush()
-    stdin.channel.shutdown_write()
+    # Run the host's cached copy of the script; the script directory is only pushed when it changed
+    stdin, stdout, stderr = script_bundle.exec_bundled(ssh, None, script_path, script_args)
 
     # Create threads for stdout and stderr
     create_threads(script_task, stdout, stderr)
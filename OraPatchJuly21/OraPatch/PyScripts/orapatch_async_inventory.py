@@ -0,0 +1,159 @@
+"""
+asyncio collection engine for orapatch_metadata_manager.py.
+
+Runs db_inventory.sh on every server from one event loop with asyncssh instead of
+one blocking paramiko thread per server, so a fleet of thousands of servers needs
+neither hundreds of threads nor a multi-hour run. Rows are streamed to the same
+on_row callback as the thread engine, so the tables written are identical.
+
+Selected with INVENTORY_BACKEND: async in global_config.yaml, or per run:
+
+    python orapatch_metadata_manager.py CreateInventory async
+"""
+import asyncio
+import collections
+import datetime
+import os
+
+import script_bundle
+
+try:
+    import asyncssh
+except ImportError:  # Only needed when the async backend is selected
+    asyncssh = None
+
+ASYNC_MAX_CONNECTIONS = 200  # Servers inventoried at the same time.
+CONNECT_TIMEOUT = 120  # Seconds to open and authenticate one SSH connection.
+EXEC_TIMEOUT = 1800  # Seconds one db_inventory.sh run may take, output included.
+STDERR_TAIL_LINES = 20  # Last stderr lines of a remote run kept for its failure message.
+
+
+def _collector(rows):
+    # An on_row coroutine for _run_script that keeps the rows, for callers without on_row
+    async def collect_row(server, row):
+        rows.append(row)
+    return collect_row
+
+
+async def _run_script(conn, server, script_path, on_row):
+    # Run the host's cached copy of the script, pushing the bundle first if the host lacks it
+    bundle = script_bundle.bundle_for(script_path)
+    await bundle.ensure_async(conn, server)
+    process = await conn.create_process(bundle.command(os.path.basename(script_path)), encoding='utf-8')
+    process.stdin.write_eof()
+
+    # Read stderr alongside stdout so a chatty script cannot stall the channel
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+
+    async def drain_stderr():
+        async for line in process.stderr:
+            stderr_tail.append(line)
+
+    drain = asyncio.ensure_future(drain_stderr())
+    try:
+        async for line in process.stdout:
+            line = line.rstrip('\r\n')
+            if line:
+                await on_row(server, line.split('|'))
+        await drain
+    finally:
+        drain.cancel()
+
+    completed = await process.wait()
+    return completed.exit_status, ''.join(stderr_tail).strip()
+
+
+async def inventory_host(server, script_path, semaphore, on_row=None,
+                         connect_timeout=CONNECT_TIMEOUT, exec_timeout=EXEC_TIMEOUT,
+                         fingerprint_path=None, check_fingerprint=None, **connect_options):
+    """
+    Inventories one server and returns (server, status, message, start_time, end_time, output),
+    the same tuple the thread engine yields. Failures are reported in the tuple, never raised.
+    Host keys are checked against asyncssh's default ~/.ssh/known_hosts unless connect_options
+    pass known_hosts, so an unknown or changed key fails the connection.
+    Each row is handed to on_row(server, row) as it arrives, from an executor thread since
+    on_row may block on the bounded writer queue; without on_row the rows are returned as
+    output. on_row also sees the rows of a run that later fails or times out: the caller keeps
+    or drops them by the returned status.
+    With fingerprint_path, that script runs first on the same connection and the inventory is
+    skipped when check_fingerprint(server, rows) returns a message, reported as the result.
+    """
+    output_lines = []
+    if on_row is None:
+        hand_off = _collector(output_lines)
+    else:
+        loop = asyncio.get_running_loop()
+
+        async def hand_off(server, row):
+            await loop.run_in_executor(None, on_row, server, row)
+    host, _, port = server.partition(':')
+
+    async with semaphore:
+        start_time = datetime.datetime.now()
+        print(f"INFO :: {start_time:%Y-%m-%d %H:%M:%S} :: Executing script over asyncssh on {server}")
+        try:
+            conn = await asyncio.wait_for(asyncssh.connect(host, port=int(port) if port else 22, **connect_options),
+                                          connect_timeout)
+        except asyncio.TimeoutError:
+            print(f"SSH connection to {server} timed out after {connect_timeout}s")
+            return server, False, "SSH connection failed", start_time, datetime.datetime.now(), []
+        except Exception as e:
+            print(e)
+            return server, False, "SSH connection failed", start_time, datetime.datetime.now(), []
+
+        try:
+            async with conn:
+                if fingerprint_path is not None:
+                    fingerprint_rows = []
+                    returncode, error = await asyncio.wait_for(
+                        _run_script(conn, server, fingerprint_path, _collector(fingerprint_rows)), exec_timeout)
+                    unchanged = check_fingerprint(server, fingerprint_rows if returncode == 0 else [])
+                    if unchanged is not None:
+                        return server, True, unchanged, start_time, datetime.datetime.now(), []
+                returncode, error = await asyncio.wait_for(_run_script(conn, server, script_path, hand_off), exec_timeout)
+        except asyncio.TimeoutError:
+            error_message = f"Shell Script Execution Unsuccessful: timed out after {exec_timeout}s"
+            return server, False, error_message, start_time, datetime.datetime.now(), []
+        except Exception as e:
+            error_message = "Shell Script Execution Unsuccessful: " + str(e)
+            return server, False, error_message, start_time, datetime.datetime.now(), []
+
+    end_time = datetime.datetime.now()
+    if returncode == 0:
+        return server, True, "Shell Script Execution Successful", start_time, end_time, output_lines
+    return server, False, "Shell Script Execution Unsuccessful: " + error, start_time, end_time, []
+
+
+async def collect_inventory(servers, script_path, on_row=None, max_connections=ASYNC_MAX_CONNECTIONS,
+                            connect_timeout=CONNECT_TIMEOUT, exec_timeout=EXEC_TIMEOUT,
+                            fingerprint_path=None, check_fingerprint=None, **connect_options):
+    """
+    Yields one result tuple per server in completion order, with at most max_connections
+    servers in flight. Closing or cancelling the generator cancels every server still running
+    and closes its connection.
+    """
+    semaphore = asyncio.Semaphore(max_connections)
+    tasks = [
+        asyncio.ensure_future(inventory_host(server, script_path, semaphore, on_row,
+                                             connect_timeout, exec_timeout, fingerprint_path, check_fingerprint,
+                                             **connect_options))
+        for server in servers
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_inventory(servers, script_path, **kwargs):
+    """Runs collect_inventory on a fresh event loop and returns the results in completion order."""
+    if asyncssh is None:
+        raise ImportError("The async inventory backend needs asyncssh: pip install asyncssh")
+
+    async def collect():
+        return [result async for result in collect_inventory(servers, script_path, **kwargs)]
+
+    return asyncio.run(collect())
@@ -8,6 +8,10 @@ import smtplib
 import datetime
 import subprocess
 import socket
+import queue
+import threading
+import time
+import collections
 import concurrent.futures
 from jinja2 import Environment, FileSystemLoader
 from email.mime.multipart import MIMEMultipart
@@ -15,8 +19,24 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import paramiko
+import orapatch_async_inventory
+import adaptive_concurrency
+import execution_timings
+import script_bundle
+from inventory_schema import create_inventory_table, create_inventory_hosts
 
 COMMASPACE = ', '
+MAX_WORKERS = 10  # Number of servers inventoried in parallel when no adaptive limit is given.
+CONCURRENCY_REPORT_SERVERS = 100  # Servers between run log lines with the current limit and latencies.
+WRITER_BATCH_ROWS = 5000  # Rows buffered before the inventory writer flushes and commits.
+WRITER_COMMIT_SECONDS = 5.0  # Longest time a written row waits for its commit.
+STDERR_TAIL_LINES = 20  # Last stderr lines of a remote run kept for its failure message.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+)
 
 # Define a default inventory key at the module level
 inventory_key = None
@@ -49,6 +69,7 @@ PROGRAM_NAME = os.path.splitext(os.path.basename(__file__))[0]
 SENDER_EMAIL = config["SENDER_EMAIL"]
 SQLITE_DB = os.path.join(config["SQLITEDB_DIR"], config["MASTER_DB"])
 SCRIPT_FQFN = os.path.join(config["SHELL_DIR"], "db_inventory.sh")
+FINGERPRINT_FQFN = os.path.join(config["SHELL_DIR"], "db_fingerprint.sh")
 MAIL_TEMPLATE_DIR = config["HTML_DIR"]
 MAIL_TEMPLATE_FILE = "db_inventory_mail_template.html"
 MAIL_BODY = os.path.join(config["HTML_DIR"], "db_inventory_mail_body.html")
@@ -58,6 +79,11 @@ DB_INVENTORY = os.path.join(config["CSV_DIR"], f"db_inventory{timestamp_tag}.csv
 EXECUTION_SUMMARY = os.path.join(config["CSV_DIR"], f"db_inventory_execution_summary{timestamp_tag}.csv")
 TO_RECIPIENT = config["TO_RECIPIENT_EMAIL"]
 CC_RECIPIENT = config["CC_RECIPIENT_EMAIL"]
+INVENTORY_BACKEND = config.get("INVENTORY_BACKEND", "thread")  # thread (paramiko) or async (asyncssh)
+ASYNC_MAX_CONNECTIONS = config.get("INVENTORY_MAX_CONNECTIONS", orapatch_async_inventory.ASYNC_MAX_CONNECTIONS)
+# The thread engine starts at INVENTORY_INITIAL_WORKERS and adapts between 1 and INVENTORY_MAX_WORKERS
+INITIAL_WORKERS = config.get("INVENTORY_INITIAL_WORKERS", MAX_WORKERS)
+ADAPTIVE_MAX_WORKERS = config.get("INVENTORY_MAX_WORKERS", adaptive_concurrency.MAX_LIMIT)
 
 # rest of the code remains the same
 
@@ -99,86 +125,370 @@ def send_email(to, subject, html_content, files=[], cc=None):
     finally:
         smtp.close()
 
-def check_ssh(server):
+def connect_ssh(server, limiter=None, timings=None, script=None):
+    """
+    Returns an authenticated paramiko client for server, or None. With timings, the TCP connect
+    and the SSH handshake plus authentication are recorded as the connect and auth phases of script.
+    The scripts run over this connection, so the host key must already be in the system
+    known_hosts: paramiko's default RejectPolicy refuses unknown and changed keys alike.
+    """
     print(f"INFO :: {datetime.datetime.now():%Y-%m-%d %H:%M:%S} :: Verifying SSH connectivity for {server}")
+    connect_start = time.monotonic()
+    sock = None
+    client = None
     try:
         # Initialize the SSH client
         client = paramiko.SSHClient()
         # Load known host keys
-        client.set_missing_host_key_policy(paramiko.WarningPolicy())
         client.load_system_host_keys()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        # Connect to the server
-        client.connect(hostname=server, timeout=120)
+        # Connect to the server; server list entries may carry a port as host:port
+        host, _, port = server.partition(':')
+        port = int(port) if port else 22
+        # Open the TCP connection separately so connecting and authenticating are timed apart
+        sock = socket.create_connection((host, port), timeout=120)
+        auth_start = time.monotonic()
+        client.connect(hostname=host, port=port, timeout=120, sock=sock)
+        if timings is not None:
+            timings.add(server, script, 'connect', auth_start - connect_start)
+            timings.add(server, script, 'auth', time.monotonic() - auth_start)
     except (paramiko.AuthenticationException,
             paramiko.SSHException,
             paramiko.BadHostKeyException,
             Exception) as e:
         print(e)
-        return False
-    else:
-        # If the connection is successful
-        client.close()
-        return True
-
-def run_script_over_ssh(server, script_path):
+        if client is not None:
+            client.close()
+        if sock is not None:
+            sock.close()
+        if limiter is not None:
+            limiter.failure('connect', e)
+        return None
+    if limiter is not None:
+        limiter.record('connect', time.monotonic() - connect_start)
+    # If the connection is successful, hand the authenticated client to the caller
+    return client
+
+def drain_stderr(stderr, tail):
+    # Read stderr as it arrives so a chatty script cannot fill the channel window and stall stdout
+    for line in stderr:
+        tail.append(line)
+
+
+def run_script_over_ssh(server, script_path, ssh=None, on_row=None, limiter=None, timings=None, keep_open=False):
+    """
+    Runs the inventory script on server and parses its stdout line by line as it arrives.
+    Each row is handed to on_row(server, row) as soon as it is complete, so only one row is
+    held in memory; without on_row the rows are collected and returned as before. on_row also
+    sees the rows of a run that later fails: the caller keeps or drops them by the returned
+    status, as main does with InventoryWriter.end_server.
+    With a limiter, the run's duration or failure is reported to it per script name.
+    With timings, the bundle check or push is recorded as upload, splitting lines as parse,
+    on_row (save_to_sqlite for inventory rows) as insert, and the rest of the run as execute.
+    With keep_open, the connection is left open after a completed run for the next script.
+    """
+    script = os.path.basename(script_path)
+    exec_kind = f"exec {script}"
     start_time = datetime.datetime.now()
-    print(f"INFO :: {datetime.datetime.now():%Y-%m-%d %H:%M:%S} :: Executing script {SCRIPT_FQFN} on {server}")
-
-    try:
-        ssh = paramiko.SSHClient()
-        #ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        # Load known host keys
-        ssh.load_system_host_keys()
-        ssh.connect(server, timeout=120)
+    print(f"INFO :: {datetime.datetime.now():%Y-%m-%d %H:%M:%S} :: Executing script {script_path} on {server}")
 
-        with open(script_path, 'rb') as script_file:
-            script_data = script_file.read()
+    output_lines = []
+    if on_row is None:
+        on_row = lambda server, row: output_lines.append(row)
 
-        stdin, stdout, stderr = ssh.exec_command('bash -s', timeout=120)
-        #stdin, stdout, stderr = ssh.exec_command('bash -s', timeout=2)
-        stdin.write(script_data)
-        stdin.flush()
-        stdin.channel.shutdown_write()
-
-        output, error = stdout.read().decode(), stderr.read().decode()
+    try:
+        # Reuse the caller's authenticated connection when there is one
+        if ssh is None:
+            ssh = paramiko.SSHClient()
+            #ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            # Load known host keys
+            ssh.load_system_host_keys()
+            host, _, port = server.partition(':')
+            ssh.connect(host, port=int(port) if port else 22, timeout=120)
+
+        exec_start = time.monotonic()
+        # Make sure the host has the current script bundle first, so pushing it is timed on its own
+        script_bundle.bundle_for(script_path).ensure(ssh, server)
+        upload_end = time.monotonic()
+        # Run the host's cached copy of the script; the bundle is only pushed when the host lacks this version
+        stdin, stdout, stderr = script_bundle.exec_bundled(ssh, server, script_path, timeout=120)
+        #stdin, stdout, stderr = script_bundle.exec_bundled(ssh, server, script_path, timeout=2)
+
+        stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        stderr_thread = threading.Thread(target=drain_stderr, args=(stderr, stderr_tail), daemon=True)
+        stderr_thread.start()
+
+        # Summed locally and recorded once, to keep the per-row cost to a few clock reads
+        parse_seconds = insert_seconds = 0.0
+        for line in stdout:
+            parse_start = time.perf_counter()
+            line = line.rstrip('\r\n')
+            if line:
+                row = line.split('|')
+                insert_start = time.perf_counter()
+                on_row(server, row)
+                insert_end = time.perf_counter()
+                parse_seconds += insert_start - parse_start
+                insert_seconds += insert_end - insert_start
+            else:
+                parse_seconds += time.perf_counter() - parse_start
+
+        stderr_thread.join()
         returncode = stdout.channel.recv_exit_status()
-
-        ssh.close()
+        exec_end = time.monotonic()
+        if limiter is not None:
+            limiter.record(exec_kind, exec_end - exec_start)
+        if timings is not None:
+            timings.add(server, script, 'upload', upload_end - exec_start)
+            timings.add(server, script, 'execute', exec_end - upload_end - parse_seconds - insert_seconds)
+            timings.add(server, script, 'parse', parse_seconds)
+            timings.add(server, script, 'insert', insert_seconds)
+
+        if not keep_open:
+            ssh.close()
 
         end_time = datetime.datetime.now()
 
         if returncode == 0:
-            output_lines = [line.split('|') for line in output.splitlines()]
             return server, True, "Shell Script Execution Successful", start_time, end_time, output_lines
         else:
-            error_message = "Shell Script Execution Unsuccessful: " + error.strip()
+            error_message = "Shell Script Execution Unsuccessful: " + ''.join(stderr_tail).strip()
             return server, False, error_message, start_time, end_time, []
 
     except Exception as e:
+        if ssh is not None:
+            ssh.close()
+        if limiter is not None:
+            limiter.failure(exec_kind, e)
         end_time = datetime.datetime.now()
         error_message = "Shell Script Execution Unsuccessful: " + str(e)
         return server, False, error_message, start_time, end_time, []
 
 
-def save_to_sqlite(conn, cursor, server, data_rows, mode):
+def run_inventory_over_ssh(server, ssh, script_path, on_row, fingerprint_path, check_fingerprint, limiter=None, timings=None):
+    """
+    Runs fingerprint_path and then, unless check_fingerprint(server, rows) returns a message saying
+    the host is unchanged, script_path on the same connected client. The message is reported as the
+    server's successful result. A fingerprint run that exits non-zero is checked with no rows, so the
+    host is inventoried as if it were new; one that breaks the connection is the server's result.
+    """
+    server, status, message, start_time, end_time, rows = run_script_over_ssh(server, fingerprint_path, ssh, None,
+                                                                               limiter, timings, keep_open=True)
+    transport = ssh.get_transport()
+    if transport is None or not transport.is_active():
+        ssh.close()
+        return server, status, message, start_time, end_time, []
+    unchanged = check_fingerprint(server, rows if status else [])
+    if unchanged is not None:
+        ssh.close()
+        return server, True, unchanged, start_time, end_time, []
+    result = run_script_over_ssh(server, script_path, ssh, on_row, limiter, timings)
+    return result[:3] + (start_time,) + result[4:]
+
+
+def inventory_pipeline(servers, script_path, max_workers=MAX_WORKERS, on_row=None, limiter=None, timings=None,
+                       fingerprint_path=None, check_fingerprint=None):
+    """
+    Yields (server, status, message, start_time, end_time, output) for each server in completion order.
+    A server's script run is scheduled as soon as its SSH connection is up, on the same transport.
+    At most max_workers servers are in flight, so open connections and buffered output stay bounded;
+    with an adaptive_concurrency limiter the bound is its current limit instead, fed by every
+    connect and script run. With on_row, rows are streamed to it from the worker threads and output is empty.
+    With an execution_timings.PhaseTimings, every server's phases are recorded into it.
+    With fingerprint_path, each server runs run_inventory_over_ssh on its one connection instead.
+    """
+    servers = iter(servers)
+    script = os.path.basename(fingerprint_path or script_path)
+    pending = {}
+    completed = 0
+
+    def in_flight_limit():
+        return limiter.limit if limiter is not None else max_workers
+
+    pool_size = limiter.max_limit if limiter is not None else max_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+        def fill():
+            # Each in-flight server has exactly one pending future, connect or script
+            while len(pending) < in_flight_limit():
+                server = next(servers, None)
+                if server is None:
+                    return
+                pending[executor.submit(connect_ssh, server, limiter, timings, script)] = ('ssh', server, datetime.datetime.now())
+
+        fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage, server, start_time = pending.pop(future)
+                if stage == 'ssh':
+                    ssh = future.result()
+                    if ssh is not None:
+                        if fingerprint_path is not None:
+                            future = executor.submit(run_inventory_over_ssh, server, ssh, script_path, on_row,
+                                                     fingerprint_path, check_fingerprint, limiter, timings)
+                        else:
+                            future = executor.submit(run_script_over_ssh, server, script_path, ssh, on_row, limiter, timings)
+                        pending[future] = ('script', server, start_time)
+                        continue
+                    result = server, False, "SSH connection failed", start_time, datetime.datetime.now(), []
+                else:
+                    result = future.result()
+                completed += 1
+                if limiter is not None and completed % CONCURRENCY_REPORT_SERVERS == 0:
+                    log_concurrency(f"{completed} servers done, {limiter.report()}")
+                yield result
+            fill()
+
+
+class InventoryWriter:
+    """
+    Owns the SQLite connection for inventory rows and writes them on a dedicated thread.
+    Rows are buffered per table and row width and inserted with executemany through one
+    prepared statement each. A commit happens every WRITER_BATCH_ROWS rows or
+    WRITER_COMMIT_SECONDS, whichever comes first, instead of once per server.
+
+    Rows arrive one at a time as the scripts print them and are staged per server until
+    end_server(server, ok) says how the server's run ended: a successful server's rows join
+    the next batch, a failed or timed-out one's are discarded, so each server is stored all
+    or nothing while the collectors hold only the row in hand.
+
+    A batch that fails is retried one server at a time, so a bad row only costs its own
+    server: that server's rows are dropped and it is listed in failed_servers with the
+    error, the other servers' rows are committed, and the writer keeps running.
+    """
+    _STOP = object()
+    _END = object()
+
+    def __init__(self, db, batch_rows=WRITER_BATCH_ROWS, commit_seconds=WRITER_COMMIT_SECONDS):
+        self.batch_rows = batch_rows
+        self.commit_seconds = commit_seconds
+        self.rows_written = 0
+        self.error = None
+        self.failed_servers = {}  # server -> why its rows could not be stored
+        self._queue = queue.Queue(maxsize=64)
+        self._thread = threading.Thread(target=self._run, args=(db,), name='inventory-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, table_name, rows, server=None):
+        if self.error:
+            raise self.error
+        self._queue.put((server, table_name, rows))
+
+    def end_server(self, server, ok):
+        # Queued behind the server's rows, so every row written before it is covered
+        self._queue.put((server, self._END, ok))
+
+    def close(self):
+        # Flush and commit whatever is still buffered, then wait for the writer thread
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self.error:
+            raise self.error
+
+    def _run(self, db):
+        conn = sqlite3.connect(db)
+        stopped = False
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            staged = {}
+            pending = {}
+            buffered = 0
+            last_commit = time.monotonic()
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, self.commit_seconds - (time.monotonic() - last_commit)))
+                except queue.Empty:
+                    item = None
+                if item is self._STOP:
+                    stopped = True
+                    break
+                if item is not None:
+                    server, table_name, rows = item
+                    if table_name is self._END:
+                        items = staged.pop(server, [])
+                        if rows:
+                            pending.setdefault(server, []).extend(items)
+                            buffered += sum(len(staged_rows) for _, staged_rows in items)
+                    else:
+                        staged.setdefault(server, []).append((table_name, rows))
+                if buffered >= self.batch_rows or (buffered and time.monotonic() - last_commit >= self.commit_seconds):
+                    self._flush(conn, pending)
+                    buffered = 0
+                    last_commit = time.monotonic()
+            for server in staged:
+                print(f"WARNING :: Inventory rows of {server} discarded: its run never reported an end")
+            self._flush(conn, pending)
+        except Exception as e:
+            self.error = e
+            # Keep draining so producers never block on a dead writer; the final flush fails after STOP
+            while not stopped and self._queue.get() is not self._STOP:
+                pass
+        finally:
+            conn.close()
+
+    def _flush(self, conn, pending):
+        # pending is {server: [(table_name, rows)]}; rows of servers that already failed are dropped
+        batches = {server: items for server, items in pending.items() if server not in self.failed_servers}
+        pending.clear()
+        try:
+            self.rows_written += self._insert(conn, [item for items in batches.values() for item in items])
+        except sqlite3.Error as e:
+            print(f"WARNING :: Inventory batch of {len(batches)} servers failed ({e}), retrying server by server")
+            for server, items in batches.items():
+                try:
+                    self.rows_written += self._insert(conn, items)
+                except sqlite3.Error as e:
+                    print(f"ERROR :: Inventory rows of {server} could not be stored: {e}")
+                    self.failed_servers[server] = str(e)
+
+    def _insert(self, conn, items):
+        # One transaction; rows of one table and width share a prepared statement
+        statements = {}
+        for table_name, rows in items:
+            for row in rows:
+                statements.setdefault((table_name, len(row)), []).append(row)
+        with conn:
+            for (table_name, width), rows in statements.items():
+                conn.executemany(f"INSERT INTO {table_name} VALUES ({', '.join('?' * width)})", rows)
+        return sum(len(rows) for rows in statements.values())
+
+
+def save_to_sqlite(writer, server, data_rows, mode):
     # Define table name based on the mode
     table_name = f"TAB_{mode.upper()}"
 
-    # Loop through each row in data_rows
-    for row in data_rows:
-        # Add the new InventoryKey to the row if mode is CreateInventory
-        if mode == 'CreateInventory':
-            row = [inventory_key] + row
+    # Add the new InventoryKey to each row if mode is CreateInventory
+    if mode == 'CreateInventory':
+        data_rows = [[inventory_key] + row for row in data_rows]
 
-        # Construct the SQL query with appropriate placeholders for values
-        query = f"INSERT INTO {table_name} VALUES (? " + ", ?" * (len(row) - 1) + ")"
+    # Hand the rows to the writer thread; it batches and commits them
+    writer.write(table_name, data_rows, server)
 
-        # Execute the query with the row values
-        cursor.execute(query, row)
 
-    # Commit the changes to the database
-    conn.commit()
+def latest_fingerprints(cursor):
+    # {host: (ROWS_KEY, FINGERPRINT)} from the most recent key each host was inventoried under
+    cursor.execute('''
+        SELECT DBI_HOST, ROWS_KEY, FINGERPRINT FROM TAB_INVENTORY_HOSTS h
+        WHERE INVENTORYKEY = (SELECT MAX(INVENTORYKEY) FROM TAB_INVENTORY_HOSTS WHERE DBI_HOST = h.DBI_HOST)
+        AND FINGERPRINT IS NOT NULL
+    ''')
+    return {host: (rows_key, fingerprint) for host, rows_key, fingerprint in cursor.fetchall()}
+
+
+def log_concurrency(message):
+    print(f"INFO :: {datetime.datetime.now():%Y-%m-%d %H:%M:%S} :: Concurrency :: {message}")
+
+
+def collect(servers, script_path, on_row, backend=INVENTORY_BACKEND, limiter=None, timings=None,
+            fingerprint_path=None, check_fingerprint=None):
+    # Both engines stream rows to on_row and report each server as it finishes; phases are timed by the thread engine
+    if backend == 'async':
+        return orapatch_async_inventory.run_inventory(servers, script_path, on_row=on_row,
+                                                      max_connections=ASYNC_MAX_CONNECTIONS,
+                                                      fingerprint_path=fingerprint_path,
+                                                      check_fingerprint=check_fingerprint)
+    return inventory_pipeline(servers, script_path, on_row=on_row, limiter=limiter, timings=timings,
+                              fingerprint_path=fingerprint_path, check_fingerprint=check_fingerprint)
 
 
 def save_results_to_sqlite(conn, cursor, results):
@@ -203,11 +513,13 @@ def save_results_to_sqlite(conn, cursor, results):
     # Committing the changes to the database
     conn.commit()
 
-def main(mode):
+def main(mode, backend=INVENTORY_BACKEND):
     if os.path.exists(LOCKFILE):
         print("Another instance of this script is already running. Exiting.")
         sys.exit(1)
 
+    run_start_time = datetime.datetime.now()
+
     try:
         open(LOCKFILE, 'a').close()
         with open(SERVER_LIST, "r") as f:
@@ -217,190 +529,25 @@ def main(mode):
 
         results = []
 
-        #ssh_results = {server: check_ssh(server) for server in servers}
-
         conn = sqlite3.connect(SQLITE_DB)  # Creates a SQLite database file
         cursor = conn.cursor()
 
+        # DeltaInventory fills the same table under the same kind of key as CreateInventory
+        delta = mode == 'DeltaInventory'
+        table_mode = 'CreateInventory' if delta else mode
+
         # Define table name based on the mode
-        table_name = f"TAB_{mode.upper()}"
+        table_name = f"TAB_{table_mode.upper()}"
 
         # For PrePatch and PostPatch modes, drop the table if it exists
-        if mode in ['PrePatch', 'PostPatch']:
+        if table_mode in ['PrePatch', 'PostPatch']:
             cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
 
-        # Define table structure based on the mode
-        if mode == 'CreateInventory':
-            cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS {table_name}(
-            INVENTORYKEY TEXT,
-            DBI_HOST TEXT,
-            DBI_KEY TEXT,
-            ORA_SID TEXT,
-            ORA_HOME TEXT,
-            AUTO_START TEXT,
-            HOME_EXIST TEXT,
-            HOME_ACTIVE TEXT,
-            HOME_TYPE TEXT,
-            SID_STATUS TEXT,
-            DB_STATUS TEXT,
-            SQLPLUS_VERSION TEXT,
-            DB_RELEASE TEXT,
-            OPATCH_VERSION TEXT,
-            PATCH_HISTORY TEXT,
-            PATCH_DATE TEXT,
-            LISTENER_DATA TEXT,
-            OS_USER TEXT,
-            PRIMARY_GROUP TEXT,
-            TOTAL_GB TEXT,
-            USED_GB TEXT,
-            FREE_GB TEXT,
-            USED_PCT TEXT,
-            FREE_PCT TEXT,
-            OS_NAME TEXT,
-            OS_KERNEL TEXT,
-            OS_SHELL TEXT,
-            SERVER_CPU TEXT,
-            SERVER_RAM TEXT,
-            JCHEM_STATUS TEXT,
-            ORAINV TEXT,
-            ROWSTART TEXT,
-            INSTANCE_NAME TEXT,
-            HOST_NAME TEXT,
-            VERSION TEXT,
-            STARTUP_TIME TEXT,
-            STATUS TEXT,
-            LOGINS TEXT,
-            DATABASE_STATUS TEXT,
-            INSTANCE_ROLE TEXT,
-            DBID TEXT,
-            NAME TEXT,
-            CREATED TEXT,
-            RESETLOGS_TIME TEXT,
-            LOG_MODE TEXT,
-            OPEN_MODE TEXT,
-            PROTECTION_MODE TEXT,
-            PROTECTION_LEVEL TEXT,
-            DATABASE_ROLE TEXT,
-            FORCE_LOGGING TEXT,
-            PLATFORM_ID TEXT,
-            PLATFORM_NAME TEXT,
-            FLASHBACK_ON TEXT,
-            DB_UNIQUE_NAME TEXT,
-            IS_DG TEXT,
-            DG_TNS TEXT,
-            IS_RAC TEXT,
-            RAC_NODE TEXT,
-            WALLET_LOCATION TEXT,
-            WALLET_STATUS TEXT,
-            WALLET_TYPE TEXT,
-            TDE_TBSCOUNT TEXT,
-            OFFLINE_DATAFILE TEXT,
-            OFFLINE_TEMPFILE TEXT,
-            NEED_RECOVERY TEXT,
-            IS_PDB TEXT,
-            PDB_LIST TEXT,
-            PGA_LIMIT TEXT,
-            PGA_TARGET TEXT,
-            SGA_TARGET TEXT,
-            SGA_MAX TEXT,
-            MEMORY_MAX TEXT,
-            MEMORY_TARGET TEXT,
-            CPUCOUNT TEXT,
-            ALLOC_PGA_MB TEXT,
-            TOTAL_SGA_MB TEXT,
-            TOTALSIZE TEXT,
-            DATAFILESIZE TEXT,
-            TEMPFILESIZE TEXT,
-            SEGMENTSIZE TEXT,
-            ROWEND TEXT
-            )
-            ''')
-        else:
-            cursor.execute(f'''
-            CREATE TABLE {table_name}(
-            DBI_HOST TEXT,
-            DBI_KEY TEXT,
-            ORA_SID TEXT,
-            ORA_HOME TEXT,
-            AUTO_START TEXT,
-            HOME_EXIST TEXT,
-            HOME_ACTIVE TEXT,
-            HOME_TYPE TEXT,
-            SID_STATUS TEXT,
-            DB_STATUS TEXT,
-            SQLPLUS_VERSION TEXT,
-            DB_RELEASE TEXT,
-            OPATCH_VERSION TEXT,
-            PATCH_HISTORY TEXT,
-            PATCH_DATE TEXT,
-            LISTENER_DATA TEXT,
-            OS_USER TEXT,
-            PRIMARY_GROUP TEXT,
-            TOTAL_GB TEXT,
-            USED_GB TEXT,
-            FREE_GB TEXT,
-            USED_PCT TEXT,
-            FREE_PCT TEXT,
-            OS_NAME TEXT,
-            OS_KERNEL TEXT,
-            OS_SHELL TEXT,
-            SERVER_CPU TEXT,
-            SERVER_RAM TEXT,
-            JCHEM_STATUS TEXT,
-            ORAINV TEXT,
-            ROWSTART TEXT,
-            INSTANCE_NAME TEXT,
-            HOST_NAME TEXT,
-            VERSION TEXT,
-            STARTUP_TIME TEXT,
-            STATUS TEXT,
-            LOGINS TEXT,
-            DATABASE_STATUS TEXT,
-            INSTANCE_ROLE TEXT,
-            DBID TEXT,
-            NAME TEXT,
-            CREATED TEXT,
-            RESETLOGS_TIME TEXT,
-            LOG_MODE TEXT,
-            OPEN_MODE TEXT,
-            PROTECTION_MODE TEXT,
-            PROTECTION_LEVEL TEXT,
-            DATABASE_ROLE TEXT,
-            FORCE_LOGGING TEXT,
-            PLATFORM_ID TEXT,
-            PLATFORM_NAME TEXT,
-            FLASHBACK_ON TEXT,
-            DB_UNIQUE_NAME TEXT,
-            IS_DG TEXT,
-            DG_TNS TEXT,
-            IS_RAC TEXT,
-            RAC_NODE TEXT,
-            WALLET_LOCATION TEXT,
-            WALLET_STATUS TEXT,
-            WALLET_TYPE TEXT,
-            TDE_TBSCOUNT TEXT,
-            OFFLINE_DATAFILE TEXT,
-            OFFLINE_TEMPFILE TEXT,
-            NEED_RECOVERY TEXT,
-            IS_PDB TEXT,
-            PDB_LIST TEXT,
-            PGA_LIMIT TEXT,
-            PGA_TARGET TEXT,
-            SGA_TARGET TEXT,
-            SGA_MAX TEXT,
-            MEMORY_MAX TEXT,
-            MEMORY_TARGET TEXT,
-            CPUCOUNT TEXT,
-            ALLOC_PGA_MB TEXT,
-            TOTAL_SGA_MB TEXT,
-            TOTALSIZE TEXT,
-            DATAFILESIZE TEXT,
-            TEMPFILESIZE TEXT,
-            SEGMENTSIZE TEXT,
-            ROWEND TEXT
-            )
-            ''')
+        # Typed and indexed structure from inventory_schema.py; CreateInventory keeps history under an INVENTORYKEY
+        create_inventory_table(cursor, table_name)
+        if table_mode == 'CreateInventory':
+            create_inventory_hosts(cursor)
+
         # Truncate table if it exists and create table
         cursor.execute('DROP TABLE IF EXISTS execution_results')
         cursor.execute('''
@@ -414,109 +561,118 @@ def main(mode):
         ''')
         conn.commit()
 
-        # Initialize a ThreadPoolExecutor with a maximum of 5 workers
-        # This allows us to run multiple tasks concurrently
         # Generate a new InventoryKey if mode is CreateInventory
         global inventory_key
-        if mode == 'CreateInventory':
+        if table_mode == 'CreateInventory':
             inventory_key = 'INVKEY' + datetime.datetime.now().strftime('%Y%m%d%H%M%S')
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            # Create a dictionary to store server and its corresponding check_ssh Future object
-            ssh_futures = {server: executor.submit(check_ssh, server) for server in servers}
-
-            # Dictionary to store server and its corresponding run_script_over_ssh Future object
-            script_futures = {}
-
-            ssh_results = {server: ssh_future.result() for server, ssh_future in ssh_futures.items()}
-            for server, ssh_future in ssh_futures.items():
-                for completed_future in concurrent.futures.as_completed(ssh_futures.values()):
-                    if ssh_future == completed_future:
-                        break
-                is_ssh_success = ssh_future.result()
-                if is_ssh_success:
-                    script_futures[server] = executor.submit(run_script_over_ssh, server, script_path)
-                else:
-                    results.append({
-                        "server": server,
-                        "status": False,
-                        "message": "SSH connection failed",
-                        "start_time": datetime.datetime.now(),
-                        "end_time": datetime.datetime.now()
-                    })
-
-            # Loop through each Future object as they complete
-            for server, script_future in script_futures.items():
-                for completed_future in concurrent.futures.as_completed(script_futures.values()):
-                    if script_future == completed_future:
-                        break
-                server, status, message, start_time, end_time, output = script_future.result()
-
-                # Append the result to the 'results' list
-                results.append({
-                    "server": server,
-                    "status": status,
-                    "message": message,
-                    "start_time": start_time,
-                    "end_time": end_time
-                })
-
-                # If the script execution was successful (status is True), save the output to a SQLite database
-                if status:
-                    data_rows = [[server] + row for row in output]
-                    save_to_sqlite(conn, cursor, server, data_rows, mode)  # pass mode as an argument
-
-        # Loop through each item in ssh_results again
-        for server, is_ssh_success in ssh_results.items():
-
-            # If the SSH connection was unsuccessful (is_ssh_success is False), add a record to the 'results' list indicating this
-            if not is_ssh_success:
-                results.append({
-                    "server": server,
-                    "status": False,
-                    "message": "SSH connection failed",
-                    "start_time": datetime.datetime.now(),
-                    "end_time": datetime.datetime.now()
-                })
-
-        # Save the execution results to a SQLite database
+        # One limiter for the whole run, fed by every connect and script run
+        limiter = adaptive_concurrency.AdaptiveConcurrency(initial=INITIAL_WORKERS, max_limit=ADAPTIVE_MAX_WORKERS,
+                                                           log=log_concurrency)
+        timings = execution_timings.PhaseTimings()
+
+        # Inventory fingerprints every host first, on the connection the inventory then uses, so the
+        # next DeltaInventory has something to compare with
+        fingerprints = {}
+        carried_forward = {}
+        fingerprint_path = check_fingerprint = None
+        if table_mode == 'CreateInventory':
+            previous = latest_fingerprints(cursor) if delta else {}
+
+            def check_fingerprint(server, rows):
+                fingerprint = rows[0][0] if rows else None
+                if fingerprint is None:
+                    return None
+                fingerprints[server] = fingerprint
+                if server in previous and previous[server][1] == fingerprint:
+                    # Nothing changed: point this key at the rows already stored for the host
+                    carried_forward[server] = previous[server][0]
+                    return f"Oracle state unchanged, rows carried forward from {carried_forward[server]}"
+                return None
+
+            fingerprint_path = FINGERPRINT_FQFN
+
+        # Rows are persisted by a dedicated writer while the workers are still producing
+        inventory_writer = InventoryWriter(SQLITE_DB)
+
+        # Each row goes to the writer as soon as it is read off the SSH channel
+        def save_row(server, row):
+            save_to_sqlite(inventory_writer, server, [[server] + row], table_mode)
+
+        # Both engines report each server as it finishes, whatever order the servers were listed in
+        host_rows = []
+        for server, status, message, start_time, end_time, output in collect(servers, script_path, save_row, backend, limiter, timings,
+                                                                             fingerprint_path, check_fingerprint):
+            # Append the result to the 'results' list; an SSH failure keeps its own message
+            results.append({
+                "server": server,
+                "status": status,
+                "message": message,
+                "start_time": start_time,
+                "end_time": end_time
+            })
+            # The writer commits the server's staged rows only if its run succeeded
+            inventory_writer.end_server(server, status)
+            if status and table_mode == 'CreateInventory':
+                # Unchanged hosts point at their previous rows, inventoried ones at this key
+                host_rows.append((inventory_key, server, carried_forward.get(server, inventory_key), fingerprints.get(server)))
+
+        inventory_writer.close()
+        # A server whose rows the writer could not store did not get inventoried after all
+        for result in results:
+            if result["server"] in inventory_writer.failed_servers:
+                result["status"] = False
+                result["message"] = f"Inventory rows could not be stored: {inventory_writer.failed_servers[result['server']]}"
+        host_rows = [row for row in host_rows if row[1] not in inventory_writer.failed_servers]
+        if backend != 'async':
+            log_concurrency(f"run finished, {limiter.report()}")
+
+        # Record which key holds each inventoried host's rows for this InventoryKey
+        if host_rows:
+            cursor.executemany("INSERT OR REPLACE INTO TAB_INVENTORY_HOSTS VALUES (?, ?, ?, ?)", host_rows)
+            conn.commit()
+
+        # Save the execution results to a SQLite database, with where each server's time went
         save_results_to_sqlite(conn, cursor, results)
+        timings.save(cursor)
+        conn.commit()
+        phase_summary, slowest_hosts = timings.summary()
 
         # Export data from SQLite to CSV (patch_os_db_data)
         # Define table name and CSV file name based on the mode
-        table_name = f"TAB_{mode.upper()}"
+        table_name = f"TAB_{table_mode.upper()}"
         CSV_FILE_PATH = os.path.join(config["CSV_DIR"], f"{table_name}{timestamp_tag}.csv")
 
         # Export data from SQLite to CSV
-        if mode == "CreateInventory":
-            # In CreateInventory mode, select only rows with the current inventory key
-            cursor.execute(f"SELECT * FROM {table_name} WHERE INVENTORYKEY = '{inventory_key}'")
+        if table_mode == "CreateInventory":
+            # Select the full snapshot of the current inventory key, carried-forward hosts included
+            cursor.execute("SELECT * FROM VIEW_CREATEINVENTORY WHERE INVENTORYKEY = ?", (inventory_key,))
         else:
             cursor.execute(f"SELECT * FROM {table_name}")
 
         rows = cursor.fetchall()
 
         with open(CSV_FILE_PATH, 'w', newline='') as csv_file:
-            writer = csv.writer(csv_file)
+            csv_writer = csv.writer(csv_file)
 
             # Write headers
-            writer.writerow([description[0] for description in cursor.description])
+            csv_writer.writerow([description[0] for description in cursor.description])
 
             # Write rows
-            writer.writerows(rows)
+            csv_writer.writerows(rows)
 
         # Export data from execution_results to CSV
         cursor.execute("SELECT * FROM execution_results")
         rows = cursor.fetchall()
 
         with open(EXECUTION_SUMMARY, 'w', newline='') as csv_file:
-            writer = csv.writer(csv_file)
+            csv_writer = csv.writer(csv_file)
 
             # Write headers
-            writer.writerow([description[0] for description in cursor.description])
+            csv_writer.writerow([description[0] for description in cursor.description])
 
             # Write rows
-            writer.writerows(rows)
+            csv_writer.writerows(rows)
 
         # Send email with the attached reports (CSV file and execution_summary.csv)
         end_datetime_tmp = datetime.datetime.now()
@@ -526,11 +682,13 @@ def main(mode):
             'host_server': socket.gethostname(),
             'program_mode': mode,
             'number_of_servers': len(servers),
-            'start_datetime': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'start_datetime': run_start_time.strftime('%Y-%m-%d %H:%M:%S'),
             'end_datetime': end_datetime_tmp.strftime('%Y-%m-%d %H:%M:%S'),
             'script_name': __file__,
             'script_path': __file__,
-            'results': results
+            'results': results,
+            'phase_summary': phase_summary,
+            'slowest_hosts': slowest_hosts
         }
 
         # Render the email body from the template
@@ -557,8 +715,13 @@ if __name__ == "__main__":
     mode = sys.argv[1] if len(sys.argv) > 1 else None
 
     # check the mode and raise an exception if it's not valid
-    if mode not in ['PrePatch', 'PostPatch', 'CreateInventory']:
-        raise ValueError('Invalid mode. The mode should be one of "PrePatch", "PostPatch", or "CreateInventory"')
+    if mode not in ['PrePatch', 'PostPatch', 'CreateInventory', 'DeltaInventory']:
+        raise ValueError('Invalid mode. The mode should be one of "PrePatch", "PostPatch", "CreateInventory" or "DeltaInventory"')
+
+    # an optional second argument picks the collection engine for this run
+    backend = sys.argv[2] if len(sys.argv) > 2 else INVENTORY_BACKEND
+    if backend not in ['thread', 'async']:
+        raise ValueError('Invalid backend. The backend should be one of "thread" or "async"')
 
-    main(mode)
+    main(mode, backend)
 
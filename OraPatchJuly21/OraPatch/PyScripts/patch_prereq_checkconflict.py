@@ -9,6 +9,8 @@ import datetime
 import argparse
 import logging
 from concurrent.futures import ThreadPoolExecutor
+import script_bundle
+import adaptive_concurrency
 
 # python run_script.py servername1
 # python run_script.py servername2
@@ -19,7 +21,7 @@ PROMPT_MODE = False
 DEFAULT_DELAY = 0
 START_TIME = datetime.datetime.now()
 TIMESTAMP_TAG = datetime.datetime.now().strftime("_%Y%m%d%H%M%S")
-MAX_WORKERS = 1  # Number of parallel tasks.
+MAX_WORKERS = 1  # Number of parallel tasks; PATCH_PREREQ_MAX_WORKERS can raise it and lets the adaptive limit move below that.
 patch_pre_status = {}  # Global dictionary to hold start time, end time, and status for each server
 
 def delay(seconds=None):
@@ -57,6 +59,7 @@ BKP_LOC = config.get("BKP_LOC", '/u01/software/bkp_dir')
 PATCH_TASK_DIR = '/u01/home/oracle/OraPatch_Stage/PatchTask'
 PATCHDB_YAML = config["PATCHDB_DIR"]
 SCRIPT_DIR = config["SHELL_DIR"]
+MAX_PARALLEL_TASKS = config.get("PATCH_PREREQ_MAX_WORKERS", MAX_WORKERS)
 LOGFILE_DIR = config["LOG_DIR"]
 
 # Set up logging
@@ -70,53 +73,64 @@ logging.basicConfig(level=logging.INFO,
                         logging.FileHandler(log_file)  # log to a file
                     ])
 
-ssh = paramiko.SSHClient()
-ssh.load_system_host_keys()
-ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+# Grows the number of servers checked in parallel while connects and scripts stay fast, backs off on timeouts
+LIMITER = adaptive_concurrency.AdaptiveConcurrency(initial=MAX_WORKERS, max_limit=MAX_PARALLEL_TASKS, log=logging.info)
 
 def connect_to_server(server_name):
     """
-    Connect to the specified server via SSH
+    Connect to the specified server via SSH. Returns the connected client, or None on failure;
+    each task gets its own client so servers can be worked in parallel.
     """
+    ssh = paramiko.SSHClient()
+    ssh.load_system_host_keys()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    connect_start = time.monotonic()
     try:
         ssh.connect(server_name, timeout=60)
-    except paramiko.AuthenticationException:
+    except paramiko.AuthenticationException as e:
         logging.error(f"Authentication failed for {server_name}")
-        return False
+        LIMITER.failure('connect', e)
+        return None
     except paramiko.SSHException as e:
         logging.error(f"Error connecting to {server_name}: {str(e)}")
-        return False
+        LIMITER.failure('connect', e)
+        return None
     except Exception as e:
         logging.error(f"Unexpected error for {server_name}: {str(e)}")
-        return False
+        LIMITER.failure('connect', e)
+        return None
 
-    return True
+    LIMITER.record('connect', time.monotonic() - connect_start)
+    return ssh
 
-def run_script(server_name, shell_program_name, src_type="local"):
+def run_script(ssh, server_name, shell_program_name, src_type="local"):
     script_name, *script_args = shell_program_name.split(" ",1)
     script_args = script_args[0] if script_args else ""
     script_path = os.path.join(SCRIPT_DIR, script_name)
 
-    if src_type == 'local':
-        run_local_script(server_name, script_path, script_args)
-    elif src_type == 'remote':
-        run_remote_script(server_name, script_path, script_args)
-    else:
-        logging.info(f"Invalid script type: {script_args}")
-
-def run_local_script(server_name, script_path, script_args):
-    with open(script_path, 'rb') as script_file:
-        script_data = script_file.read()
+    exec_kind = f"exec {script_name}"
+    exec_start = time.monotonic()
+    try:
+        if src_type == 'local':
+            run_local_script(ssh, server_name, script_path, script_args)
+        elif src_type == 'remote':
+            run_remote_script(ssh, server_name, script_path, script_args)
+        else:
+            logging.info(f"Invalid script type: {script_args}")
+            return
+    except Exception as e:
+        LIMITER.failure(exec_kind, e)
+        raise
+    LIMITER.record(exec_kind, time.monotonic() - exec_start)
 
-    stdin, stdout, stderr = ssh.exec_command(f'bash -s - {script_args}')
-    stdin.write(script_data)
-    stdin.flush()
-    stdin.channel.shutdown_write()
+def run_local_script(ssh, server_name, script_path, script_args):
+    # Run the host's cached copy of the script; the ShellScripts bundle is only pushed when it changed
+    stdin, stdout, stderr = script_bundle.exec_bundled(ssh, server_name, script_path, script_args)
 
     # Create threads for stdout and stderr
     create_threads(server_name, stdout, stderr)
 
-def run_remote_script(server_name, script_path, script_args):
+def run_remote_script(ssh, server_name, script_path, script_args):
     stdin, stdout, stderr = ssh.exec_command(f'{script_path} {script_args}')
     create_threads(server_name, stdout, stderr)
 
@@ -274,7 +288,8 @@ def process_server(server_name, inventory_key):
                 if prompt_task_execution(taskname, remote_server, shell_program_name, script_execute, script_type):
                 #if prompt_task_execution(task_info['task_name'], task_info['shell_program_name']):
                     # Connect to the server
-                    if not connect_to_server(server_name):
+                    ssh = connect_to_server(server_name)
+                    if ssh is None:
                         logging.info(f"Cannot connect to server: {server_name}")
                         return
 
@@ -284,7 +299,7 @@ def process_server(server_name, inventory_key):
                     logging.info(f"Task Name           : {taskname}")
 
                     # Run the script on the server
-                    run_script(server_name, task_info['shell_program_name'], task_info['script_type'])
+                    run_script(ssh, server_name, task_info['shell_program_name'], task_info['script_type'])
                     task_end_time = datetime.datetime.now()
                     logging.info(f"End Time: {task_end_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
 
@@ -336,7 +351,8 @@ def worker(server_name, inventory_key):
         # Store the start time in the dictionary
         patch_pre_status[server] = {'start_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-        process_server_result = process_server(server, inventory_key)
+        with LIMITER.slot():
+            process_server_result = process_server(server, inventory_key)
         if process_server_result:
             logging.info(f"Processing of server {server} was Successful.")
             patch_pre_status[server]['status'] = 'Successful'
@@ -360,13 +376,15 @@ if __name__ == "__main__":
                     worker(server_name.strip(), args.inventory_key)
             else:
                 # Run in parallel
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # One thread per allowed task; workers beyond the current adaptive limit wait for a slot
+                with ThreadPoolExecutor(max_workers=LIMITER.max_limit) as executor:
                     for server_name in file:
                         executor.submit(worker, server_name.strip(), args.inventory_key)
     except FileNotFoundError:
         logging.info(f"File not found: {args.filename}")
         sys.exit(1)
 
+    logging.info(f"Concurrency: {LIMITER.report()}")
     for server, status in patch_pre_status.items():
         logging.info(f"Server: {server}, Start Time: {status['start_time']}, End Time: {status['end_time']}, Status: {status['status']}")
 
@@ -9,6 +9,7 @@ import argparse
 import logging
 from scp import SCPClient
 from concurrent.futures import ThreadPoolExecutor
+import adaptive_concurrency
 
 # Set up logging
 
@@ -26,7 +27,7 @@ PROMPT_MODE = False
 #PROMPT_MODE = True
 DISK_USAGE_THRESHOLD = 95
 SOFTWARE_DIR = "/u01/software"
-MAX_WORKERS = 5  # Number of parallel tasks.
+MAX_WORKERS = 5  # Number of parallel tasks; PATCH_SCP_MAX_WORKERS can raise it and lets the adaptive limit move below that.
 patch_scp_status = {}
 
 
@@ -64,6 +65,7 @@ PATCH_CYCLE = config["CURRENT_PATCH_CYCLE"]
 BKP_LOC = config.get("BKP_LOC", '/u01/software/bkp_dir')
 PATCHDB_YAML = config["PATCHDB_DIR"]
 LOGFILE_DIR = config["LOG_DIR"]
+MAX_PARALLEL_TASKS = config.get("PATCH_SCP_MAX_WORKERS", MAX_WORKERS)
 
 
 # Set up logging
@@ -77,6 +79,9 @@ logging.basicConfig(level=logging.INFO,
                         logging.FileHandler(log_file)  # log to a file
                     ])
 
+# Grows the number of servers copied to in parallel while connects and transfers stay fast, backs off on timeouts
+LIMITER = adaptive_concurrency.AdaptiveConcurrency(initial=MAX_WORKERS, max_limit=MAX_PARALLEL_TASKS, log=logging.info)
+
 
 def process_server(server_name, inventory_key):
     logging.info(f"Entering process_server with server_name={server_name}, inventory_key={inventory_key}")
@@ -109,7 +114,13 @@ def process_server(server_name, inventory_key):
 
     with paramiko.SSHClient() as ssh:
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(server_name)
+        connect_start = time.monotonic()
+        try:
+            ssh.connect(server_name)
+        except Exception as e:
+            LIMITER.failure('connect', e)
+            raise
+        LIMITER.record('connect', time.monotonic() - connect_start)
 
         available_space = check_remote_disk_space(ssh, SOFTWARE_DIR, total_size)
         logging.info(f"=== Space Info ===")
@@ -119,7 +130,15 @@ def process_server(server_name, inventory_key):
         delay()
 
         if available_space >= total_size:
-            transfer_files(ssh, files_to_transfer, server_name)
+            transfer_start = time.monotonic()
+            try:
+                transfer_files(ssh, files_to_transfer, server_name)
+            except Exception as e:
+                LIMITER.failure('scp', e)
+                raise
+            # Patch zips differ a lot in size, so the limiter judges seconds per GB rather than seconds
+            if total_size:
+                LIMITER.record('scp', (time.monotonic() - transfer_start) / (total_size / 1024 ** 3))
             space_check_result = True
         else:
             logging.info(f"Insufficient space in the remote directory.")
@@ -200,7 +219,8 @@ def parse_args():
 def worker(server_name, inventory_key):
     server = server_name.strip().split(".")[0].lower()
     try:
-        process_server_result = process_server(server, inventory_key)
+        with LIMITER.slot():
+            process_server_result = process_server(server, inventory_key)
         logging.info(f"Result of process_server for {server}: {process_server_result}")
         if not process_server_result:  # Handle error case
             logging.info(f"Skipping server {server_name} due to errors.")
@@ -220,13 +240,15 @@ if __name__ == "__main__":
                     worker(server_name.strip(), args.inventory_key)
             else:
                 # Run in parallel
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # One thread per allowed task; workers beyond the current adaptive limit wait for a slot
+                with ThreadPoolExecutor(max_workers=LIMITER.max_limit) as executor:
                     for server_name in file:
                         executor.submit(worker, server_name.strip(), args.inventory_key)
     except FileNotFoundError:
         logging.info(f"File not found: {args.filename}")
         sys.exit(1)
 
+    logging.info(f"Concurrency: {LIMITER.report()}")
     for server, status in patch_scp_status.items():
         logging.info(f"Server: {server}, Start Time: {status['start_time']}, End Time: {status['end_time']}, Status: {status['status']}")
 
@@ -0,0 +1,211 @@
+import os
+import sys
+import yaml
+import sqlite3
+
+# Keyed forms of the patch reference tables that LoadCsvToDb.py loads from CSV.
+#
+# PATCH_ZIP and PATCH_COMPATABILITY_MATRIX arrive as untyped TEXT tables in whatever order the
+# spreadsheet had. Each load also builds REF_<table>: one row per key, clustered on that key
+# (WITHOUT ROWID), with the OS and release columns named the same in both, so PatchMap.py joins
+# them by primary-key lookups. The raw tables get a covering index on the same columns for any
+# ad hoc query.
+#
+# PATCH_RESOLUTION is built from the two keyed tables: one row per (PATCH_CYCLE, OS_RELEASE, DB_RELEASE)
+# with the patch flags and the PSU/JDK/OJVM/PERL zip and unzip paths and the OPatch zip path already
+# resolved, so the patch map is one keyed join per inventory row and the paths are worked out once per
+# release rather than once per database. Build all of them for a database loaded before they existed with:
+#
+#     python reference_schema.py [path/to/orapatch_metadata_sqlite_db.db]
+
+# {raw table: (keyed table, [(keyed column, raw column)], key length)}; the key columns come first
+REFERENCE_TABLES = {
+    'PATCH_ZIP': ('REF_PATCH_ZIP', [
+        ('PATCH_CYCLE', 'PATCH_CYCLE'), ('OS_NAME', 'OS_NAME'), ('DB_RELEASE', 'DB_RELEASE'), ('PRODUCT', 'PRODUCT'),
+        ('PATCH_NUMBER', 'PATCH_NUMBER'), ('PATCH_FILE', 'PATCH_FILE'), ('FILE_NAME', 'FILE_NAME'),
+        ('BASE_DIR', 'BASE_DIR'), ('BASE_SUB_DIR', 'BASE_SUB_DIR'), ('PATCH_HOME_DIR', 'PATCH_HOME_DIR'),
+        ('VERSION', 'VERSION'),
+    ], 4),
+    'PATCH_COMPATABILITY_MATRIX': ('REF_PATCH_COMPATABILITY_MATRIX', [
+        ('PATCH_CYCLE', 'PATCH_CYCLE'), ('OS_NAME', 'PLATFORM'), ('DB_RELEASE', 'VERSION'),
+        ('PSU', 'PSU'), ('JDK', 'JDK'), ('OJVM', 'OJVM'), ('PERL', 'PERL'),
+    ], 3),
+}
+
+
+RESOLUTION_TABLE = 'PATCH_RESOLUTION'
+RESOLUTION_PRODUCTS = [('PSU', 'RDBMS'), ('JDK', 'JDK'), ('OJVM', 'OJVM'), ('PERL', 'PERL')]  # (flag column, PRODUCT)
+# Products whose unzip path has an empty segment before PATCH_HOME_DIR; kept as the patch map always had it
+DOUBLE_SLASH_UNZIP = ('OJVM', 'PERL')
+
+
+def resolution_query():
+    """
+    The select PATCH_RESOLUTION is built from. Per key there is one compatibility row and one
+    PATCH_ZIP row per product; each flag is concatenated over the product rows and each path is
+    taken from its product's row, as the per-database GROUP_CONCATs of the patch map did.
+    """
+    prefix = "pz.BASE_DIR || pz.BASE_SUB_DIR || '/' || pz.OS_NAME || '/' || pz.DB_RELEASE || '/' || pz.PATCH_CYCLE || '/'"
+    columns = []
+    for flag, product in RESOLUTION_PRODUCTS:
+        unzip_prefix = prefix + " || '/'" if flag in DOUBLE_SLASH_UNZIP else prefix
+        columns += [
+            f"GROUP_CONCAT(pcm.{flag}) AS {flag}",
+            f"GROUP_CONCAT(CASE WHEN pcm.{flag} = 'Y' AND pz.PRODUCT = '{product}' "
+            f"THEN {prefix} || pz.PATCH_HOME_DIR || '/' || pz.PATCH_FILE END) AS {flag}_ZIP_PATH",
+            f"GROUP_CONCAT(CASE WHEN pcm.{flag} = 'Y' AND pz.PRODUCT = '{product}' "
+            f"THEN {unzip_prefix} || pz.PATCH_HOME_DIR || '/' || pz.PATCH_NUMBER END) AS {flag}_UNZIP_PATH",
+        ]
+    select_list = ',\n        '.join(columns)
+    return f"""
+    SELECT
+        pcm.PATCH_CYCLE,
+        pcm.OS_NAME AS OS_RELEASE,
+        pcm.DB_RELEASE,
+        CASE
+            WHEN pcm.PSU = 'Y' OR pcm.JDK = 'Y' OR pcm.OJVM = 'Y' OR pcm.PERL = 'Y' THEN 'Y'
+            ELSE 'N'
+        END AS NEED_TO_PATCH,
+        {select_list}
+    FROM
+        REF_PATCH_COMPATABILITY_MATRIX pcm
+    JOIN
+        REF_PATCH_ZIP pz
+    ON
+        pz.PATCH_CYCLE = pcm.PATCH_CYCLE
+    AND pz.OS_NAME = pcm.OS_NAME
+    AND pz.DB_RELEASE = pcm.DB_RELEASE
+    GROUP BY
+        pcm.PATCH_CYCLE,
+        pcm.OS_NAME,
+        pcm.DB_RELEASE
+    """
+
+
+def resolution_columns():
+    columns = ['PATCH_CYCLE', 'OS_RELEASE', 'DB_RELEASE', 'NEED_TO_PATCH']
+    for flag, _ in RESOLUTION_PRODUCTS:
+        columns += [flag, f"{flag}_ZIP_PATH", f"{flag}_UNZIP_PATH"]
+    return columns + ['OPATCH_ZIP_PATH']
+
+
+def build_resolution_table(cursor):
+    """Rebuilds PATCH_RESOLUTION from the keyed tables in the caller's transaction; returns its row count."""
+    column_defs = ', '.join(f"{column} TEXT" for column in resolution_columns())
+    cursor.execute(f"DROP TABLE IF EXISTS {RESOLUTION_TABLE}")
+    cursor.execute(f"CREATE TABLE {RESOLUTION_TABLE}({column_defs}, "
+                   f"PRIMARY KEY (PATCH_CYCLE, OS_RELEASE, DB_RELEASE)) WITHOUT ROWID")
+    # The OPatch zip sits under the same patching/ directory as the PSU zip
+    cursor.execute(f"""
+        INSERT INTO {RESOLUTION_TABLE}
+        SELECT
+            r.*,
+            substr(r.PSU_ZIP_PATH, 1, instr(r.PSU_ZIP_PATH, 'patching/') + 8) || r.OS_RELEASE || '/' || r.DB_RELEASE || '/' || r.PATCH_CYCLE || '/opatch/opatch.zip'
+        FROM ({resolution_query()}) r
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM {RESOLUTION_TABLE}")
+    return cursor.fetchone()[0]
+
+
+def keyed_table_sql(table_name):
+    keyed_table, columns, key_length = REFERENCE_TABLES[table_name]
+    key = ', '.join(keyed for keyed, _ in columns[:key_length])
+    column_defs = ', '.join(f"{keyed} TEXT" for keyed, _ in columns)
+    return f"CREATE TABLE {keyed_table}({column_defs}, PRIMARY KEY ({key})) WITHOUT ROWID"
+
+
+def create_covering_index(cursor, table_name):
+    # Key columns first, then everything the patch map reads, so lookups never touch the table
+    _, columns, _ = REFERENCE_TABLES[table_name]
+    raw_columns = ', '.join(f'"{raw}"' for _, raw in columns)
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS IDX_{table_name}_KEY ON "{table_name}"({raw_columns})')
+
+
+def duplicate_keys(cursor, table_name):
+    _, columns, key_length = REFERENCE_TABLES[table_name]
+    key = ', '.join(f'"{raw}"' for _, raw in columns[:key_length])
+    cursor.execute(f'SELECT {key}, COUNT(*) FROM "{table_name}" GROUP BY {key} HAVING COUNT(*) > 1')
+    return cursor.fetchall()
+
+
+def build_keyed_table(cursor, table_name):
+    """
+    Rebuilds the keyed form of a loaded reference table and its covering index. Runs in the
+    caller's transaction. Raises ValueError, before touching the index or the keyed table, if a
+    key appears twice, because the patch map would then have to guess which row applies.
+    """
+    keyed_table, columns, key_length = REFERENCE_TABLES[table_name]
+    duplicates = duplicate_keys(cursor, table_name)
+    if duplicates:
+        keys = '; '.join('/'.join(str(value) for value in row[:-1]) for row in duplicates[:10])
+        raise ValueError(f"{table_name} has {len(duplicates)} duplicate keys, {keyed_table} not rebuilt: {keys}")
+    create_covering_index(cursor, table_name)
+    cursor.execute(f"DROP TABLE IF EXISTS {keyed_table}")
+    cursor.execute(keyed_table_sql(table_name))
+    keyed_columns = ', '.join(keyed for keyed, _ in columns)
+    raw_columns = ', '.join(f'"{raw}"' for _, raw in columns)
+    cursor.execute(f'INSERT INTO {keyed_table} ({keyed_columns}) SELECT {raw_columns} FROM "{table_name}"')
+    cursor.execute(f"SELECT COUNT(*) FROM {keyed_table}")
+    return cursor.fetchone()[0]
+
+
+def build_reference_tables(cursor, table_names):
+    """
+    Rebuilds the keyed forms of table_names, then PATCH_RESOLUTION once both keyed tables exist,
+    in the caller's transaction. The caller rolls back on ValueError, so a load with duplicate
+    keys leaves the raw, keyed and resolution tables as the previous load left them.
+    """
+    for table_name in table_names:
+        rows = build_keyed_table(cursor, table_name)
+        print(f"INFO :: Built {REFERENCE_TABLES[table_name][0]} from {table_name} ({rows} rows)")
+    # PATCH_RESOLUTION follows the keyed tables once both have been loaded
+    keyed_tables = [keyed_table for keyed_table, _, _ in REFERENCE_TABLES.values()]
+    cursor.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+                   f"AND name IN ({', '.join('?' * len(keyed_tables))})", keyed_tables)
+    if cursor.fetchone()[0] == len(keyed_tables):
+        rows = build_resolution_table(cursor)
+        print(f"INFO :: Built {RESOLUTION_TABLE} ({rows} releases)")
+
+
+def rebuild_reference_tables(db, table_names):
+    """Rebuilds the keyed forms of table_names in one transaction; none of them change if one fails."""
+    # Autocommit mode with an explicit transaction, so the DDL is rolled back with the copy on failure
+    conn = sqlite3.connect(db, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        try:
+            build_reference_tables(cursor, table_names)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('ANALYZE')
+    finally:
+        conn.close()
+
+
+def ensure_reference_tables(db):
+    """Builds the keyed form of every loaded reference table, and PATCH_RESOLUTION, where missing."""
+    conn = sqlite3.connect(db)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    missing = [table_name for table_name, (keyed_table, _, _) in REFERENCE_TABLES.items()
+               if table_name in existing and keyed_table not in existing]
+    if missing or RESOLUTION_TABLE not in existing:
+        rebuild_reference_tables(db, missing)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        db = sys.argv[1]
+    else:
+        # Default to the master database from global_config.yaml
+        global_config = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Config", "global_config.yaml")
+        with open(global_config, "r") as f:
+            config = yaml.safe_load(f)
+        db = os.path.join(config["SQLITEDB_DIR"], config["MASTER_DB"])
+
+    ensure_reference_tables(db)
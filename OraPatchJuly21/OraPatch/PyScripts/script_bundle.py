@@ -0,0 +1,161 @@
+import io
+import os
+import gzip
+import shlex
+import socket
+import tarfile
+import hashlib
+import threading
+
+# Content-addressed ShellScripts bundle, cached on each remote host.
+#
+# Instead of piping a script through `bash -s` on every task, the whole script directory is
+# packed and hashed once, pushed to REMOTE_BUNDLE_ROOT/<hash> on a host the first time that
+# host is used with that hash, and every run then executes the cached copy. A host is checked
+# with one `test -f` per process; the bundle is only re-pushed when a script changes and so
+# does the hash. Scripts still run as `bash -s - args` with the cached file as stdin, so $0,
+# BASH_SOURCE and their log file names are exactly what they were when piped.
+
+REMOTE_BUNDLE_ROOT = '.orapatch/bundles'  # Relative to the remote login's home directory.
+BUNDLE_HASH_LENGTH = 16  # Hex digits of the sha256 used to name a bundle version.
+
+
+class ScriptBundle:
+    """One packed, hashed version of a script directory, and the hosts known to have it."""
+
+    def __init__(self, shell_dir, remote_root=REMOTE_BUNDLE_ROOT):
+        self.shell_dir = shell_dir
+        self.signature = directory_signature(shell_dir)
+        self.digest, self.data = pack(shell_dir)
+        self.remote_dir = f"{remote_root}/{self.digest}"
+        self.remote_root = remote_root
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    def command(self, script_name, script_args=''):
+        # The command that runs a script from the cached copy, in place of `bash -s - args` plus an upload
+        script = shlex.quote(f"{self.remote_dir}/{script_name}")
+        return f"bash -s - {script_args} < {script}" if script_args else f"bash -s < {script}"
+
+    def check_command(self):
+        return f"test -f {shlex.quote(self.remote_dir)}/.complete"
+
+    def push_command(self):
+        # Unpack into a private directory and rename it into place, so a host never sees half a bundle
+        remote_dir = shlex.quote(self.remote_dir)
+        remote_root = shlex.quote(self.remote_root)
+        return (f"mkdir -p {remote_root} && t=$(mktemp -d {remote_root}/.push.XXXXXX) && "
+                f"tar -xzf - -C \"$t\" && touch \"$t/.complete\" && "
+                f"{{ mv -T \"$t\" {remote_dir} 2>/dev/null || rm -rf \"$t\"; }}")
+
+    def is_verified(self, server):
+        with self._lock:
+            return server in self._verified
+
+    def mark_verified(self, server):
+        with self._lock:
+            self._verified.add(server)
+
+    def ensure(self, ssh, server):
+        """Makes sure the host behind a connected paramiko client has this bundle; pushes it when missing."""
+        if self.is_verified(server):
+            return
+        stdin, stdout, stderr = ssh.exec_command(self.check_command())
+        stdin.channel.shutdown_write()
+        if stdout.channel.recv_exit_status() != 0:
+            stdin, stdout, stderr = ssh.exec_command(self.push_command())
+            stdin.write(self.data)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+            error = stderr.read().decode(errors='replace')
+            if stdout.channel.recv_exit_status() != 0:
+                raise OSError(f"Pushing script bundle {self.digest} to {server} failed: {error.strip()}")
+        self.mark_verified(server)
+
+    async def ensure_async(self, conn, server):
+        """ensure() for an asyncssh connection."""
+        if self.is_verified(server):
+            return
+        result = await conn.run(self.check_command(), check=False)
+        if result.exit_status != 0:
+            result = await conn.run(self.push_command(), input=self.data, encoding=None, check=False)
+            if result.exit_status != 0:
+                error = result.stderr.decode(errors='replace') if result.stderr else ''
+                raise OSError(f"Pushing script bundle {self.digest} to {server} failed: {error.strip()}")
+        self.mark_verified(server)
+
+
+def directory_signature(shell_dir):
+    # Names, sizes and mtimes: a cheap stat-only way to notice that a script was edited
+    signature = []
+    for name in sorted(os.listdir(shell_dir)):
+        path = os.path.join(shell_dir, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            signature.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def pack(shell_dir):
+    """
+    Returns (digest, tar.gz bytes) for the regular files in shell_dir. The digest covers names and
+    contents only, and the archive is built with fixed metadata, so the same scripts always give
+    the same hash whatever their timestamps or ownership.
+    """
+    sha = hashlib.sha256()
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as gz, tarfile.open(fileobj=gz, mode='w') as tar:
+        for name in sorted(os.listdir(shell_dir)):
+            path = os.path.join(shell_dir, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                content = f.read()
+            sha.update(name.encode() + b'\0' + str(len(content)).encode() + b'\0' + content)
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(content))
+    return sha.hexdigest()[:BUNDLE_HASH_LENGTH], buffer.getvalue()
+
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+def bundle_for(script_path):
+    """The current bundle of the directory holding script_path, rebuilt only when a file in it changed."""
+    shell_dir = os.path.dirname(os.path.realpath(script_path))
+    with _bundles_lock:
+        bundle = _bundles.get(shell_dir)
+        if bundle is None or bundle.signature != directory_signature(shell_dir):
+            bundle = _bundles[shell_dir] = ScriptBundle(shell_dir)
+        return bundle
+
+
+def set_nodelay(sock):
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (AttributeError, OSError):  # A ProxyCommand or other non-TCP transport
+        pass
+
+
+def exec_bundled(ssh, server, script_path, script_args='', timeout=None):
+    """
+    Drop-in for exec_command('bash -s - args') followed by writing the script to stdin: runs the
+    host's cached copy of script_path, pushing the bundle first if needed. Returns
+    (stdin, stdout, stderr) with stdin already closed. server only names the host for the
+    per-process record of hosts known to have the bundle.
+    """
+    bundle = bundle_for(script_path)
+    if server is None:
+        # Callers that don't track a server name are keyed by the address they are connected to
+        server = ssh.get_transport().getpeername()
+    bundle.ensure(ssh, server)
+    # Without the script upload behind it, the exec request and EOF are two small packets in a row,
+    # which Nagle holds back until the server's delayed ACK (~40ms a task); send them right away
+    set_nodelay(ssh.get_transport().sock)
+    stdin, stdout, stderr = ssh.exec_command(bundle.command(os.path.basename(script_path), script_args),
+                                             timeout=timeout)
+    stdin.channel.shutdown_write()
+    return stdin, stdout, stderr
@@ -0,0 +1,39 @@
+#!/bin/bash
+# db_fingerprint.sh
+#
+# Prints one line (an md5 hash) that changes whenever the Oracle state collected by
+# db_inventory.sh could have changed: oratab, the central inventory, the OPatch
+# inventory of every home in oratab and the set of running pmon processes.
+# Used by DeltaInventory to skip db_inventory.sh on hosts where nothing changed.
+
+ORATAB=/etc/oratab
+INVPTR=/etc/oraInst.loc
+
+if [ -f "$INVPTR" ]; then
+orainv=$(< "$INVPTR" grep -i "inventory_loc" | awk -F'=' '{print $2}')
+else
+orainv='unknown'
+fi
+
+##################################################
+#           Function FINGERPRINT_DATA            #
+##################################################
+FINGERPRINT_DATA() {
+# Name, size and mtime only: cheap to read and enough to see an edit, a patch or a new home
+stat -c '%n|%s|%Y' "$ORATAB" "$INVPTR" "${orainv}/ContentsXML/inventory.xml" 2>/dev/null
+
+grep "^[A-Za-z+]" "$ORATAB" 2>/dev/null | grep -v "^$" | cut -d':' -f2 | sort -u | while read -r DB_HOME
+do
+  stat -c '%n|%s|%Y' \
+    "${DB_HOME}/inventory/ContentsXML/comps.xml" \
+    "${DB_HOME}/inventory/ContentsXML/oui-patch.xml" \
+    "${DB_HOME}/inventory/oneoffs" \
+    "${DB_HOME}/OPatch/opatch" 2>/dev/null
+done
+
+# Databases started or stopped change SID_STATUS and everything db_inventory.sh reads from them
+ps -eo args | grep -E "^(ora|asm)_pmon_" | sort
+}
+
+FINGERPRINT_DATA | md5sum | cut -d' ' -f1
+exit 0
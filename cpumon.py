@@ -1,20 +1,1072 @@
-from flask import Flask, render_template_string
+import argparse
+import array
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from flask import Flask, Response, jsonify, render_template, request
 import psutil
+import yaml
+
+SAMPLE_INTERVAL = 1.0  # Seconds between two CPU samples.
+HISTORY_SIZE = 3600  # Number of samples kept in the ring buffer (1 hour at 1s).
+USE_PROC_STAT = True  # Read /proc/stat directly when available instead of going through psutil.
+PROC_STAT_BUFFER = 256 * 1024  # Bytes preallocated for one /proc/stat read.
+STREAM_QUEUE_SIZE = 16  # Pending messages per /stream client before it is resynced.
+STREAM_KEEPALIVE = 15.0  # Seconds of silence before a keepalive comment is sent.
+METRICS_INTERVAL = 15.0  # Seconds between two /metrics collection passes.
+METRICS_MAX_CORES = 256  # Per-core series above this are folded into the summary series only.
+METRICS_MAX_FILESYSTEMS = 64  # Upper bound on per-filesystem series.
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+TOP_INTERVAL = 5.0  # Seconds between two process table scans for /api/top.
+TOP_PROCESSES = 10  # Busiest processes listed by /api/top.
+TOOLS_GROUP = 'opatch/java/perl'
+TOOLS_PROCESSES = ('opatch', 'datapatch', 'java', 'perl')
+OTHER_GROUP = 'other'
+SHM_NAME = os.environ.get('CPUMON_SHM_NAME', 'cpumon')  # Prefix of the shared memory segments.
+# Values the sampling process publishes to serving workers: (name, capacity in bytes)
+SHARED_BLOBS = (
+    ('metrics', 1024 * 1024),
+    ('top', 256 * 1024),
+    ('cgroup', 4 * 1024),
+)
+CGROUP_ROOT = '/sys/fs/cgroup'
+CGROUP_LIMIT_REFRESH = 60.0  # Seconds between two re-reads of the (rarely changing) CPU quota.
+HISTORY_DB_NAME = 'cpumon_history.db'
+HISTORY_FLUSH_INTERVAL = 10.0  # Seconds between two batched writes to the history database.
+RAW_RETENTION = 3600  # Seconds of 1s samples kept in the raw tier.
+# Rollup tiers, finest first: (table, bucket seconds, retention seconds)
+ROLLUP_TIERS = (
+    ('cpu_1m', 60, 7 * 86400),
+    ('cpu_1h', 3600, 365 * 86400),
+)
 
 app = Flask(__name__)
 
-@app.route('/')
-def home():
-    cpu_percentages = psutil.cpu_percent(percpu=True)
-    return render_template_string('''
+
+def get_history_db():
+    """Path of the history database: $CPUMON_HISTORY_DB, else SQLITEDB_DIR from the OraPatch global config."""
+    if os.environ.get('CPUMON_HISTORY_DB'):
+        return os.environ['CPUMON_HISTORY_DB']
+    base_directory = os.path.dirname(os.path.abspath(__file__))
+    yaml_file_location = os.path.join(base_directory, "OraPatchJuly21", "OraPatch", "Config", "global_config.yaml")
+    try:
+        with open(yaml_file_location, "r") as f:
+            config = yaml.safe_load(f)
+    except FileNotFoundError:
+        return None
+    if not os.path.isdir(config["SQLITEDB_DIR"]):
+        return None
+    return os.path.join(config["SQLITEDB_DIR"], HISTORY_DB_NAME)
+
+
+class ProcStatReader:
+    """Linux fast path: per-core utilisation straight from /proc/stat.
+
+    The file is read into a preallocated buffer and the counters and results
+    are kept in reused arrays. Parsing still copies the per-core lines once and
+    makes a bytes token and an int per field; that is what a read costs.
+    read() returns the same array every time; it is only valid until the next
+    call.
+    """
+
+    def __init__(self, path='/proc/stat', buffer_size=PROC_STAT_BUFFER):
+        self.path = path
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self.ncpu = 0
+        self._fields = 0
+        self._total = array.array('Q')
+        self._idle = array.array('Q')
+        self._percent = array.array('f')
+
+    def _load(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            n = os.readv(fd, [self._buffer])
+        finally:
+            os.close(fd)
+        # Per-core lines sit between the aggregate 'cpu ' line and the next non-cpu line
+        start = self._buffer.index(b'\ncpu', 0, n) + 1
+        end = self._buffer.find(b'\n', self._buffer.rfind(b'\ncpu', 0, n) + 1, n)
+        return self._view[start:end].tobytes().split()
+
+    def _resize(self, tokens):
+        fields = 1
+        while fields < len(tokens) and not tokens[fields].startswith(b'cpu'):
+            fields += 1
+        self._fields = fields
+        self.ncpu = len(tokens) // fields
+        self._total = array.array('Q', bytes(8 * self.ncpu))
+        self._idle = array.array('Q', bytes(8 * self.ncpu))
+        self._percent = array.array('f', bytes(4 * self.ncpu))
+
+    def read(self):
+        tokens = self._load()
+        if len(tokens) != self.ncpu * self._fields or not tokens[0].startswith(b'cpu'):
+            # First read, or a core went on/offline: start again from zero deltas
+            self._resize(tokens)
+        fields = self._fields
+        last = min(fields, 9)  # user nice system idle iowait irq softirq steal; guest is already in user/nice
+        has_iowait = fields > 5
+        total, idle, percent = self._total, self._idle, self._percent
+        for cpu in range(self.ncpu):
+            base = cpu * fields
+            cpu_total = sum(map(int, tokens[base + 1:base + last]))
+            cpu_idle = int(tokens[base + 4]) + int(tokens[base + 5]) if has_iowait else int(tokens[base + 4])
+            delta_total = cpu_total - total[cpu]
+            delta_busy = delta_total - (cpu_idle - idle[cpu])
+            percent[cpu] = round(100.0 * delta_busy / delta_total, 1) if delta_total > 0 and total[cpu] else 0.0
+            total[cpu] = cpu_total
+            idle[cpu] = cpu_idle
+        return percent
+
+
+class CpuSampler:
+    """Samples per-core CPU in a background thread into a fixed-size ring buffer.
+
+    The ring lives in one flat buffer (header, timestamps, per-core values) so it
+    can be a bytearray or a shared memory segment read by other processes. Writes
+    bump a sequence number before and after (a seqlock); readers retry if it moved.
+    """
+
+    HEADER = ('seq', 'head', 'count', 'ncpu')
+
+    def __init__(self, interval=SAMPLE_INTERVAL, size=HISTORY_SIZE):
+        self.interval = interval
+        self.size = size
+        self._proc_stat = None
+        if USE_PROC_STAT and os.path.isfile('/proc/stat'):
+            try:
+                self._proc_stat = ProcStatReader()
+                self._proc_stat.read()
+            except (OSError, ValueError, IndexError):
+                self._proc_stat = None
+        self.ncpu = self._proc_stat.ncpu if self._proc_stat else psutil.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.bind(bytearray(self.buffer_size(size, self.ncpu)))
+
+    @staticmethod
+    def buffer_size(size, ncpu):
+        return 8 * len(CpuSampler.HEADER) + 8 * size + 4 * size * ncpu
+
+    def bind(self, buffer, initialise=True):
+        """Keep the ring in `buffer`; with initialise=False, adopt the ring another process writes there."""
+        view = memoryview(buffer)
+        header_size = 8 * len(self.HEADER)
+        self._header = view[:header_size].cast('Q')
+        if initialise:
+            self._header[3] = self.ncpu
+        else:
+            self.ncpu = self._header[3]
+        times_end = header_size + 8 * self.size
+        self._times = view[header_size:times_end].cast('d')
+        self._values = view[times_end:times_end + 4 * self.size * self.ncpu].cast('f')
+
+    def add_listener(self, callback):
+        """Register callback(ts, cpu_percentages), called from the sampler thread after each sample."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cpu-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def follow(self):
+        """Fire listeners for samples written by another process, instead of sampling here."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._follow, name='cpu-follower', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def read_cpu(self):
+        if self._proc_stat is not None:
+            return self._proc_stat.read()
+        return psutil.cpu_percent(percpu=True)
+
+    def _run(self):
+        # The first call only primes the counters
+        self.read_cpu()
+        while not self._stop.wait(self.interval):
+            self.record(time.time(), self.read_cpu())
+
+    def _follow(self):
+        last = None
+        while not self._stop.wait(self.interval / 4):
+            ts, values = self.latest()
+            if ts is not None and ts != last:
+                last = ts
+                self._notify(ts, values)
+
+    def record(self, ts, cpu_percentages):
+        row = array.array('f', cpu_percentages[:self.ncpu])
+        if len(row) < self.ncpu:
+            row.extend([0.0] * (self.ncpu - len(row)))
+        header = self._header
+        with self._lock:
+            header[0] += 1
+            slot = header[1]
+            self._times[slot] = ts
+            offset = slot * self.ncpu
+            self._values[offset:offset + self.ncpu] = row
+            header[1] = (slot + 1) % self.size
+            header[2] = min(header[2] + 1, self.size)
+            header[0] += 1
+        self._notify(ts, cpu_percentages)
+
+    def _notify(self, ts, cpu_percentages):
+        for callback in self._listeners:
+            # cpu_percentages may be reused by the next read; listeners must copy what they keep
+            callback(ts, cpu_percentages)
+
+    def _consistent(self, read):
+        """Run read(head, count) until no write overlapped it."""
+        header = self._header
+        with self._lock:
+            while True:
+                seq = header[0]
+                if seq & 1:
+                    time.sleep(0)
+                    continue
+                result = read(header[1], header[2])
+                if header[0] == seq:
+                    return result
+
+    def latest(self):
+        def read(head, count):
+            if not count:
+                return None, [0.0] * self.ncpu
+            slot = (head - 1) % self.size
+            offset = slot * self.ncpu
+            return self._times[slot], [round(v, 1) for v in self._values[offset:offset + self.ncpu]]
+        return self._consistent(read)
+
+    def history(self, window):
+        """Return the (timestamp, per-core values) samples of the last `window` seconds, oldest first."""
+        cutoff = time.time() - window
+
+        def read(head, count):
+            count = min(count, int(window / self.interval) + 1)
+            samples = []
+            for i in range(count):
+                slot = (head - count + i) % self.size
+                ts = self._times[slot]
+                if ts < cutoff:
+                    continue
+                offset = slot * self.ncpu
+                samples.append((ts, [round(v, 1) for v in self._values[offset:offset + self.ncpu]]))
+            return samples
+        return self._consistent(read)
+
+
+class StreamHub:
+    """Fans each sample out to all /stream clients as one pre-serialised SSE message."""
+
+    def __init__(self, sampler, queue_size=STREAM_QUEUE_SIZE):
+        self.sampler = sampler
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._previous = None
+        sampler.add_listener(self.publish)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def snapshot(self):
+        ts, values = self.sampler.latest()
+        return f"event: snapshot\ndata: {json.dumps({'t': ts, 'c': values}, separators=(',', ':'))}\n\n".encode()
+
+    def publish(self, ts, cpu_percentages):
+        values = [round(v, 1) for v in cpu_percentages]
+        previous = self._previous or [None] * len(values)
+        changed = [[i, v] for i, (v, p) in enumerate(zip(values, previous)) if v != p]
+        self._previous = values
+        message = f"data: {json.dumps({'t': ts, 'd': changed}, separators=(',', ':'))}\n\n".encode()
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client is too slow: drop its backlog and let it resync from a snapshot
+                try:
+                    while True:
+                        subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsExporter:
+    """Collects host metrics once per interval on the sampler thread and keeps them as OpenMetrics bytes.
+
+    Filesystem usage is scanned on its own thread, because statvfs on a hung
+    mount (a dead NFS server) blocks; the sampler publishes the last finished
+    scan, and cpumon_filesystem_scan_age_seconds shows how old it is.
+    """
+
+    def __init__(self, sampler, interval=METRICS_INTERVAL):
+        self.sampler = sampler
+        self.interval = interval
+        self._collected = 0.0
+        self._filesystems = ([], [])  # (size samples, free samples) of the last finished scan
+        self._filesystems_scanned = None
+        self._thread = None
+        self.payload = b'# EOF\n'
+        sampler.add_listener(self.on_sample)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='filesystem-scanner', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self.scan_filesystems()
+            time.sleep(self.interval)
+
+    def scan_filesystems(self):
+        size, free = [], []
+        for partition in psutil.disk_partitions(all=False)[:METRICS_MAX_FILESYSTEMS]:
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except OSError:
+                continue
+            labels = (('mountpoint', partition.mountpoint), ('fstype', partition.fstype))
+            size.append((labels, usage.total))
+            free.append((labels, usage.free))
+        self._filesystems = (size, free)
+        self._filesystems_scanned = time.time()
+
+    def on_sample(self, ts, cpu_percentages):
+        if ts - self._collected >= self.interval:
+            self.collect(ts, cpu_percentages)
+
+    def collect(self, ts, cpu_percentages):
+        lines = []
+
+        def family(name, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        cores = cpu_percentages[:METRICS_MAX_CORES]
+        family('cpumon_cpu_usage_percent', 'Per-core CPU utilisation over the last sample interval.',
+               [((('cpu', i),), round(v, 1)) for i, v in enumerate(cores)])
+        family('cpumon_cpu_usage_avg_percent', 'Average CPU utilisation across all cores.',
+               [((), round(sum(cpu_percentages) / len(cpu_percentages), 2) if cpu_percentages else 0.0)])
+        family('cpumon_cpu_usage_max_percent', 'Utilisation of the busiest core.',
+               [((), round(max(cpu_percentages, default=0.0), 1))])
+        family('cpumon_cpu_count', 'Number of logical cores.', [((), len(cpu_percentages))])
+
+        load1, load5, load15 = psutil.getloadavg()
+        family('cpumon_load_average', 'System load average.',
+               [((('period', '1m'),), load1), ((('period', '5m'),), load5), ((('period', '15m'),), load15)])
+
+        memory = psutil.virtual_memory()
+        family('cpumon_memory_bytes', 'Physical memory.',
+               [((('state', state),), getattr(memory, state)) for state in ('total', 'available', 'used', 'free')])
+
+        swap = psutil.swap_memory()
+        family('cpumon_swap_bytes', 'Swap space.',
+               [((('state', state),), getattr(swap, state)) for state in ('total', 'used', 'free')])
+
+        size, free = self._filesystems
+        family('cpumon_filesystem_size_bytes', 'Filesystem size.', size)
+        family('cpumon_filesystem_free_bytes', 'Filesystem free space.', free)
+        if self._filesystems_scanned is not None:
+            family('cpumon_filesystem_scan_age_seconds', 'Seconds since the filesystem figures were read.',
+                   [((), round(max(0.0, ts - self._filesystems_scanned), 1))])
+
+        lines.append('# EOF\n')
+        self.payload = '\n'.join(lines).encode()
+        self._collected = ts
+
+
+class HistoryStore:
+    """Persists samples to SQLite in batches and keeps incremental 1-minute and 1-hour rollups."""
+
+    def __init__(self, sampler, db, flush_interval=HISTORY_FLUSH_INTERVAL):
+        self.sampler = sampler
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cpu_raw (ts REAL PRIMARY KEY, avg REAL, max REAL, cores BLOB)')
+            for table, _, _ in ROLLUP_TIERS:
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER PRIMARY KEY,
+                    samples INTEGER,
+                    sum_avg REAL,
+                    min_avg REAL,
+                    max_avg REAL,
+                    max REAL
+                    )
+                ''')
+        sampler.add_listener(self.on_sample)
+
+    def connect(self):
+        return sqlite3.connect(self.db, timeout=30)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        conn = self.connect()
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush(conn)
+            except sqlite3.Error as error:
+                print("An error occurred:", error.args[0])
+
+    def on_sample(self, ts, cpu_percentages):
+        cores = array.array('f', cpu_percentages)
+        with self._lock:
+            self._pending.append((ts, sum(cpu_percentages) / len(cpu_percentages), max(cpu_percentages), cores.tobytes()))
+
+    def flush(self, conn):
+        """Write all pending samples and fold them into every rollup tier in a single transaction."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = batch[-1][0]
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO cpu_raw VALUES (?, ?, ?, ?)', batch)
+            conn.execute('DELETE FROM cpu_raw WHERE ts < ?', (now - RAW_RETENTION,))
+            for table, bucket_seconds, retention in ROLLUP_TIERS:
+                # Pre-aggregate the batch per bucket so each bucket costs one upsert
+                buckets = {}
+                for ts, avg, peak, _ in batch:
+                    bucket = int(ts // bucket_seconds * bucket_seconds)
+                    agg = buckets.get(bucket)
+                    if agg is None:
+                        buckets[bucket] = [1, avg, avg, avg, peak]
+                    else:
+                        agg[0] += 1
+                        agg[1] += avg
+                        agg[2] = min(agg[2], avg)
+                        agg[3] = max(agg[3], avg)
+                        agg[4] = max(agg[4], peak)
+                conn.executemany(f'''
+                    INSERT INTO {table} (bucket, samples, sum_avg, min_avg, max_avg, max)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(bucket) DO UPDATE SET
+                    samples = samples + excluded.samples,
+                    sum_avg = sum_avg + excluded.sum_avg,
+                    min_avg = MIN(min_avg, excluded.min_avg),
+                    max_avg = MAX(max_avg, excluded.max_avg),
+                    max = MAX(max, excluded.max)
+                ''', [(bucket, *agg) for bucket, agg in buckets.items()])
+                conn.execute(f'DELETE FROM {table} WHERE bucket < ?', (now - retention,))
+
+    def query(self, window):
+        """Return (tier, rows) for the last `window` seconds from the finest tier that still covers it."""
+        since = time.time() - window
+        with self.connect() as conn:
+            if window <= RAW_RETENTION:
+                rows = conn.execute('SELECT ts, avg, max, cores FROM cpu_raw WHERE ts >= ? ORDER BY ts', (since,))
+                return 'raw', [{'ts': ts, 'avg': round(avg, 1), 'max': round(peak, 1),
+                                'cpu': [round(v, 1) for v in array.array('f', cores)]}
+                               for ts, avg, peak, cores in rows]
+            for table, _, retention in ROLLUP_TIERS:
+                if window <= retention or table == ROLLUP_TIERS[-1][0]:
+                    rows = conn.execute(f'''
+                        SELECT bucket, sum_avg / samples, min_avg, max_avg, max
+                        FROM {table} WHERE bucket >= ? ORDER BY bucket
+                    ''', (since,))
+                    return table, [{'ts': bucket, 'avg': round(avg, 1), 'min_avg': round(low, 1),
+                                    'max_avg': round(high, 1), 'max': round(peak, 1)}
+                                   for bucket, avg, low, high, peak in rows]
+
+
+class CgroupMonitor:
+    """Reports a cgroup's CPU usage against its quota, plus throttling, once per sampler tick.
+
+    Reads cpu.stat (and cpu.max every CGROUP_LIMIT_REFRESH seconds) on cgroup v2;
+    falls back to cpuacct.usage and cpu.cfs_quota_us/cpu.cfs_period_us on v1.
+    `path` is relative to the cgroup root, or 'self' for cpumon's own cgroup.
+    """
+
+    def __init__(self, sampler, path='self', root=CGROUP_ROOT, proc_cgroup='/proc/self/cgroup'):
+        self.root = root
+        self.version = 2 if os.path.isfile(os.path.join(root, 'cgroup.controllers')) else 1
+        if path == 'self':
+            path = self._own_path(proc_cgroup)
+        self.path = '/' + path.strip('/')
+        if self.version == 2:
+            self.cpu_dir = self.acct_dir = os.path.join(root, path.strip('/'))
+        else:
+            self.cpu_dir = self._v1_dir(('cpu,cpuacct', 'cpuacct,cpu', 'cpu'), path)
+            self.acct_dir = self._v1_dir(('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct'), path)
+        self._previous = None
+        self._limit_read = 0.0
+        self.quota_cores = None
+        self.status = {'path': self.path, 'version': self.version}
+        sampler.add_listener(self.on_sample)
+
+    def _own_path(self, proc_cgroup):
+        with open(proc_cgroup, 'r') as f:
+            for line in f:
+                _, controllers, path = line.rstrip('\n').split(':', 2)
+                if self.version == 2 and controllers == '':
+                    return path
+                if self.version == 1 and ('cpuacct' in controllers.split(',') or 'cpu' in controllers.split(',')):
+                    return path
+        return '/'
+
+    def _v1_dir(self, candidates, path):
+        for controller in candidates:
+            directory = os.path.join(self.root, controller)
+            if os.path.isdir(directory):
+                return os.path.join(directory, path.strip('/'))
+        raise FileNotFoundError(f"No cgroup v1 cpu/cpuacct hierarchy under {self.root}")
+
+    def _read(self, directory, name):
+        with open(os.path.join(directory, name), 'r') as f:
+            return f.read()
+
+    def read_counters(self):
+        """Return (usage_usec, nr_periods, nr_throttled, throttled_usec) as cumulative counters."""
+        stat = dict(line.split() for line in self._read(self.cpu_dir, 'cpu.stat').splitlines() if line)
+        if self.version == 2:
+            return (int(stat['usage_usec']), int(stat.get('nr_periods', 0)),
+                    int(stat.get('nr_throttled', 0)), int(stat.get('throttled_usec', 0)))
+        usage = int(self._read(self.acct_dir, 'cpuacct.usage')) // 1000
+        return (usage, int(stat.get('nr_periods', 0)),
+                int(stat.get('nr_throttled', 0)), int(stat.get('throttled_time', 0)) // 1000)
+
+    def read_quota(self):
+        """Return the CPU quota in cores, or None when the cgroup is unlimited."""
+        if self.version == 2:
+            quota, period = self._read(self.cpu_dir, 'cpu.max').split()
+            return None if quota == 'max' else int(quota) / int(period)
+        quota = int(self._read(self.cpu_dir, 'cpu.cfs_quota_us'))
+        period = int(self._read(self.cpu_dir, 'cpu.cfs_period_us'))
+        return None if quota < 0 else quota / period
+
+    def on_sample(self, ts, cpu_percentages):
+        try:
+            if ts - self._limit_read >= CGROUP_LIMIT_REFRESH:
+                self.quota_cores = self.read_quota()
+                self._limit_read = ts
+            counters = self.read_counters()
+        except (OSError, ValueError, KeyError) as e:
+            self.status = {'path': self.path, 'version': self.version, 'error': str(e)}
+            return
+        previous, self._previous = self._previous, (ts, counters)
+        if previous is None:
+            return
+        elapsed = ts - previous[0]
+        usage, periods, throttled, throttled_usec = (now - then for now, then in zip(counters, previous[1]))
+        usage_cores = usage / 1e6 / elapsed if elapsed > 0 else 0.0
+        self.status = {
+            'path': self.path,
+            'version': self.version,
+            'usage_cores': round(usage_cores, 3),
+            'quota_cores': self.quota_cores,
+            'usage_pct_of_quota': round(100.0 * usage_cores / self.quota_cores, 1) if self.quota_cores else None,
+            'periods': periods,
+            'throttled_periods': throttled,
+            'throttled_ms': round(throttled_usec / 1000, 1),
+            'throttled_periods_total': counters[2],
+            'throttled_ms_total': round(counters[3] / 1000, 1),
+        }
+
+
+ORACLE_BACKGROUND = re.compile(r'^(?:ora|asm|apx|mgmtdb)_[a-z0-9]+_(.+)$')
+ORACLE_FOREGROUND = re.compile(r'^oracle(\S+)')
+ORACLE_PREFIXES = ('ora_', 'asm_', 'apx_', 'mgmtdb_', 'oracle')
+COMM_LENGTH = 15  # The kernel truncates the comm name in /proc/<pid>/stat to this many characters.
+
+
+def classify_process(name, cmdline=''):
+    """Map a process to its Oracle SID, the opatch/java/perl bucket or 'other'."""
+    match = ORACLE_BACKGROUND.match(name)
+    if match:
+        return match.group(1)
+    # Dedicated server processes are named oracle<SID> (LOCAL=NO)
+    match = ORACLE_FOREGROUND.match(cmdline)
+    if match and name.startswith('oracle'):
+        return match.group(1)
+    if name in TOOLS_PROCESSES:
+        return TOOLS_GROUP
+    return OTHER_GROUP
+
+
+class ProcessTracker:
+    """Scans the process table on its own thread and attributes CPU to Oracle SIDs from per-PID deltas.
+
+    Each PID is classified once, when first seen; later scans only read its CPU
+    ticks from /proc/<pid>/stat (psutil on other platforms). Oracle processes and
+    names cut at COMM_LENGTH are named from argv[0] instead, so ora_pmon_FINPROD1
+    and ora_pmon_FINPROD2 are not both seen as ora_pmon_FINPRO.
+    """
+
+    def __init__(self, interval=TOP_INTERVAL):
+        self.interval = interval
+        self.use_proc = os.path.isdir('/proc/self')
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if self.use_proc else 1
+        self._known = {}  # pid -> [start, name, group, cpu ticks (seconds without /proc)]
+        self._scanned = None
+        self.top = {'ts': None, 'interval': interval, 'scan_ms': None, 'processes': 0, 'groups': [], 'top': []}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='process-tracker', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self.scan()
+            time.sleep(self.interval)
+
+    def _read_proc(self):
+        """Yield (pid, start, name, ticks) straight from /proc/<pid>/stat."""
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                fd = os.open(f'/proc/{entry}/stat', os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                stat = os.read(fd, 1024)
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+            # The command name is in parentheses and may itself contain spaces or ')'
+            close = stat.rfind(b')')
+            fields = stat[close + 2:].split(b' ', 20)
+            yield int(entry), fields[19], stat[stat.find(b'(') + 1:close], int(fields[11]) + int(fields[12])
+
+    def _read_psutil(self):
+        for process in psutil.process_iter(['create_time', 'name', 'cpu_times']):
+            info = process.info
+            if info['cpu_times'] is None:
+                continue
+            yield process.pid, info['create_time'], info['name'] or '', info['cpu_times'].user + info['cpu_times'].system
+
+    def _cmdline(self, pid):
+        """The process's argv, or [] if it is gone or unreadable."""
+        try:
+            if self.use_proc:
+                with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                    return [arg.decode(errors='replace') for arg in f.read().split(b'\0') if arg]
+            return psutil.Process(pid).cmdline()
+        except (OSError, psutil.Error):
+            return []
+
+    def _full_name(self, name, argv):
+        # Oracle rewrites argv[0] to the full process name (ora_pmon_<SID>, oracle<SID> (LOCAL=NO))
+        if not argv:
+            return name
+        argv0 = os.path.basename(argv[0].split(' ', 1)[0])
+        return argv0 if len(argv0) > len(name) and argv0.startswith(name) else name
+
+    def scan(self):
+        start = time.perf_counter()
+        now = time.monotonic()
+        elapsed = now - self._scanned if self._scanned else None
+        scale = 100.0 / self.clock_ticks / elapsed if elapsed else 0.0
+        groups = {}
+        busiest = []
+        seen = {}
+        for pid, started, name, ticks in (self._read_proc() if self.use_proc else self._read_psutil()):
+            known = self._known.get(pid)
+            if known is None or known[0] != started:
+                # New process (or a recycled PID): classify it once
+                if isinstance(name, bytes):
+                    name = name.decode(errors='replace')
+                argv = self._cmdline(pid) if len(name) >= COMM_LENGTH or name.startswith(ORACLE_PREFIXES) else []
+                name = self._full_name(name, argv)
+                known = [started, name, classify_process(name, ' '.join(argv)), ticks]
+                delta = 0
+            else:
+                delta = ticks - known[3]
+                known[3] = ticks
+            seen[pid] = known
+            group = groups.setdefault(known[2], [0.0, 0])
+            group[1] += 1
+            if delta:
+                percent = delta * scale
+                group[0] += percent
+                busiest.append((percent, pid, known[1], known[2]))
+        self._known = seen
+        self._scanned = now
+
+        busiest.sort(reverse=True)
+        self.top = {
+            'ts': time.time(),
+            'interval': self.interval,
+            'scan_ms': round((time.perf_counter() - start) * 1000, 2),
+            'processes': len(seen),
+            'groups': sorted(({'group': g, 'cpu_percent': round(c, 1), 'processes': n}
+                              for g, (c, n) in groups.items()), key=lambda g: -g['cpu_percent']),
+            'top': [{'pid': pid, 'name': name, 'group': group, 'cpu_percent': round(percent, 1)}
+                    for percent, pid, name, group in busiest[:TOP_PROCESSES]],
+        }
+        return self.top
+
+
+sampler = CpuSampler()
+hub = StreamHub(sampler)
+metrics_exporter = MetricsExporter(sampler)
+HISTORY_DB = get_history_db()
+history_store = HistoryStore(sampler, HISTORY_DB) if HISTORY_DB else None
+process_tracker = ProcessTracker()
+cgroup_monitor = None
+
+
+def enable_cgroup(path, root=CGROUP_ROOT):
+    """Turn on cgroup accounting for `path` (relative to the cgroup root, or 'self')."""
+    global cgroup_monitor
+    cgroup_monitor = CgroupMonitor(sampler, path, root)
+    return cgroup_monitor
+
+
+if os.environ.get('CPUMON_CGROUP'):
+    enable_cgroup(os.environ['CPUMON_CGROUP'])
+
+
+def start_background():
+    """Start the sampling threads; importing cpumon alone (benchmarks, tools) does not."""
+    sampler.start()
+    metrics_exporter.start()
+    if history_store:
+        history_store.start()
+    process_tracker.start()
+
+
+class SharedBlob:
+    """One bytes value in a shared memory segment, written by one process and read by many (seqlock)."""
+
+    def __init__(self, segment):
+        self.segment = segment
+        self._header = segment.buf[:16].cast('Q')  # seq, length
+        self._data = segment.buf[16:]
+
+    def write(self, data):
+        if len(data) > len(self._data):
+            raise ValueError(f"{len(data)} bytes do not fit in shared segment {self.segment.name}")
+        self._header[0] += 1
+        self._data[:len(data)] = data
+        self._header[1] = len(data)
+        self._header[0] += 1
+
+    def read(self):
+        while True:
+            seq = self._header[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            data = bytes(self._data[:self._header[1]])
+            if self._header[0] == seq:
+                return data
+
+    def release(self):
+        self._header.release()
+        self._data.release()
+
+
+def _shared_segment(name, size=0, create=False):
+    if create:
+        try:
+            # Left behind by a sampling process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        return shared_memory.SharedMemory(name, create=True, size=size)
+    segment = shared_memory.SharedMemory(name)
+    if shared_owner_pid is None:
+        # Only the creating process may unlink the segment when it exits. A process forked
+        # from it shares its resource tracker, where the segment is already registered.
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+shared_segments = []
+shared_blobs = {}
+shared_owner_pid = None
+shared_worker = False
+
+
+def start_shared_owner(name=SHM_NAME):
+    """Sample in this process (e.g. the gunicorn master) and publish the results to shared memory."""
+    global shared_owner_pid
+    ring = _shared_segment(name, CpuSampler.buffer_size(sampler.size, sampler.ncpu), create=True)
+    sampler.bind(ring.buf)
+    shared_segments.append(ring)
+    for key, capacity in SHARED_BLOBS:
+        segment = _shared_segment(f'{name}_{key}', capacity + 16, create=True)
+        shared_segments.append(segment)
+        shared_blobs[key] = SharedBlob(segment)
+    shared_owner_pid = os.getpid()
+    published = {}
+
+    def publish(ts, cpu_percentages):
+        current = (
+            ('metrics', metrics_exporter.payload),
+            ('top', process_tracker.top),
+            ('cgroup', cgroup_monitor.status if cgroup_monitor else None),
+        )
+        for key, value in current:
+            # Each value is replaced (never mutated) when it changes, so identity is enough
+            if key not in published or published[key] is not value:
+                published[key] = value
+                shared_blobs[key].write(value if isinstance(value, bytes) else json.dumps(value).encode())
+
+    sampler.add_listener(publish)
+    start_background()
+
+
+def attach_shared_worker(name=SHM_NAME):
+    """Serve the ring and values published by the sampling process; sample nothing in this process."""
+    global shared_worker
+    # Locks, threads and views copied by fork() belong to the parent
+    sampler._lock = threading.Lock()
+    sampler._thread = None
+    hub._lock = threading.Lock()
+    ring = _shared_segment(name)
+    sampler.bind(ring.buf, initialise=False)
+    for blob in shared_blobs.values():
+        blob.release()
+    shared_blobs.clear()
+    shared_segments[:] = [ring]
+    for key, _ in SHARED_BLOBS:
+        segment = _shared_segment(f'{name}_{key}')
+        shared_segments.append(segment)
+        shared_blobs[key] = SharedBlob(segment)
+    # Only the SSE fan-out runs here; collection and persistence stay in the sampling process
+    sampler._listeners[:] = [hub.publish]
+    shared_worker = True
+    sampler.follow()
+
+
+def close_shared(unlink=False):
+    # The segments can only be closed once no view into them is left
+    with sampler._lock:
+        sampler.bind(bytearray(CpuSampler.buffer_size(sampler.size, sampler.ncpu)))
+    for blob in shared_blobs.values():
+        blob.release()
+    shared_blobs.clear()
+    for segment in shared_segments:
+        segment.close()
+        if unlink:
+            segment.unlink()
+    shared_segments.clear()
+
+
+def current_metrics():
+    return shared_blobs['metrics'].read() if shared_worker else metrics_exporter.payload
+
+
+def current_top():
+    if shared_worker:
+        data = shared_blobs['top'].read()
+        return json.loads(data) if data else {}
+    return process_tracker.top
+
+
+def current_cgroup():
+    if shared_worker:
+        data = shared_blobs['cgroup'].read()
+        return json.loads(data) if data else None
+    return cgroup_monitor.status if cgroup_monitor else None
+
+
+# Templates are compiled once at import instead of on every request
+HOME_TEMPLATE = app.jinja_env.from_string('''
+        {% if cgroup %}
+            <p>
+                cgroup {{ cgroup.path }} (v{{ cgroup.version }}):
+                {% if cgroup.error %}
+                    {{ cgroup.error }}
+                {% else %}
+                    {{ cgroup.usage_cores }} cores used of
+                    {{ cgroup.quota_cores if cgroup.quota_cores else 'unlimited' }}
+                    {% if cgroup.usage_pct_of_quota is not none %}({{ cgroup.usage_pct_of_quota }}% of quota){% endif %},
+                    throttled {{ cgroup.throttled_periods }}/{{ cgroup.periods }} periods, {{ cgroup.throttled_ms }} ms
+                {% endif %}
+            </p>
+        {% endif %}
         <ul>
             {% for cpu in cpus %}
                 <li>CPU {{ loop.index }}: {{ cpu }}%</li>
             {% endfor %}
         </ul>
-    ''', cpus=cpu_percentages)
+    ''')
+
+LIVE_TEMPLATE = app.jinja_env.from_string('''
+        <!DOCTYPE html>
+        <html>
+        <head><title>cpumon live</title></head>
+        <body>
+            <ul id="cpus"></ul>
+            <script>
+                var list = document.getElementById('cpus');
+                var items = [];
+                function setCpu(i, v) {
+                    if (!items[i]) {
+                        items[i] = document.createElement('li');
+                        list.appendChild(items[i]);
+                    }
+                    items[i].textContent = 'CPU ' + (i + 1) + ': ' + v + '%';
+                }
+                var source = new EventSource('{{ url_for("stream") }}');
+                source.addEventListener('snapshot', function (e) {
+                    JSON.parse(e.data).c.forEach(function (v, i) { setCpu(i, v); });
+                });
+                source.onmessage = function (e) {
+                    JSON.parse(e.data).d.forEach(function (d) { setCpu(d[0], d[1]); });
+                };
+            </script>
+        </body>
+        </html>
+    ''')
+
+
+@app.route('/')
+def home():
+    _, cpu_percentages = sampler.latest()
+    return render_template(HOME_TEMPLATE, cpus=cpu_percentages, cgroup=current_cgroup())
+
+
+@app.route('/api/cpu')
+def cpu():
+    ts, cpu_percentages = sampler.latest()
+    # A new sample is the only thing that changes the payload
+    etag = repr(ts)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        payload = {'ts': ts, 'interval': sampler.interval, 'cpu': cpu_percentages}
+        cgroup_status = current_cgroup()
+        if cgroup_status:
+            payload['cgroup'] = cgroup_status
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.cache_control.max_age = max(1, int(sampler.interval))
+    return response
+
+
+@app.route('/api/cgroup')
+def cgroup():
+    cgroup_status = current_cgroup()
+    if cgroup_status is None:
+        return jsonify({'error': 'cgroup accounting is not enabled (set CPUMON_CGROUP or --cgroup)'}), 404
+    return jsonify(cgroup_status)
+
+
+@app.route('/api/history')
+def history():
+    ring_window = sampler.size * sampler.interval
+    max_window = ROLLUP_TIERS[-1][2] if history_store else ring_window
+    window = request.args.get('window', default=60, type=float)
+    window = max(sampler.interval, min(window, max_window))
+    if window <= ring_window:
+        tier = 'memory'
+        samples = [{'ts': ts, 'cpu': values} for ts, values in sampler.history(window)]
+    else:
+        tier, samples = history_store.query(window)
+    return jsonify({
+        'interval': sampler.interval,
+        'cpus': sampler.ncpu,
+        'window': window,
+        'tier': tier,
+        'samples': samples,
+    })
+
+
+@app.route('/api/top')
+def top():
+    return jsonify(current_top())
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(current_metrics(), content_type=OPENMETRICS_CONTENT_TYPE)
+
+
+@app.route('/stream')
+def stream():
+    subscriber = hub.subscribe()
+
+    def events():
+        try:
+            yield hub.snapshot()
+            while True:
+                try:
+                    message = subscriber.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield b': keepalive\n\n'
+                    continue
+                yield hub.snapshot() if message is None else message
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/live')
+def live():
+    return render_template(LIVE_TEMPLATE)
 
 # Add by local
 # Add by Remote
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve per-core CPU usage.')
+    parser.add_argument('--host', default='0.0.0.0', help='address to listen on')
+    parser.add_argument('--port', type=int, default=5000, help='port to listen on')
+    parser.add_argument('--cgroup', help="report CPU against this cgroup's quota (path under the cgroup root, or 'self')")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0')
+    args = parse_args()
+    if args.cgroup:
+        enable_cgroup(args.cgroup)
+    start_background()
+    app.run(host=args.host, port=args.port)
@@ -0,0 +1,94 @@
+"""
+Concurrency benchmark for a running cpumon.
+
+Runs each path at 1, 10 and 100 concurrent keep-alive clients and reports
+throughput plus p50/p99 latency, to size the production serving mode.
+
+    gunicorn -c cpumon_wsgi.py cpumon_wsgi:app
+    python cpumon_bench.py --url http://localhost:5000 --duration 10
+"""
+import argparse
+import http.client
+import threading
+import time
+import urllib.parse
+
+CONCURRENCY = (1, 10, 100)
+PATHS = ('/', '/api/cpu', '/api/history?window=60', '/metrics')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def client(host, port, path, start_at, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    mine = []
+    failed = 0
+    while time.monotonic() < start_at:
+        time.sleep(0.001)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        if response.status != 200:
+            failed += 1
+            continue
+        mine.append(time.perf_counter() - started)
+    conn.close()
+    with lock:
+        latencies.extend(mine)
+        errors.append(failed)
+
+
+def run(url, path, clients, duration):
+    parsed = urllib.parse.urlparse(url)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_at = time.monotonic() + 0.5  # Let every client thread get going first
+    deadline = start_at + duration
+    threads = [
+        threading.Thread(target=client,
+                         args=(parsed.hostname, parsed.port or 80, path, start_at, deadline, latencies, errors, lock))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': sum(errors),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure cpumon latency and throughput under concurrency.')
+    parser.add_argument('--url', default='http://localhost:5000', help='base URL of a running cpumon')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per measurement')
+    parser.add_argument('--clients', default=','.join(map(str, CONCURRENCY)), help='comma-separated client counts')
+    parser.add_argument('--paths', default=','.join(PATHS), help='comma-separated paths to measure')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    print(f"{'path':<26} {'clients':>7} {'req/sec':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for path in args.paths.split(','):
+        for clients in (int(c) for c in args.clients.split(',')):
+            result = run(args.url, path, clients, args.duration)
+            print(f"{path:<26} {clients:>7} {result['rps']:>10.0f} {result['p50_ms']:>8.2f} "
+                  f"{result['p99_ms']:>8.2f} {result['errors']:>7}")
@@ -0,0 +1,206 @@
+"""
+Fleet view for cpumon.
+
+Polls the /api/cpu endpoint of every cpumon listed in the server list
+concurrently and serves one fleet-wide page sorted by the hottest host.
+Entries in the server list are host names, optionally host:port, so the
+aggregator can be pointed at local stand-in cpumon instances on different
+ports.
+
+    python cpumon_fleet.py --server-list ServerList/database_server_list.lst --port 5001
+    python cpumon_fleet.py --server-list hosts.lst --once
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+from flask import Flask, jsonify, render_template
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+CPUMON_PORT = 5000  # Port cpumon listens on when a server list entry has none.
+FLEET_INTERVAL = 5.0  # Seconds between two sweeps of the fleet.
+FLEET_TIMEOUT = 2.0  # Per-host deadline for a free connection, connect, request and response.
+FLEET_MAX_CONNECTIONS = None  # Connections open at the same time; None is one per host, up to the fd ceiling.
+FD_HEADROOM = 64  # File descriptors kept free for the web server and logging.
+SERVER_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "OraPatchJuly21", "OraPatch", "ServerList", "database_server_list.lst")
+
+app = Flask(__name__)
+
+
+def read_server_list(path, default_port=CPUMON_PORT):
+    """Return (host, port) pairs from a server list, skipping blanks and comments."""
+    targets = []
+    with open(path, "r") as f:
+        for line in f:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            host, _, port = entry.partition(":")
+            targets.append((host, int(port) if port else default_port))
+    return targets
+
+
+def connection_limit(targets, max_connections=FLEET_MAX_CONNECTIONS):
+    """One connection per target unless capped, and never more than the open-file limit allows."""
+    ceiling = 1024 - FD_HEADROOM
+    if resource is not None:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            ceiling = soft - FD_HEADROOM
+    limit = len(targets) if max_connections is None else max_connections
+    return max(1, min(limit, ceiling))
+
+
+async def fetch_cpu(host, port, semaphore, timeout=FLEET_TIMEOUT):
+    """Fetch /api/cpu from one cpumon; never raises, failures are reported in the result."""
+    name = host if port == CPUMON_PORT else f"{host}:{port}"
+    result = {"host": name, "ok": False, "error": None, "cpu": [], "avg": None, "max": None, "ts": None}
+    start = time.monotonic()
+    try:
+        # The deadline includes waiting for a connection slot, so a sweep never outlasts one timeout
+        body = await asyncio.wait_for(_limited_get(host, port, "/api/cpu", semaphore), timeout)
+        cpu, ts = _parse_cpu(body)
+    except asyncio.TimeoutError:
+        result["error"] = f"timeout after {timeout}s"
+    except (OSError, ValueError) as e:
+        result["error"] = str(e) or e.__class__.__name__
+    else:
+        result.update(ok=True, cpu=cpu, ts=ts,
+                      avg=round(sum(cpu) / len(cpu), 1) if cpu else 0.0, max=max(cpu, default=0.0))
+    result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return result
+
+
+def _parse_cpu(body):
+    # Anything but {"cpu": [numbers], ...} is that host's error, like an unreachable one
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError(f"unexpected body: {type(data).__name__}, not an object")
+    cpu = data.get("cpu") or []
+    if not isinstance(cpu, list) or not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                                            for value in cpu):
+        raise ValueError("unexpected body: cpu is not a list of numbers")
+    return cpu, data.get("ts")
+
+
+async def _limited_get(host, port, path, semaphore):
+    async with semaphore:
+        return await _http_get(host, port, path)
+
+
+async def _http_get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n"
+                     f"Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or parts[1] != "200":
+        raise ValueError(f"unexpected response: {status_line}")
+    return body
+
+
+async def sweep(targets, max_connections=FLEET_MAX_CONNECTIONS, timeout=FLEET_TIMEOUT):
+    """Poll every target at once, bounded by connection_limit; hottest reachable host first."""
+    semaphore = asyncio.Semaphore(connection_limit(targets, max_connections))
+    results = await asyncio.gather(*(fetch_cpu(host, port, semaphore, timeout) for host, port in targets))
+    return sorted(results, key=lambda r: (not r["ok"], -(r["avg"] or 0.0), r["host"]))
+
+
+class FleetPoller:
+    """Runs a sweep every interval on a background event loop and keeps the latest fleet view."""
+
+    def __init__(self, targets, interval=FLEET_INTERVAL, max_connections=FLEET_MAX_CONNECTIONS, timeout=FLEET_TIMEOUT):
+        self.targets = targets
+        self.interval = interval
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.hosts = []
+        self.swept_at = None
+        self.sweep_ms = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="fleet-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            hosts = await sweep(self.targets, self.max_connections, self.timeout)
+            self.hosts, self.swept_at = hosts, time.time()
+            self.sweep_ms = round((time.monotonic() - start) * 1000, 1)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+
+poller = None
+
+FLEET_TEMPLATE = app.jinja_env.from_string('''
+        <table>
+            <tr><th>Host</th><th>Avg CPU %</th><th>Max CPU %</th><th>Cores</th><th>Status</th></tr>
+            {% for host in hosts %}
+                <tr>
+                    <td>{{ host.host }}</td>
+                    <td>{{ host.avg if host.ok else '' }}</td>
+                    <td>{{ host.max if host.ok else '' }}</td>
+                    <td>{{ host.cpu|length if host.ok else '' }}</td>
+                    <td>{{ 'OK' if host.ok else host.error }}</td>
+                </tr>
+            {% endfor %}
+        </table>
+    ''')
+
+
+@app.route('/')
+def home():
+    return render_template(FLEET_TEMPLATE, hosts=poller.hosts)
+
+
+@app.route('/api/fleet')
+def fleet():
+    return jsonify({
+        'swept_at': poller.swept_at,
+        'sweep_ms': poller.sweep_ms,
+        'hosts': poller.hosts,
+    })
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Aggregate cpumon across the fleet.')
+    parser.add_argument('--server-list', default=SERVER_LIST, help='file with one host or host:port per line')
+    parser.add_argument('--host', default='0.0.0.0', help='address to serve the fleet view on')
+    parser.add_argument('--port', type=int, default=5001, help='port to serve the fleet view on')
+    parser.add_argument('--interval', type=float, default=FLEET_INTERVAL, help='seconds between sweeps')
+    parser.add_argument('--timeout', type=float, default=FLEET_TIMEOUT,
+                        help='per-host timeout in seconds, waiting for a connection included')
+    parser.add_argument('--max-connections', type=int, default=FLEET_MAX_CONNECTIONS,
+                        help='concurrent connections (default: one per host, up to the open-file limit)')
+    parser.add_argument('--once', action='store_true', help='run a single sweep, print it as JSON and exit')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    targets = read_server_list(args.server_list)
+    if args.once:
+        start = time.monotonic()
+        hosts = asyncio.run(sweep(targets, args.max_connections, args.timeout))
+        print(json.dumps({'sweep_ms': round((time.monotonic() - start) * 1000, 1), 'hosts': hosts}, indent=2))
+    else:
+        poller = FleetPoller(targets, args.interval, args.max_connections, args.timeout).start()
+        app.run(host=args.host, port=args.port)
@@ -0,0 +1,117 @@
+"""
+Small load test for cpumon.
+
+Compares requests/sec of the old per-request template compile against the
+precompiled template in-process, then hammers a running cpumon instance over
+HTTP: the full HTML page, the /api/cpu JSON endpoint, and /api/cpu with
+If-None-Match (the 304 path pollers hit between samples).
+
+    python cpumon_loadtest.py --url http://localhost:5000 --clients 10 --duration 10
+"""
+import argparse
+import http.client
+import threading
+import time
+import urllib.parse
+
+from jinja2 import Environment
+
+HOME_SOURCE = '''
+        <ul>
+            {% for cpu in cpus %}
+                <li>CPU {{ loop.index }}: {{ cpu }}%</li>
+            {% endfor %}
+        </ul>
+    '''
+
+
+def bench_templates(iterations, ncpu):
+    cpus = [12.5] * ncpu
+    env = Environment()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        # What render_template_string did on every request
+        env.from_string(HOME_SOURCE).render(cpus=cpus)
+    before = iterations / (time.perf_counter() - start)
+
+    template = env.from_string(HOME_SOURCE)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        template.render(cpus=cpus)
+    after = iterations / (time.perf_counter() - start)
+
+    print(f"Template render ({ncpu} cpus, {iterations} iterations)")
+    print(f"  compile per request : {before:10.0f} renders/sec")
+    print(f"  precompiled         : {after:10.0f} renders/sec ({after / before:.1f}x)")
+
+
+def http_worker(host, port, path, conditional, deadline, counts, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etag = None
+    ok = not_modified = errors = 0
+    while time.monotonic() < deadline:
+        headers = {'If-None-Match': etag} if conditional and etag else {}
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        if response.status == 304:
+            not_modified += 1
+        elif response.status == 200:
+            ok += 1
+            etag = response.getheader('ETag')
+        else:
+            errors += 1
+    conn.close()
+    with lock:
+        counts['200'] += ok
+        counts['304'] += not_modified
+        counts['errors'] += errors
+
+
+def bench_http(url, path, conditional, clients, duration):
+    parsed = urllib.parse.urlparse(url)
+    counts = {'200': 0, '304': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=http_worker,
+                         args=(parsed.hostname, parsed.port or 80, path, conditional, deadline, counts, lock))
+        for _ in range(clients)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    total = counts['200'] + counts['304']
+    label = f"{path}{' (If-None-Match)' if conditional else ''}"
+    print(f"  {label:<28}: {total / elapsed:10.0f} req/sec "
+          f"(200={counts['200']}, 304={counts['304']}, errors={counts['errors']})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test cpumon.')
+    parser.add_argument('--url', help='base URL of a running cpumon, e.g. http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=10, help='concurrent HTTP clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per HTTP scenario')
+    parser.add_argument('--iterations', type=int, default=2000, help='renders per template scenario')
+    parser.add_argument('--cpus', type=int, default=64, help='simulated core count for the template scenario')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    bench_templates(args.iterations, args.cpus)
+    if args.url:
+        print(f"HTTP against {args.url} ({args.clients} clients, {args.duration:.0f}s each)")
+        bench_http(args.url, '/', False, args.clients, args.duration)
+        bench_http(args.url, '/api/cpu', False, args.clients, args.duration)
+        bench_http(args.url, '/api/cpu', True, args.clients, args.duration)
@@ -0,0 +1,73 @@
+"""
+Microbenchmark of cpumon's two per-core CPU sources.
+
+Builds a fixture /proc/stat for 8, 64 and 256 simulated cores and times
+psutil.cpu_percent(percpu=True) (pointed at the fixture via
+psutil.PROCFS_PATH) against cpumon.ProcStatReader on the same file.
+
+    python cpumon_procstat_bench.py --iterations 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import psutil
+
+from cpumon import ProcStatReader
+
+CORE_COUNTS = (8, 64, 256)
+
+
+def write_fixture(directory, ncpu, seed=0):
+    """Write a /proc/stat lookalike with ncpu cores (plus a long intr line like real hosts have)."""
+    rng = random.Random(seed)
+    lines = []
+    cores = []
+    for _ in range(ncpu):
+        # user nice system idle iowait irq softirq steal guest guest_nice
+        cores.append([rng.randint(10 ** 5, 10 ** 8) for _ in range(8)] + [0, 0])
+    lines.append('cpu  ' + ' '.join(str(sum(c[i] for c in cores)) for i in range(10)))
+    for i, counters in enumerate(cores):
+        lines.append(f'cpu{i} ' + ' '.join(map(str, counters)))
+    lines.append('intr ' + ' '.join(str(rng.randint(0, 10 ** 6)) for _ in range(ncpu * 8)))
+    lines.append('ctxt 123456789')
+    lines.append('btime 1689000000')
+    lines.append('processes 4242424')
+    lines.append('procs_running 3')
+    lines.append('procs_blocked 0')
+    lines.append('softirq ' + ' '.join(['12345'] * 11))
+    path = os.path.join(directory, 'stat')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def bench(func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare psutil and /proc/stat CPU sampling.')
+    parser.add_argument('--iterations', type=int, default=2000, help='reads per measurement')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    print(f"{'cores':>6} {'psutil us/read':>15} {'procstat us/read':>17} {'speedup':>8}")
+    for ncpu in CORE_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            path = write_fixture(directory, ncpu)
+            psutil.PROCFS_PATH = directory
+            reader = ProcStatReader(path)
+            if reader.read() is not None and reader.ncpu != ncpu:
+                raise SystemExit(f"fixture parse error: expected {ncpu} cores, got {reader.ncpu}")
+            psutil_us = bench(lambda: psutil.cpu_percent(percpu=True), args.iterations)
+            reader_us = bench(reader.read, args.iterations)
+        print(f"{ncpu:>6} {psutil_us:>15.1f} {reader_us:>17.1f} {psutil_us / reader_us:>7.1f}x")
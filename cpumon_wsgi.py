@@ -0,0 +1,42 @@
+"""
+Production entry point for cpumon.
+
+This file is both the gunicorn config and the WSGI module:
+
+    gunicorn -c cpumon_wsgi.py cpumon_wsgi:app
+
+The gunicorn master samples CPU once for the whole server and publishes the
+ring buffer, /metrics payload, /api/top and cgroup status to shared memory.
+Every worker attaches to those segments and only serves requests, so adding
+workers adds serving capacity without adding sampling load.
+"""
+import multiprocessing
+import os
+
+import cpumon
+
+bind = os.environ.get('CPUMON_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('CPUMON_WORKERS', min(4, multiprocessing.cpu_count())))
+# Threaded workers, since every /stream client holds a thread for as long as it is connected
+worker_class = 'gthread'
+threads = int(os.environ.get('CPUMON_THREADS', 32))
+timeout = 60
+
+
+def on_starting(server):
+    cpumon.start_shared_owner()
+
+
+def post_fork(server, worker):
+    cpumon.attach_shared_worker()
+
+
+def worker_exit(server, worker):
+    cpumon.close_shared()
+
+
+def on_exit(server):
+    cpumon.close_shared(unlink=True)
+
+
+app = cpumon.app
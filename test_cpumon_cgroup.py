@@ -0,0 +1,94 @@
+import pytest
+
+import cpumon
+
+
+def write_tree(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+@pytest.fixture
+def sampler():
+    return cpumon.CpuSampler(size=4)
+
+
+def test_v2_usage_quota_and_throttling(tmp_path, sampler):
+    write_tree(tmp_path, {
+        'cgroup.controllers': 'cpu memory\n',
+        'system.slice/oracle.service/cpu.max': '150000 100000\n',
+        'system.slice/oracle.service/cpu.stat': 'usage_usec 1000000\nnr_periods 10\nnr_throttled 1\nthrottled_usec 2000\n',
+    })
+    (tmp_path / 'self').write_text('0::/system.slice/oracle.service\n')
+
+    monitor = cpumon.CgroupMonitor(sampler, root=str(tmp_path), proc_cgroup=str(tmp_path / 'self'))
+    assert monitor.version == 2
+    assert monitor.path == '/system.slice/oracle.service'
+    assert monitor.read_quota() == 1.5
+
+    monitor.on_sample(100.0, [])
+    (tmp_path / 'system.slice/oracle.service/cpu.stat').write_text(
+        'usage_usec 2500000\nnr_periods 20\nnr_throttled 4\nthrottled_usec 12000\n')
+    monitor.on_sample(101.0, [])
+
+    assert monitor.status['usage_cores'] == 1.5
+    assert monitor.status['quota_cores'] == 1.5
+    assert monitor.status['usage_pct_of_quota'] == 100.0
+    assert monitor.status['periods'] == 10
+    assert monitor.status['throttled_periods'] == 3
+    assert monitor.status['throttled_ms'] == 10.0
+    assert monitor.status['throttled_periods_total'] == 4
+
+
+def test_v2_unlimited(tmp_path, sampler):
+    write_tree(tmp_path, {
+        'cgroup.controllers': 'cpu\n',
+        'db/cpu.max': 'max 100000\n',
+        'db/cpu.stat': 'usage_usec 0\n',
+    })
+
+    monitor = cpumon.CgroupMonitor(sampler, path='db', root=str(tmp_path))
+    assert monitor.read_quota() is None
+    assert monitor.read_counters() == (0, 0, 0, 0)
+
+
+def test_v1_cpuacct_and_cfs(tmp_path, sampler):
+    write_tree(tmp_path, {
+        'cpu,cpuacct/oracle/cpu.cfs_quota_us': '200000\n',
+        'cpu,cpuacct/oracle/cpu.cfs_period_us': '100000\n',
+        'cpu,cpuacct/oracle/cpu.stat': 'nr_periods 5\nnr_throttled 2\nthrottled_time 3000000\n',
+        'cpu,cpuacct/oracle/cpuacct.usage': '4000000000\n',
+    })
+    (tmp_path / 'self').write_text('4:memory:/other\n3:cpu,cpuacct:/oracle\n')
+
+    monitor = cpumon.CgroupMonitor(sampler, root=str(tmp_path), proc_cgroup=str(tmp_path / 'self'))
+    assert monitor.version == 1
+    assert monitor.path == '/oracle'
+    assert monitor.read_quota() == 2.0
+    # cpuacct.usage and throttled_time are nanoseconds
+    assert monitor.read_counters() == (4000000, 5, 2, 3000)
+
+
+def test_v1_separate_hierarchies_unlimited(tmp_path, sampler):
+    write_tree(tmp_path, {
+        'cpu/oracle/cpu.cfs_quota_us': '-1\n',
+        'cpu/oracle/cpu.cfs_period_us': '100000\n',
+        'cpu/oracle/cpu.stat': 'nr_periods 0\nnr_throttled 0\nthrottled_time 0\n',
+        'cpuacct/oracle/cpuacct.usage': '1000\n',
+    })
+
+    monitor = cpumon.CgroupMonitor(sampler, path='/oracle', root=str(tmp_path))
+    assert monitor.cpu_dir == str(tmp_path / 'cpu' / 'oracle')
+    assert monitor.acct_dir == str(tmp_path / 'cpuacct' / 'oracle')
+    assert monitor.read_quota() is None
+    assert monitor.read_counters() == (1, 0, 0, 0)
+
+
+def test_missing_files_are_reported_not_raised(tmp_path, sampler):
+    write_tree(tmp_path, {'cgroup.controllers': 'cpu\n'})
+
+    monitor = cpumon.CgroupMonitor(sampler, path='gone', root=str(tmp_path))
+    monitor.on_sample(100.0, [])
+    assert 'error' in monitor.status
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import socket
+
+import cpumon_fleet
+
+
+def stand_in(body):
+    """A local stand-in cpumon that answers every request with body."""
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        payload = body.encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: " + str(len(payload)).encode() + b"\r\nConnection: close\r\n\r\n" + payload)
+        await writer.drain()
+        writer.close()
+    return handle
+
+
+def silent():
+    """A stand-in that accepts the connection and never answers."""
+    async def handle(reader, writer):
+        await asyncio.sleep(60)
+    return handle
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def sweep_stand_ins(handlers, timeout=1.0):
+    servers = [await asyncio.start_server(handler, "127.0.0.1", 0) for handler in handlers]
+    try:
+        targets = [("127.0.0.1", server.sockets[0].getsockname()[1]) for server in servers]
+        targets.append(("127.0.0.1", closed_port()))
+        results = await cpumon_fleet.sweep(targets, timeout=timeout)
+        return targets, {result["host"]: result for result in results}
+    finally:
+        for server in servers:
+            server.close()
+
+
+def test_bad_bodies_are_per_host_errors():
+    handlers = [
+        stand_in(json.dumps({"ts": 1.0, "cpu": [10.0, 30.0]})),
+        stand_in(json.dumps([1, 2, 3])),
+        stand_in(json.dumps("busy")),
+        stand_in(json.dumps({"ts": 1.0, "cpu": ["10", None]})),
+        stand_in(json.dumps({"ts": 1.0, "cpu": {"0": 10.0}})),
+        stand_in("not json"),
+        silent(),
+    ]
+    targets, results = asyncio.run(sweep_stand_ins(handlers, timeout=0.5))
+    assert len(results) == len(targets)
+    by_target = [results[f"{host}:{port}"] for host, port in targets]
+    good, array_body, string_body, strings, mapping, garbage, hung, refused = by_target
+
+    assert good["ok"] and good["avg"] == 20.0 and good["max"] == 30.0
+    for result in (array_body, string_body, strings, mapping, garbage, hung, refused):
+        assert not result["ok"]
+        assert result["error"]
+    assert "not an object" in array_body["error"]
+    assert "not a list of numbers" in strings["error"]
+    assert hung["error"] == "timeout after 0.5s"
+
+
+def test_hottest_reachable_host_first():
+    handlers = [
+        stand_in(json.dumps({"ts": 1.0, "cpu": [5.0]})),
+        stand_in(json.dumps({"ts": 1.0, "cpu": [90.0, 70.0]})),
+        stand_in(json.dumps({"ts": 1.0, "cpu": []})),
+    ]
+    targets, results = asyncio.run(sweep_stand_ins(handlers))
+    order = [result["avg"] for result in results.values()]
+    assert order == [80.0, 5.0, 0.0, None]